@@ -1,19 +1,42 @@
 import os
 import logging
-from flask import Flask, render_template, request, redirect, url_for, send_file, jsonify, g, session, flash
+from flask import Flask, render_template, request, redirect, url_for, send_file, jsonify, g, session, flash, abort, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
-from flask_babel import Babel, gettext as _, refresh
+from flask_babel import Babel, gettext as _, refresh, get_locale as current_locale, force_locale, get_translations
+from markupsafe import Markup
 from flask_wtf.csrf import CSRFProtect
-import pdfkit
 from datetime import datetime
 from templates import AGREEMENT_TEMPLATES
-from services.ai_service import get_template_suggestions, analyze_and_format_text, highlight_key_elements
-from services.verification_service import DocumentVerificationService
-from services.qr_service import QRCodeService
+from services.ai_service import get_template_suggestions, analyze_and_format_text, highlight_key_elements, response_cache, get_openai_client
+from services.async_ai_service import get_template_suggestions_parallel, analyze_and_format_text_parallel
+from services.cache_service import create_fragment_cache
+from services.verification_service import DocumentVerificationService, DocumentVerificationError
+from services.qr_service import QRCodeService, QRDecoderBusy
+from services.pdf_service import PDFService, PDFCache, PDFRendererBusy, render_limiter
+import tempfile
+import shutil
+from services.job_service import JobService, JobError
+from services.signature_service import SignatureStorageService, SignatureStorageError, SignatureStrokes, render_strokes
+from services.bulk_verification_service import BulkVerificationService, validate_options as validate_bulk_options
+from services.verification_lookup_service import VerificationLookupService, RateLimiter
+from services.template_engine import get_compiled_template, TemplateRenderError
+from services.bulk_agreement_service import BulkAgreementService, iter_rows
+from services.analysis_stream import stream_text_analysis, stream_template_suggestions, format_sse
+from services.search_service import search_index, search_agreements, list_agreements, SearchIndexError
+import uuid
+import click
 import io
+import base64
 import json
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import event, select, update, inspect as sa_inspect
+from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.engine import Engine
+from services import metrics
+import re
+import time
+import hashlib
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -50,4 +73,1088 @@ app.config.update(
 db.init_app(app)
 csrf.init_app(app)
 
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9-]{1,64}$')
+
+# Tracing hooks are only registered when metrics are on, so disabling them
+# leaves nothing on the request path.
+if metrics.ENABLED:
+    @app.before_request
+    def start_request_trace():
+        request_id = request.headers.get('X-Request-ID', '')
+        g.trace_token = metrics.start_trace(request_id if REQUEST_ID_RE.match(request_id) else None)
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def finish_request_trace(response):
+        trace = metrics.end_trace(g.pop('trace_token', None))
+        started = g.pop('request_started', None)
+        if started is not None:
+            metrics.HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                endpoint=request.endpoint or 'unmatched', method=request.method, status=response.status_code
+            )
+        if trace is not None:
+            trace_id, spans = trace
+            response.headers['X-Request-ID'] = trace_id
+            if spans:
+                response.headers['Server-Timing'] = metrics.server_timing(spans)
+                logger.debug(f"Trace {trace_id} {request.endpoint}: {spans}")
+        return response
+
+    @app.teardown_request
+    def discard_request_trace(exc):
+        # after_request is skipped for unhandled exceptions
+        metrics.end_trace(g.pop('trace_token', None))
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def observe_query_time(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        operation = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else 'unknown'
+        metrics.DB_QUERY_SECONDS.observe(elapsed, operation=operation)
+        metrics.record_span('db', elapsed)
+
+    @event.listens_for(Engine, 'handle_error')
+    def discard_query_timer(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('query_started'):
+            conn.info['query_started'].pop()
+
+class Job(db.Model):
+    """Background job state for AI analysis and PDF rendering."""
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, index=True)
+    payload = db.Column(db.Text)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+class SignatureBlob(db.Model):
+    """Decoded signature image bytes, addressed by their SHA-256."""
+    sha256 = db.Column(db.String(64), primary_key=True)
+    mime_type = db.Column(db.String(32), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class VerificationRecord(db.Model):
+    """Verification record created by DocumentVerificationService.create_verification_record."""
+    id = db.Column(db.Integer, primary_key=True)
+    agreement_id = db.Column(db.Integer, db.ForeignKey('agreement.id'), nullable=False, index=True)
+    verification_code = db.Column(db.String(12), nullable=False, unique=True, index=True)
+    content_hash = db.Column(db.String(64), nullable=False)
+    timestamp = db.Column(db.String(32))
+    status = db.Column(db.String(20), nullable=False, default='created')
+    blockchain_data = db.Column(db.JSON)
+    merkle_tree = db.Column(db.JSON)
+    timestamp_token = db.Column(db.String(512))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    agreement = db.relationship('Agreement')
+
+    def to_dict(self):
+        return {
+            'agreement_id': self.agreement_id,
+            'verification_code': self.verification_code,
+            'content_hash': self.content_hash,
+            'timestamp': self.timestamp,
+            'status': self.status,
+            'blockchain_data': self.blockchain_data,
+            'merkle_tree': self.merkle_tree,
+            'timestamp_token': self.timestamp_token
+        }
+
+class BulkImport(db.Model):
+    """Progress and checkpoint of a bulk agreement generation run."""
+    id = db.Column(db.String(32), primary_key=True)
+    template_id = db.Column(db.String(50), nullable=False)
+    source_path = db.Column(db.String(512), nullable=False)
+    source_format = db.Column(db.String(10), nullable=False)
+    output_format = db.Column(db.String(10), nullable=False, default='jsonl')
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    created_count = db.Column(db.Integer, nullable=False, default=0)
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'import_id': self.id,
+            'template_id': self.template_id,
+            'status': self.status,
+            'rows_done': self.rows_done,
+            'created': self.created_count,
+            'failed': self.failed_count,
+            'error': self.error,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+jobs = JobService()
+jobs.init_app(app, db, Job)
+
+QRCodeService.STORAGE_DIR = QRCodeService.STORAGE_DIR or os.path.join(app.instance_path, "qr_cache")
+QR_PREGENERATE = os.environ.get("QR_PREGENERATE", "0") == "1"
+
+JOB_OUTPUT_DIR = os.environ.get("JOB_OUTPUT_DIR", os.path.join(app.instance_path, "job_output"))
+
+pdf_cache = PDFCache(
+    os.environ.get("PDF_CACHE_DIR", os.path.join(app.instance_path, "pdf_cache")),
+    max_bytes=int(os.environ.get("PDF_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+)
+
+def send_agreement_pdf(agreement):
+    """Serve the agreement PDF from the render cache with ETag/If-None-Match support."""
+    # An open handle rather than a path, so cache eviction cannot remove the
+    # file between the lookup and the response being streamed
+    pdf, etag = pdf_cache.get_or_render(agreement, str(current_locale() or 'en'))
+    response = send_file(
+        pdf,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f"agreement_{agreement.id}.pdf",
+        etag=etag,
+        conditional=True,
+        max_age=0
+    )
+    if response.content_length is None and response.status_code == 200:
+        response.content_length = os.fstat(pdf.fileno()).st_size
+    return response
+
+def _load_verification_codes(since):
+    records = db.session.query(VerificationRecord.created_at, VerificationRecord.verification_code)
+    if since is None:
+        # Agreements verified before the record table existed
+        legacy_codes = db.session.query(Agreement.verification_code).filter(
+            Agreement.verification_code.isnot(None)
+        ).yield_per(5000)
+        for (code,) in legacy_codes:
+            yield None, code
+    else:
+        records = records.filter(VerificationRecord.created_at >= since)
+    for created_at, code in records.yield_per(5000):
+        yield created_at, code
+
+def _load_verification_record(verification_code):
+    record = VerificationRecord.query.filter_by(verification_code=verification_code).first()
+    if record is not None:
+        return record.to_dict()
+    agreement = Agreement.query.filter_by(verification_code=verification_code).first()
+    if agreement is None:
+        return None
+    data = agreement.verification_data or {}
+    if isinstance(data, str):
+        data = json.loads(data)
+    return {**data, 'agreement_id': agreement.id, 'verification_code': verification_code}
+
+verification_lookup = VerificationLookupService(_load_verification_codes, _load_verification_record)
+verify_rate_limiter = RateLimiter(
+    limit=int(os.environ.get("VERIFY_RATE_LIMIT", "30")),
+    window=float(os.environ.get("VERIFY_RATE_WINDOW", "60"))
+)
+
+# Public endpoints addressed by a verification code. The QR images are
+# included so enumerating codes cannot fill the QR cache directory.
+VERIFICATION_LOOKUP_ENDPOINTS = ('verify_agreement_by_code', 'verification_record', 'clause_proof',
+                                 'verification_qr_png', 'verification_qr_svg')
+
+@app.before_request
+def guard_verification_lookup():
+    """Rate-limit public code lookups and reject unknown codes before they reach the database."""
+    if request.endpoint not in VERIFICATION_LOOKUP_ENDPOINTS:
+        return None
+    if not verify_rate_limiter.allow(request.remote_addr or 'unknown'):
+        response = jsonify({'error': _('Too many verification requests')})
+        response.headers['Retry-After'] = str(int(verify_rate_limiter.window))
+        return response, 429
+    code = (request.view_args or {}).get('verification_code')
+    if verification_lookup.lookup(code) is None:
+        abort(404)
+    return None
+
+@event.listens_for(db.session, 'before_flush')
+def store_signature_blobs(session, flush_context, instances):
+    """Move submitted signatures (data URLs or strokes) into SignatureBlob rows, keeping only a reference.
+
+    References are only ever produced here, so a reference submitted by a
+    client that points at no stored blob is dropped. A submitted value that
+    cannot be stored fails the flush rather than being kept as submitted.
+    """
+    for obj in list(session.new) + list(session.dirty):
+        for field in ('signature1', 'signature2'):
+            value = getattr(obj, field, None)
+            if (SignatureStorageService.is_ref(value) and getattr(sa_inspect(obj).attrs, field).history.added
+                    and not signature_blob_exists(value, session)):
+                logger.warning(f"Dropping {field} of agreement {obj.id}: no stored signature {value}")
+                setattr(obj, field, None)
+            elif SignatureStorageService.is_inline(value):
+                try:
+                    setattr(obj, field, SignatureStorageService.store(session, SignatureBlob, value))
+                except SignatureStorageError as e:
+                    logger.error(f"Rejecting {field} of agreement {obj.id}: {str(e)}")
+                    raise
+
+@event.listens_for(db.session, 'after_flush')
+def pregenerate_verification_qr(session, flush_context):
+    """Optionally render QR images as soon as an agreement receives its verification code."""
+    if not QR_PREGENERATE:
+        return
+    for obj in list(session.new) + list(session.dirty):
+        code = getattr(obj, 'verification_code', None)
+        if code and sa_inspect(obj).attrs.verification_code.history.has_changes():
+            QRCodeService.pregenerate(code)
+
+@event.listens_for(db.session, 'before_flush')
+def store_verification_records(session, flush_context, instances):
+    """Give each agreement's verification record its own indexed row once it has a code.
+
+    New agreements are included: the record is linked through the relationship
+    so it is inserted after the agreement has its id.
+    """
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Agreement):
+            continue
+        code = getattr(obj, 'verification_code', None)
+        record = getattr(obj, 'verification_data', None)
+        if not code or not record or not sa_inspect(obj).attrs.verification_code.history.has_changes():
+            continue
+        if isinstance(record, str):
+            record = json.loads(record)
+        session.add(VerificationRecord(
+            agreement=obj,
+            verification_code=code,
+            content_hash=record.get('content_hash'),
+            timestamp=record.get('timestamp'),
+            status=record.get('status', 'created'),
+            blockchain_data=record.get('blockchain_data'),
+            merkle_tree=record.get('merkle_tree'),
+            timestamp_token=record.get('timestamp_token')
+        ))
+        verification_lookup.add_code(code)
+
+SEARCH_ENABLED = os.environ.get("SEARCH_ENABLED", "1") == "1"
+
+def _search_extra(signed_at):
+    # The signing date is searchable alongside the extracted entities
+    return f"signed {signed_at.date().isoformat()}" if signed_at else None
+
+@event.listens_for(db.session, 'after_flush')
+def update_search_index(session, flush_context):
+    """Index agreements when they are created, and again when their content or signing changes."""
+    if not SEARCH_ENABLED:
+        return
+    changed = []
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Agreement) or not obj.content:
+            continue
+        if obj not in session.new:
+            attrs = sa_inspect(obj).attrs
+            if not (attrs.content.history.has_changes() or attrs.signed_at.history.has_changes()):
+                continue
+        changed.append((obj.id, obj.content, _search_extra(obj.signed_at)))
+    if not changed:
+        return
+    connection = session.connection()
+    # A failed statement aborts a PostgreSQL transaction, so the index write
+    # gets its own savepoint; SQLite keeps the transaction usable on errors
+    savepoint = connection.begin_nested() if connection.dialect.name == 'postgresql' else None
+    try:
+        search_index.index_many(connection, changed)
+        if savepoint is not None:
+            savepoint.commit()
+    except (SearchIndexError, SQLAlchemyError) as e:
+        # Search is secondary: never fail agreement creation or signing over it
+        if savepoint is not None and savepoint.is_active:
+            savepoint.rollback()
+        logger.warning(f"Agreements {[item[0] for item in changed]} not indexed for search: {str(e)}")
+
+def signature_blob_exists(ref, session=None):
+    """Whether a signature reference points at a stored (or pending) SignatureBlob."""
+    session = session or db.session
+    digest = SignatureStorageService.ref_digest(ref)
+    if any(isinstance(obj, SignatureBlob) and obj.sha256 == digest for obj in session.new):
+        return True
+    return session.scalar(select(SignatureBlob.sha256).where(SignatureBlob.sha256 == digest)) is not None
+
+DocumentVerificationService.signature_exists = staticmethod(signature_blob_exists)
+
+@app.template_filter('signature_src')
+def signature_src(value):
+    """Image URL for a stored signature reference; legacy data URLs pass through."""
+    if SignatureStorageService.is_ref(value):
+        return url_for('signature_image', sha256=SignatureStorageService.ref_digest(value))
+    return value
+
+@event.listens_for(db.session, 'before_flush')
+def invalidate_signed_pdfs(session, flush_context, instances):
+    """Drop cached PDFs of agreements whose signatures are being changed."""
+    for obj in session.dirty:
+        if not hasattr(obj, 'signature1') or not getattr(obj, 'content', None):
+            continue
+        attrs = sa_inspect(obj).attrs
+        if attrs.signature1.history.has_changes() or attrs.signature2.history.has_changes():
+            pdf_cache.invalidate(DocumentVerificationService.calculate_document_hash(obj.content))
+
+@jobs.task('template_suggestions', public=True)
+def template_suggestions_job(payload):
+    return get_template_suggestions_parallel(payload.get('text', ''))
+
+@jobs.task('text_analysis', public=True)
+def text_analysis_job(payload):
+    return analyze_and_format_text_parallel(payload.get('text', ''))
+
+@jobs.task('agreement_pdf', public=True)
+def agreement_pdf_job(payload):
+    agreement = db.session.get(Agreement, payload['agreement_id'])
+    if agreement is None:
+        raise JobError("Agreement not found")
+    # The result is downloaded later, so it gets its own copy outside the
+    # render cache, where eviction could remove it first
+    os.makedirs(JOB_OUTPUT_DIR, exist_ok=True)
+    path = os.path.join(JOB_OUTPUT_DIR, f"agreement-{agreement.id}-{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}.pdf")
+    pdf, _etag = pdf_cache.get_or_render(agreement, payload.get('locale', 'en'))
+    with pdf, open(path, 'wb') as output:
+        shutil.copyfileobj(pdf, output)
+    return {'path': path, 'filename': f"agreement_{agreement.id}.pdf", 'mimetype': 'application/pdf'}
+
+@jobs.task('bulk_verification')
+def bulk_verification_job(payload):
+    report_format = 'csv' if payload.get('format') == 'csv' else 'jsonl'
+    os.makedirs(JOB_OUTPUT_DIR, exist_ok=True)
+    path = os.path.join(JOB_OUTPUT_DIR, f"verification-{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}.{report_format}")
+    with open(path, 'w', newline='') as output:
+        batch_size, workers = validate_bulk_options(payload.get('batch_size'), payload.get('workers'))
+        summary = BulkVerificationService.verify_all(
+            db.session, Agreement, output, report_format, batch_size=batch_size, workers=workers
+        )
+    return {
+        'summary': summary,
+        'path': path,
+        'filename': os.path.basename(path),
+        'mimetype': 'text/csv' if report_format == 'csv' else 'application/x-ndjson'
+    }
+
+def _render_size():
+    """Requested ``w``/``h`` for a stroke signature render; 0 keeps the pad size."""
+    try:
+        width = min(max(int(request.args.get('w', 0)), 0), SignatureStrokes.MAX_SIDE)
+        height = min(max(int(request.args.get('h', 0)), 0), SignatureStrokes.MAX_SIDE)
+    except ValueError:
+        abort(400)
+    return width, height
+
+def _send_signature(data, mimetype, etag):
+    response = send_file(io.BytesIO(data), mimetype=mimetype, etag=etag,
+                         conditional=True, max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['Content-Security-Policy'] = "default-src 'none'"
+    return response
+
+@app.route('/signatures/<sha256>.png')
+def signature_image(sha256):
+    """Serve stored signature bytes; content-addressed, so cacheable forever.
+
+    Stroke signatures are rasterized on request, at ``?w=&h=`` if given.
+    """
+    blob = db.session.get(SignatureBlob, sha256)
+    if blob is None:
+        return jsonify({'error': _('Signature not found')}), 404
+    if blob.mime_type in SignatureStorageService.RASTER_TYPES:
+        return _send_signature(blob.data, blob.mime_type, sha256)
+    if blob.mime_type != SignatureStrokes.MIME_TYPE:
+        # Blobs stored before uploads were re-encoded may be anything
+        return jsonify({'error': _('Signature not found')}), 404
+    width, height = _render_size()
+    png = render_strokes(blob.data.decode(), 'png', width, height)
+    return _send_signature(png, 'image/png', f"{sha256}-{width}x{height}")
+
+@app.route('/signatures/<sha256>.svg')
+def signature_svg(sha256):
+    """Serve a stroke signature as SVG; raster signatures have no vector form."""
+    blob = db.session.get(SignatureBlob, sha256)
+    if blob is None or blob.mime_type != SignatureStrokes.MIME_TYPE:
+        return jsonify({'error': _('Signature not found')}), 404
+    width, height = _render_size()
+    svg = render_strokes(blob.data.decode(), 'svg', width, height)
+    return _send_signature(svg, 'image/svg+xml', f"{sha256}-{width}x{height}")
+
+def signature_embed_src(value):
+    """Self-contained data URL for a signature, for PDFs that cannot fetch the signature routes."""
+    if SignatureStorageService.is_ref(value):
+        blob = db.session.get(SignatureBlob, SignatureStorageService.ref_digest(value))
+        if blob is None:
+            return None
+        mime_type, data = blob.mime_type, blob.data
+        if mime_type == SignatureStrokes.MIME_TYPE:
+            mime_type, data = 'image/svg+xml', render_strokes(data.decode(), 'svg')
+        elif mime_type not in SignatureStorageService.RASTER_TYPES:
+            return None
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode()}"
+    if SignatureStrokes.is_strokes(value):
+        return f"data:image/svg+xml;base64,{base64.b64encode(render_strokes(value, 'svg')).decode()}"
+    # Legacy inline values are only embedded if they are raster images
+    return value if value and SignatureStorageService.DATA_URL_RE.match(value) else None
+
+PDFService.signature_src = staticmethod(signature_embed_src)
+
+def _send_qr(verification_code, image, mimetype):
+    response = send_file(io.BytesIO(image), mimetype=mimetype, etag=verification_code,
+                         conditional=True, max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/qr/<verification_code>.png')
+def verification_qr_png(verification_code):
+    """Verification QR code as a PNG; it only depends on the code, so it never changes."""
+    if not QRCodeService.is_valid_code(verification_code):
+        return jsonify({'error': _('Invalid verification code')}), 404
+    return _send_qr(verification_code, QRCodeService.generate_qr_png(verification_code), 'image/png')
+
+@app.route('/qr/<verification_code>.svg')
+def verification_qr_svg(verification_code):
+    """Verification QR code as an SVG."""
+    if not QRCodeService.is_valid_code(verification_code):
+        return jsonify({'error': _('Invalid verification code')}), 404
+    return _send_qr(verification_code, QRCodeService.generate_qr_svg(verification_code), 'image/svg+xml')
+
+@app.route('/api/verify/<verification_code>')
+def verification_record(verification_code):
+    """Verification record for a code, served from the lookup cache."""
+    return jsonify(verification_lookup.lookup(verification_code))
+
+@app.route('/api/verify/<verification_code>/clauses/<int:index>/proof')
+def clause_proof(verification_code, index):
+    """Merkle proof for one clause, checkable without the full agreement text."""
+    record = verification_lookup.lookup(verification_code)
+    tree = (record or {}).get('merkle_tree')
+    if not tree:
+        return jsonify({'error': _('No clause tree recorded for this agreement')}), 404
+    try:
+        proof = DocumentVerificationService.clause_proof(tree, index)
+    except DocumentVerificationError as e:
+        return jsonify({'error': str(e)}), 404
+    return jsonify({'root': tree['root'], 'index': index, 'leaf': tree['leaves'][index], 'proof': proof})
+
+@app.cli.command('backfill-verification-records')
+def backfill_verification_records():
+    """Create VerificationRecord rows for agreements verified before the table existed."""
+    created = 0
+    existing = db.session.query(VerificationRecord.agreement_id)
+    agreements = Agreement.query.filter(
+        Agreement.verification_code.isnot(None),
+        Agreement.id.notin_(existing)
+    ).order_by(Agreement.id).yield_per(500)
+    for agreement in agreements:
+        record = agreement.verification_data or {}
+        if isinstance(record, str):
+            record = json.loads(record)
+        if not record.get('content_hash'):
+            continue
+        # A clause tree and timestamp token are only derived for content that
+        # still matches the recorded hash
+        merkle_tree = record.get('merkle_tree')
+        timestamp_token = record.get('timestamp_token')
+        content_matches = bool(agreement.content) and \
+            DocumentVerificationService.calculate_document_hash(agreement.content) == record['content_hash']
+        if merkle_tree is None and content_matches:
+            merkle_tree = DocumentVerificationService.build_merkle_tree(agreement.content)
+        if timestamp_token is None and content_matches and record.get('timestamp'):
+            timestamp_token = DocumentVerificationService.issue_timestamp_token(
+                agreement.id, record['content_hash'], record['timestamp']
+            )
+        db.session.add(VerificationRecord(
+            agreement_id=agreement.id,
+            verification_code=agreement.verification_code,
+            content_hash=record['content_hash'],
+            timestamp=record.get('timestamp'),
+            status=record.get('status', 'created'),
+            blockchain_data=record.get('blockchain_data'),
+            merkle_tree=merkle_tree,
+            timestamp_token=timestamp_token
+        ))
+        created += 1
+    db.session.commit()
+    print(f"Created {created} verification records")
+
+@app.cli.command('migrate-signatures')
+def migrate_signatures():
+    """Move legacy inline signature data URLs into SignatureBlob storage."""
+    migrated = 0
+    last_id = 0
+    query = Agreement.query.filter(db.or_(
+        Agreement.signature1.like('data:image%'),
+        Agreement.signature2.like('data:image%')
+    ))
+    while True:
+        batch = query.filter(Agreement.id > last_id).order_by(Agreement.id).limit(100).all()
+        if not batch:
+            break
+        for agreement in batch:
+            # store_signature_blobs converts the columns when the batch is flushed
+            flag_modified(agreement, 'signature1')
+            flag_modified(agreement, 'signature2')
+        db.session.commit()
+        migrated += len(batch)
+        last_id = batch[-1].id
+    print(f"Migrated signatures for {migrated} agreements")
+
+@app.route('/ai/cache/stats')
+def ai_cache_stats():
+    """Report hit/miss counters for the AI response cache."""
+    return jsonify(response_cache.stats())
+
+fragment_cache = create_fragment_cache()
+# Data version of the template picker; changes whenever the catalog does
+TEMPLATES_VERSION = hashlib.sha256(json.dumps(AGREEMENT_TEMPLATES, sort_keys=True).encode()).hexdigest()[:12]
+# Pages answered with a body ETag, so revisits in the same language get a 304
+CONDITIONAL_PAGES = {'index', 'create_agreement'}
+
+@app.context_processor
+def inject_fragment_versions():
+    return {'templates_version': TEMPLATES_VERSION, 'agreement_templates': AGREEMENT_TEMPLATES}
+
+@app.template_global('cached_fragment')
+def cached_fragment(name, version='', caller=None):
+    """Body of a ``{% call cached_fragment(name, version) %}`` block, rendered once per locale and version.
+
+    Only wrap markup that depends on nothing but the locale and ``version``:
+    no CSRF tokens, flashed messages or per-user data.
+    """
+    locale = g.get('lang_code') or str(current_locale() or 'en')
+    return Markup(fragment_cache.get_or_render(name, locale, str(version), caller))
+
+@app.after_request
+def add_page_etag(response):
+    if (request.endpoint in CONDITIONAL_PAGES and request.method in ('GET', 'HEAD')
+            and response.status_code == 200 and response.mimetype == 'text/html'
+            and not response.direct_passthrough):
+        response.add_etag()
+        # The page depends on the session's language, so only the browser may reuse it
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.make_conditional(request)
+    return response
+
+@app.route('/cache/fragments/stats')
+def fragment_cache_stats():
+    """Report hit/miss counters for the page fragment cache."""
+    return jsonify(fragment_cache.stats())
+
+def preload_translations():
+    """Load every configured locale's catalog into Flask-Babel's process-wide cache.
+
+    Catalogs are otherwise read from disk by the first request in each
+    language; preloading keeps that out of the request path entirely.
+    """
+    with app.test_request_context():
+        for code in app.config['LANGUAGES']:
+            with force_locale(code):
+                get_translations()
+
+@app.errorhandler(PDFRendererBusy)
+def pdf_renderer_busy(e):
+    response = jsonify({'error': _('PDF renderer is busy, please try again shortly')})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+@app.route('/pdf/stats')
+def pdf_stats():
+    """Report render queue depth and timings for the PDF render limiter."""
+    return jsonify(render_limiter.stats())
+
+# Most agreements one synchronous ZIP request may render
+PDF_BATCH_MAX = int(os.environ.get("PDF_BATCH_MAX", "50"))
+
+@app.route('/agreements/pdf-batch', methods=['POST'])
+def download_agreements_batch():
+    """Render several agreements in one call and return them as a ZIP archive."""
+    data = request.get_json(silent=True) or {}
+    try:
+        ids = [int(agreement_id) for agreement_id in data.get('ids', [])]
+    except (TypeError, ValueError):
+        return jsonify({'error': _('Invalid agreement ids')}), 400
+    if not ids:
+        return jsonify({'error': _('No agreements requested')}), 400
+    if len(set(ids)) > PDF_BATCH_MAX:
+        return jsonify({'error': _('Too many agreements requested'), 'max': PDF_BATCH_MAX}), 400
+
+    agreements = Agreement.query.filter(Agreement.id.in_(set(ids))).order_by(Agreement.id).yield_per(50)
+    archive = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    PDFService.render_agreements_zip(agreements, archive, cache=pdf_cache,
+                                     locale=str(current_locale() or 'en'))
+    archive.seek(0)
+    return send_file(archive, mimetype='application/zip', as_attachment=True,
+                     download_name='agreements.zip')
+
+@app.route('/jobs/<kind>', methods=['POST'])
+def submit_job(kind):
+    """Queue a background job and return its id for polling."""
+    payload = request.get_json(silent=True) or {}
+    payload.setdefault('locale', str(current_locale() or 'en'))
+    try:
+        job_id = jobs.submit(kind, payload, public=True)
+    except JobError as e:
+        return jsonify({'error': str(e)}), 400
+    except SQLAlchemyError as e:
+        logger.error(f"Error submitting job: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': _('Failed to submit job')}), 500
+    return jsonify({
+        'job_id': job_id,
+        'status': JobService.STATUS_QUEUED,
+        'status_url': url_for('job_status', job_id=job_id),
+        'result_url': url_for('job_result', job_id=job_id)
+    }), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': _('Job not found')}), 404
+    return jsonify(JobService.to_dict(job))
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': _('Job not found')}), 404
+    if job.status == JobService.STATUS_FAILED:
+        return jsonify({'error': job.error, 'status': job.status}), 500
+    if job.status != JobService.STATUS_FINISHED:
+        return jsonify({'status': job.status}), 409
+
+    result = json.loads(job.result or '{}')
+    if request.args.get('format') != 'json' and result.get('path'):
+        return send_file(result['path'], mimetype=result.get('mimetype'),
+                         as_attachment=True, download_name=result['filename'])
+    return jsonify(result)
+
+@app.route('/verify/bulk', methods=['POST'])
+def bulk_verify():
+    """Start re-verification of every stored agreement as a background job."""
+    data = request.get_json(silent=True) or {}
+    try:
+        batch_size, workers = validate_bulk_options(data.get('batch_size'), data.get('workers'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    job_id = jobs.submit('bulk_verification', {
+        'format': data.get('format', 'jsonl'),
+        'batch_size': batch_size,
+        'workers': workers
+    })
+    return jsonify({
+        'job_id': job_id,
+        'status': JobService.STATUS_QUEUED,
+        'status_url': url_for('job_status', job_id=job_id),
+        'result_url': url_for('job_result', job_id=job_id)
+    }), 202
+
+@app.cli.command('verify-all')
+@click.option('--output', type=click.File('w'), default='-', help='Report file (default: stdout).')
+@click.option('--format', 'report_format', type=click.Choice(['jsonl', 'csv']), default='jsonl')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True,
+              help='Hashing processes; 0 hashes in the main process.')
+def verify_all_command(output, report_format, batch_size, workers):
+    """Re-verify every stored agreement and write a per-agreement report."""
+    summary = BulkVerificationService.verify_all(
+        db.session, Agreement, output, report_format, batch_size=batch_size, workers=workers
+    )
+    click.echo(
+        f"Verified {summary['total']} agreements ({summary['valid']} valid, {summary['invalid']} invalid) "
+        f"in {summary['seconds']}s: {summary['agreements_per_second']} agreements/s",
+        err=True
+    )
+
+@app.route('/templates/<template_id>/schema')
+def template_schema(template_id):
+    """Field schema of a template, used to build the create form."""
+    try:
+        return jsonify(get_compiled_template(template_id).schema())
+    except TemplateRenderError as e:
+        return jsonify({'error': str(e)}), 404
+
+@app.route('/templates/<template_id>/validate', methods=['POST'])
+def validate_template_fields(template_id):
+    """Check submitted field values against the template's required fields."""
+    try:
+        template = get_compiled_template(template_id)
+    except TemplateRenderError as e:
+        return jsonify({'error': str(e)}), 404
+    errors = template.validate(request.get_json(silent=True) or {})
+    return jsonify({'valid': not errors, 'errors': errors}), 200 if not errors else 422
+
+@app.route('/templates/<template_id>/render-batch', methods=['POST'])
+def render_template_batch(template_id):
+    """Render one agreement per uploaded CSV row, streamed back as JSON lines."""
+    try:
+        template = get_compiled_template(template_id)
+    except TemplateRenderError as e:
+        return jsonify({'error': str(e)}), 404
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': _('No CSV file uploaded')}), 400
+
+    csv_file = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+
+    def generate():
+        for row, content, error in template.render_csv(csv_file):
+            line = {'row': row, 'content': content} if error is None else {'row': row, 'error': error}
+            yield json.dumps(line) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def _bulk_import_paths(bulk_import):
+    base = os.path.join(JOB_OUTPUT_DIR, 'imports', bulk_import.id)
+    return f"{base}.manifest.jsonl", f"{base}.zip"
+
+def run_bulk_import(bulk_import, batch_size=500, progress=None):
+    """Run or resume a bulk import from its checkpoint and build its output file."""
+    manifest_path, zip_path = _bulk_import_paths(bulk_import)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    BulkAgreementService.resume_manifest(manifest_path, bulk_import.rows_done)
+    service = BulkAgreementService(db.session, Agreement, VerificationRecord, batch_size=batch_size,
+                                   search_index=search_index if SEARCH_ENABLED else None,
+                                   on_code=verification_lookup.add_code)
+
+    bulk_import.status = 'running'
+    bulk_import.error = None
+    db.session.commit()
+    try:
+        with open(bulk_import.source_path, newline='', encoding='utf-8-sig') as source, \
+                open(manifest_path, 'a') as manifest:
+            summary = service.run(bulk_import, iter_rows(source, bulk_import.source_format), manifest, progress)
+        path, mimetype = manifest_path, 'application/x-ndjson'
+        if bulk_import.output_format == 'zip':
+            with open(zip_path, 'wb') as archive:
+                summary['pdfs'] = service.write_zip(manifest_path, archive)
+            path, mimetype = zip_path, 'application/zip'
+    except BaseException as e:
+        # Includes KeyboardInterrupt, so an interrupted CLI import can be resumed
+        db.session.rollback()
+        bulk_import.status = 'failed'
+        bulk_import.error = str(e) or type(e).__name__
+        db.session.commit()
+        raise
+    bulk_import.status = 'finished'
+    db.session.commit()
+    return {**summary, 'import_id': bulk_import.id, 'path': path,
+            'filename': os.path.basename(path), 'mimetype': mimetype}
+
+@jobs.task('bulk_agreements')
+def bulk_agreements_job(payload):
+    bulk_import = db.session.get(BulkImport, payload['import_id'])
+    if bulk_import is None:
+        raise JobError("Bulk import not found")
+    return run_bulk_import(bulk_import, batch_size=int(payload.get('batch_size', 500)))
+
+def _bulk_batch_size(value):
+    """Positive integer batch size from a form or JSON value, or None if it is not one."""
+    try:
+        batch_size = int(value)
+    except (TypeError, ValueError):
+        return None
+    return batch_size if batch_size > 0 else None
+
+def _claim_bulk_import(import_id):
+    """Move a failed import back to queued; False if it is not failed or another resume claimed it first.
+
+    Only failed imports can be resumed: a queued or running one already has
+    a job, and a second run from the same checkpoint would insert its rows twice.
+    """
+    claimed = db.session.execute(
+        update(BulkImport)
+        .where(BulkImport.id == import_id, BulkImport.status == 'failed')
+        .values(status='queued', updated_at=datetime.utcnow())
+    ).rowcount == 1
+    db.session.commit()
+    return claimed
+
+def _submit_bulk_import(bulk_import, batch_size):
+    job_id = jobs.submit('bulk_agreements', {'import_id': bulk_import.id, 'batch_size': batch_size})
+    return jsonify({
+        **bulk_import.to_dict(),
+        'job_id': job_id,
+        'progress_url': url_for('bulk_import_status', import_id=bulk_import.id),
+        'status_url': url_for('job_status', job_id=job_id),
+        'result_url': url_for('job_result', job_id=job_id)
+    }), 202
+
+@app.route('/agreements/bulk', methods=['POST'])
+def bulk_create_agreements():
+    """Create agreements from an uploaded CSV or JSONL file as a resumable background job."""
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': _('No file uploaded')}), 400
+    batch_size = _bulk_batch_size(request.form.get('batch_size', 500))
+    if batch_size is None:
+        return jsonify({'error': _('Invalid batch size')}), 400
+    source_format = request.form.get('source_format') or (
+        'jsonl' if (upload.filename or '').endswith('.jsonl') else 'csv'
+    )
+    output_format = request.form.get('output_format', 'jsonl')
+    template_id = request.form.get('template', '')
+    if source_format not in ('csv', 'jsonl') or output_format not in ('jsonl', 'zip'):
+        return jsonify({'error': _('Unsupported file format')}), 400
+    try:
+        get_compiled_template(template_id)
+    except TemplateRenderError as e:
+        return jsonify({'error': str(e)}), 400
+
+    bulk_import = BulkImport(id=uuid.uuid4().hex, template_id=template_id,
+                             source_format=source_format, output_format=output_format, source_path='')
+    source_dir = os.path.join(JOB_OUTPUT_DIR, 'imports')
+    os.makedirs(source_dir, exist_ok=True)
+    bulk_import.source_path = os.path.join(source_dir, f"{bulk_import.id}.source.{source_format}")
+    upload.save(bulk_import.source_path)
+    db.session.add(bulk_import)
+    db.session.commit()
+    return _submit_bulk_import(bulk_import, batch_size)
+
+@app.route('/agreements/bulk/<import_id>')
+def bulk_import_status(import_id):
+    bulk_import = db.session.get(BulkImport, import_id)
+    if bulk_import is None:
+        return jsonify({'error': _('Bulk import not found')}), 404
+    return jsonify(bulk_import.to_dict())
+
+@app.route('/agreements/bulk/<import_id>/resume', methods=['POST'])
+def resume_bulk_import(import_id):
+    """Continue a failed bulk import from its last committed batch."""
+    bulk_import = db.session.get(BulkImport, import_id)
+    if bulk_import is None:
+        return jsonify({'error': _('Bulk import not found')}), 404
+    data = request.get_json(silent=True) or {}
+    batch_size = _bulk_batch_size(data.get('batch_size', 500))
+    if batch_size is None:
+        return jsonify({'error': _('Invalid batch size')}), 400
+    if not _claim_bulk_import(import_id):
+        db.session.refresh(bulk_import)
+        return jsonify({'error': _('Bulk import is not resumable'), 'status': bulk_import.status}), 409
+    return _submit_bulk_import(bulk_import, batch_size)
+
+@app.cli.command('bulk-create')
+@click.argument('source', type=click.Path(exists=True, dir_okay=False), required=False)
+@click.option('--template', 'template_id', help='Template id used for rows without a "template" column.')
+@click.option('--format', 'output_format', type=click.Choice(['jsonl', 'zip']), default='jsonl',
+              help='Output: JSONL manifest or ZIP of PDFs.')
+@click.option('--batch-size', default=500, show_default=True)
+@click.option('--resume', 'import_id', help='Resume a previous import by id instead of starting one.')
+def bulk_create_command(source, template_id, output_format, batch_size, import_id):
+    """Create agreements from a CSV or JSONL file of template field values."""
+    if import_id:
+        bulk_import = db.session.get(BulkImport, import_id)
+        if bulk_import is None:
+            raise click.ClickException(f"Bulk import not found: {import_id}")
+        if not _claim_bulk_import(import_id):
+            raise click.ClickException(
+                f"Bulk import {import_id} is {bulk_import.status}; only failed imports can be resumed"
+            )
+    else:
+        if not source or not template_id:
+            raise click.UsageError("SOURCE and --template are required unless --resume is given")
+        try:
+            get_compiled_template(template_id)
+        except TemplateRenderError as e:
+            raise click.ClickException(str(e))
+        bulk_import = BulkImport(
+            id=uuid.uuid4().hex,
+            template_id=template_id,
+            source_path=os.path.abspath(source),
+            source_format='jsonl' if source.endswith('.jsonl') else 'csv',
+            output_format=output_format
+        )
+        db.session.add(bulk_import)
+        db.session.commit()
+        click.echo(f"Started bulk import {bulk_import.id}", err=True)
+
+    def progress(state):
+        click.echo(f"  {state.rows_done} rows: {state.created_count} created, {state.failed_count} failed", err=True)
+
+    try:
+        result = run_bulk_import(bulk_import, batch_size=batch_size, progress=progress)
+    except Exception as e:
+        raise click.ClickException(f"{e}\nResume with: flask bulk-create --resume {bulk_import.id}")
+    click.echo(
+        f"Created {result['created']} agreements ({result['failed']} rows failed) in {result['seconds']}s; "
+        f"output: {result['path']}",
+        err=True
+    )
+
+def recover_interrupted_work():
+    """Fail jobs and bulk imports a previous process left unfinished, so they can be polled to an end or resumed."""
+    try:
+        jobs.recover_interrupted()
+        with app.app_context():
+            count = db.session.execute(
+                update(BulkImport)
+                .where(BulkImport.status.in_(('queued', 'running')))
+                .values(status='failed', error='Interrupted by a restart', updated_at=datetime.utcnow())
+            ).rowcount
+            db.session.commit()
+    except SQLAlchemyError as e:
+        logger.error(f"Error recovering interrupted jobs: {str(e)}")
+        return
+    if count:
+        logger.warning(f"Marked {count} interrupted bulk imports as failed; resume them to continue")
+
+@app.cli.command('recover-jobs')
+def recover_jobs_command():
+    """Fail jobs and bulk imports left unfinished; run when the web process is stopped."""
+    recover_interrupted_work()
+
+def create_app(config=None):
+    """Application factory used by the WSGI entry point.
+
+    Heavy services (OpenAI client, PDF renderer, QR rendering and scanning)
+    are initialized on first use, so a worker only pays for what its
+    requests touch. Set PRELOAD_SERVICES=1 to initialize them up front
+    instead, e.g. with ``gunicorn --preload wsgi:app`` so forked workers share them.
+    Translation catalogs are small and always loaded here.
+    """
+    if config:
+        app.config.update(config)
+    preload_translations()
+    if SEARCH_ENABLED:
+        try:
+            with app.app_context():
+                search_index.ensure_schema(db.engine)
+        except (SearchIndexError, SQLAlchemyError) as e:
+            logger.warning(f"Full-text search unavailable: {str(e)}")
+    if os.environ.get("PRELOAD_SERVICES", "0") == "1":
+        get_openai_client()
+        render_limiter.start()
+        # Imported for their side effect of loading qrcode/PIL and libzbar
+        import qrcode.image.svg  # noqa: F401
+        import pyzbar.pyzbar  # noqa: F401
+    return app
+
+QR_SCAN_MAX_FRAMES = int(os.environ.get("QR_SCAN_MAX_FRAMES", "8"))
+
+@app.errorhandler(QRDecoderBusy)
+def qr_decoder_busy(e):
+    response = jsonify({'error': _('QR scanner is busy, please try again shortly')})
+    response.headers['Retry-After'] = '2'
+    return response, 503
+
+@app.route('/qr/scan-batch', methods=['POST'])
+def scan_qr_batch():
+    """Decode several camera frames at once and return the first verification code found."""
+    frames = (request.get_json(silent=True) or {}).get('frames') or []
+    if not isinstance(frames, list) or not all(isinstance(frame, str) for frame in frames):
+        return jsonify({'error': _('Invalid frames')}), 400
+    if not frames or len(frames) > QR_SCAN_MAX_FRAMES:
+        return jsonify({'error': _('Send between 1 and %(max)s frames', max=QR_SCAN_MAX_FRAMES)}), 400
+
+    results = QRCodeService.scan_qr_codes(frames)
+    verification_code = None
+    for data in results:
+        code = (data or '').rstrip('/').rsplit('/', 1)[-1]
+        if QRCodeService.is_valid_code(code):
+            verification_code = code
+            break
+    return jsonify({
+        'results': results,
+        'verification_code': verification_code,
+        'verify_url': url_for('verify_agreement_by_code', verification_code=verification_code)
+        if verification_code else None
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text-format metrics for this worker process."""
+    if not metrics.ENABLED:
+        abort(404)
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+SEARCH_PAGE_MAX = 100
+
+def _page_limit():
+    try:
+        return min(max(int(request.args.get('limit', 20)), 1), SEARCH_PAGE_MAX)
+    except ValueError:
+        abort(400)
+
+@app.route('/api/agreements')
+def list_agreements_api():
+    """Newest-first agreement listing, paged with ``?after=<id>`` from the previous page's ``next``."""
+    try:
+        after_id = int(request.args['after']) if request.args.get('after') else None
+    except ValueError:
+        return jsonify({'error': _('Invalid cursor')}), 400
+    signed = {'true': True, 'false': False}.get(request.args.get('signed', '').lower())
+    results, next_after = list_agreements(db.session, Agreement, _page_limit(), after_id, signed)
+    return jsonify({'results': results, 'next': next_after})
+
+@app.route('/api/agreements/search')
+def search_agreements_api():
+    """Full-text search over content, parties and entities, paged with the opaque ``?cursor=``."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': _('No search query provided')}), 400
+    try:
+        results, next_cursor = search_agreements(db.session, Agreement, search_index, query,
+                                                 _page_limit(), request.args.get('cursor') or None)
+    except SearchIndexError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'results': results, 'next': next_cursor})
+
+@app.cli.command('reindex-search')
+@click.option('--batch-size', default=500, show_default=True)
+def reindex_search_command(batch_size):
+    """Build or rebuild the full-text index for every stored agreement."""
+    search_index.ensure_schema(db.engine)
+    indexed, after_id = 0, 0
+    while True:
+        # Keyset batches, so each one can be committed without holding a cursor open
+        rows = db.session.execute(
+            select(Agreement.id, Agreement.content, Agreement.signed_at)
+            .where(Agreement.id > after_id).order_by(Agreement.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        indexed += search_index.index_many(
+            db.session.connection(), ((row.id, row.content, _search_extra(row.signed_at)) for row in rows)
+        )
+        db.session.commit()
+        after_id = rows[-1].id
+        click.echo(f"Indexed {indexed} agreements", err=True)
+    click.echo(f"Indexed {indexed} agreements")
+
+def _sse_response(events):
+    def generate():
+        for event, data in events:
+            yield format_sse(event, data)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/analyze/stream', methods=['POST'])
+def stream_analysis():
+    """Stream text analysis as Server-Sent Events: local highlights first, then each section."""
+    text = (request.get_json(silent=True) or {}).get('text', '')
+    if not isinstance(text, str) or not text.strip():
+        return jsonify({'error': _('No text provided')}), 400
+    return _sse_response(stream_text_analysis(text))
+
+@app.route('/templates/suggest/stream', methods=['POST'])
+def stream_suggestions():
+    """Stream template suggestions as Server-Sent Events, starting with the local match."""
+    text = (request.get_json(silent=True) or {}).get('text', '')
+    if not isinstance(text, str) or not text.strip():
+        return jsonify({'error': _('No text provided')}), 400
+    return _sse_response(stream_template_suggestions(text))
+
 [... rest of the file remains unchanged ...]
@@ -0,0 +1,69 @@
+"""JSON baselines shared by the benchmark scripts.
+
+A results file maps benchmark names to metric dicts, e.g.
+``{"verify_agreement": {"median_ms": 0.41, "p95_ms": 0.52}}``. Lower is
+better for every compared metric. ``--update-baseline`` writes the current
+run as the new baseline; otherwise the run is compared against it and the
+script exits non-zero when a metric regresses by more than ``--threshold``.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+from typing import Dict, List
+
+def add_baseline_arguments(parser: argparse.ArgumentParser, default_path: str) -> None:
+    parser.add_argument('--baseline', default=default_path, help='Baseline JSON file (default: %(default)s).')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed slowdown before failing, as a fraction (default: %(default)s).')
+    parser.add_argument('--update-baseline', action='store_true', help='Save this run as the new baseline.')
+    parser.add_argument('--output', help='Also write this run\'s results to a JSON file.')
+
+def _document(results: Dict[str, Dict[str, float]]) -> Dict:
+    return {
+        'created_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results
+    }
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            metrics: List[str], threshold: float) -> List[str]:
+    """Descriptions of every metric that is slower than the baseline by more than ``threshold``."""
+    regressions = []
+    for name, values in results.items():
+        for metric in metrics:
+            before, after = baseline.get(name, {}).get(metric), values.get(metric)
+            if before and after is not None and after > before * (1 + threshold):
+                regressions.append(f"{name} {metric}: {before:.3f} -> {after:.3f} (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+def finish(results: Dict[str, Dict[str, float]], args: argparse.Namespace, metrics: List[str]) -> None:
+    """Save or compare results according to the baseline arguments and exit."""
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(_document(results), f, indent=2)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(_document(results), f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        sys.exit(0)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    regressions = compare(results, baseline, metrics, args.threshold)
+    if regressions:
+        print(f"FAIL: {len(regressions)} regression(s) above {args.threshold * 100:.0f}%:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"OK: no regressions above {args.threshold * 100:.0f}% against {args.baseline}")
+    sys.exit(0)
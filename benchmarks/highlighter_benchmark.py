@@ -0,0 +1,55 @@
+"""Micro-benchmark: six-regex highlight loop vs the single-pass highlighter.
+
+Run from the repository root:
+
+    python -m benchmarks.highlighter_benchmark
+"""
+import io
+import re
+import timeit
+
+from templates import AGREEMENT_TEMPLATES
+from services.highlighter import (
+    AMOUNT_PATTERN, DATE_PATTERN, NAME_PATTERN, KEYWORD_CATEGORIES,
+    find_highlight_spans, group_highlight_spans, iter_highlight_spans,
+)
+
+TARGET_SIZE = 200 * 1024
+
+def legacy_highlight_key_elements(text: str) -> dict:
+    """The previous implementation: one uncompiled finditer per pattern."""
+    patterns = {
+        'amounts': AMOUNT_PATTERN,
+        'dates': DATE_PATTERN,
+        'names': NAME_PATTERN,
+        'legal_terms': r'\b(?:' + '|'.join(KEYWORD_CATEGORIES['legal_terms']) + r')\b',
+        'obligations': r'\b(?:' + '|'.join(KEYWORD_CATEGORIES['obligations']) + r')\b',
+        'conditions': r'\b(?:' + '|'.join(KEYWORD_CATEGORIES['conditions']) + r')\b',
+    }
+    highlights = {}
+    for key, pattern in patterns.items():
+        highlights[key] = [match.group() for match in re.finditer(pattern, text)]
+    return highlights
+
+def build_contract(size: int = TARGET_SIZE) -> str:
+    sample = "\n\n".join(template['content'] for template in AGREEMENT_TEMPLATES.values())
+    sample += ("\nThe Buyer shall pay $12,500.00 to Northwind Traders LLC on March 3, 2025, "
+               "subject to inspection, provided that delivery occurs by 04/15/2025.\n")
+    return (sample * (size // len(sample) + 1))[:size]
+
+def main(repeat: int = 5) -> None:
+    text = build_contract()
+    print(f"Contract size: {len(text) / 1024:.0f} KB")
+
+    legacy = min(timeit.repeat(lambda: legacy_highlight_key_elements(text), number=1, repeat=repeat))
+    single = min(timeit.repeat(lambda: group_highlight_spans(find_highlight_spans(text)),
+                               number=1, repeat=repeat))
+    streamed = min(timeit.repeat(lambda: sum(1 for _ in iter_highlight_spans(io.StringIO(text))),
+                                 number=1, repeat=repeat))
+
+    print(f"six-regex loop:   {legacy * 1000:8.1f} ms")
+    print(f"single pass:      {single * 1000:8.1f} ms  ({legacy / single:.2f}x)")
+    print(f"single pass (io): {streamed * 1000:8.1f} ms  ({legacy / streamed:.2f}x)")
+
+if __name__ == '__main__':
+    main()
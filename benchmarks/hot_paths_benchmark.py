@@ -0,0 +1,87 @@
+"""Micro-benchmarks for the app's hot paths, with a JSON baseline regression check.
+
+Covers highlighting, document hashing, full agreement verification, template
+filling, and QR generation and scanning (skipped when qrcode/PIL/pyzbar are
+not installed). No network or database is needed. Run from the repository
+root:
+
+    python -m benchmarks.hot_paths_benchmark --update-baseline
+    python -m benchmarks.hot_paths_benchmark --threshold 0.15
+"""
+import argparse
+import os
+import statistics
+import timeit
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict
+
+from benchmarks.baseline import add_baseline_arguments, finish
+from benchmarks.highlighter_benchmark import build_contract
+from services.ai_service import highlight_key_elements
+from services.template_engine import COMPILED_TEMPLATES
+from services.verification_service import DocumentVerificationService
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines', 'hot_paths.json')
+COMPARED_METRICS = ['median_ms', 'p95_ms']
+
+def measure(func: Callable, repeat: int, min_seconds: float = 0.02) -> Dict[str, float]:
+    """Per-call timings in ms over ``repeat`` rounds of an auto-calibrated number of calls."""
+    number, _ = timeit.Timer(func).autorange()
+    number = max(1, int(number * min_seconds / 0.2))
+    rounds = sorted(t / number * 1000 for t in timeit.repeat(func, number=number, repeat=repeat))
+    return {
+        'median_ms': round(statistics.median(rounds), 4),
+        'p95_ms': round(rounds[min(len(rounds) - 1, int(len(rounds) * 0.95))], 4),
+        'min_ms': round(rounds[0], 4),
+        'calls_per_round': number
+    }
+
+def build_cases(contract_kb: int) -> Dict[str, Callable]:
+    contract = build_contract(contract_kb * 1024)
+    agreement_text = build_contract(8 * 1024)
+
+    agreement = SimpleNamespace(
+        id=1,
+        content=agreement_text,
+        signed_at=datetime.utcnow(),
+        signature1='sha256:' + 'a' * 64,
+        signature2='sha256:' + 'b' * 64
+    )
+    record = DocumentVerificationService.create_verification_record(agreement.id, agreement.content)
+
+    rental = COMPILED_TEMPLATES['rental']
+    values = {field['name']: f"value for {field['label']}" for field in rental.fields}
+
+    cases = {
+        f'highlight_key_elements_{contract_kb}kb': lambda: highlight_key_elements(contract),
+        f'calculate_document_hash_{contract_kb}kb': lambda: DocumentVerificationService.calculate_document_hash(contract),
+        'verify_agreement_8kb': lambda: DocumentVerificationService.verify_agreement(agreement, record),
+        'template_render_rental': lambda: rental.render(values),
+    }
+
+    try:
+        from services.qr_service import QRCodeService, decode_qr_bytes
+        png = QRCodeService._render('0123456789ab', 'png')
+        cases['qr_generate_png'] = lambda: QRCodeService._render('0123456789ab', 'png')
+        cases['qr_scan_png'] = lambda: decode_qr_bytes(png)
+    except ImportError as e:
+        print(f"Skipping QR benchmarks: {e}")
+    return cases
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--contract-kb', type=int, default=200)
+    add_baseline_arguments(parser, BASELINE_PATH)
+    args = parser.parse_args()
+
+    results = {}
+    for name, func in build_cases(args.contract_kb).items():
+        results[name] = measure(func, args.repeat)
+        print(f"{name:<32} median {results[name]['median_ms']:9.3f} ms   p95 {results[name]['p95_ms']:9.3f} ms")
+
+    finish(results, args, COMPARED_METRICS)
+
+if __name__ == '__main__':
+    main()
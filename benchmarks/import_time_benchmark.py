@@ -0,0 +1,73 @@
+"""Import-time benchmark and regression check for worker cold start.
+
+Runs ``python -X importtime -c "import <module>"`` in fresh interpreters and
+reports the slowest imports. Exits non-zero if a module that should load
+lazily (OpenAI client, QR/PIL, zbar, pdfkit) is imported at startup, or if
+the median import time exceeds ``--max-ms``. Run from the repository root:
+
+    python -m benchmarks.import_time_benchmark
+    python -m benchmarks.import_time_benchmark --module services.ai_service --max-ms 150
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Top-level packages that must only be imported on first use
+LAZY_MODULES = ('openai', 'qrcode', 'PIL', 'pyzbar', 'pdfkit')
+
+def measure(module: str) -> Tuple[int, Dict[str, int]]:
+    """Import ``module`` in a fresh interpreter; returns (total us, cumulative us per imported module)."""
+    env = dict(os.environ)
+    # Flask-SQLAlchemy refuses to initialize without a database URI
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, env=env
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        cumulative[name] = int(cumulative_us)
+    return cumulative.get(module, 0), cumulative
+
+def lazy_violations(cumulative: Dict[str, int]) -> List[str]:
+    return sorted(name for name in cumulative if name.split('.')[0] in LAZY_MODULES)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='app', help='Module to import (default: app).')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='Number of slowest imports to list.')
+    parser.add_argument('--max-ms', type=float, help='Fail if the median import time exceeds this.')
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    totals = [total for total, _ in runs]
+    median_ms = statistics.median(totals) / 1000
+    _, cumulative = runs[totals.index(min(totals))]
+
+    print(f"import {args.module}: median {median_ms:.1f} ms, best {min(totals) / 1000:.1f} ms "
+          f"over {args.repeat} runs, {len(cumulative)} modules")
+    for name, us in sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    violations = lazy_violations(cumulative)
+    if violations:
+        print(f"FAIL: imported at startup but should load lazily: {', '.join(violations)}")
+        failed = True
+    if args.max_ms is not None and median_ms > args.max_ms:
+        print(f"FAIL: median import time {median_ms:.1f} ms exceeds {args.max_ms:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""HTTP load harness for the agreement lifecycle: create, view, sign, download, verify.
+
+Each virtual user keeps its own session cookie and CSRF token and runs the
+full lifecycle in a loop. Per-step latency percentiles are reported and
+compared against a JSON baseline. With ``--spawn`` the harness starts the
+OpenAI stub and the app itself (SQLite database, stubbed LLM); otherwise it
+targets an already running server. Run from the repository root:
+
+    python -m benchmarks.load_test --spawn --users 8 --iterations 10 --update-baseline
+    python -m benchmarks.load_test --base-url http://127.0.0.1:5000 --users 16 --duration 60
+
+Route paths are templates with ``{id}``/``{code}`` placeholders and can be
+overridden with the ``--*-path`` options.
+"""
+import argparse
+import http.cookiejar
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+from typing import Dict, List
+
+from benchmarks.baseline import add_baseline_arguments, finish
+from benchmarks import openai_stub
+from templates import AGREEMENT_TEMPLATES
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines', 'load_test.json')
+COMPARED_METRICS = ['p50_ms', 'p95_ms']
+STEPS = ['create', 'view', 'sign', 'download', 'verify']
+
+CSRF_RE = re.compile(r'name="csrf-token" content="([^"]+)"|name="csrf_token" value="([^"]+)"')
+CODE_RE = re.compile(r'/verify/([0-9a-f]{12})')
+
+def signature_strokes(seed: int) -> str:
+    """A stroke-encoded signature as posted by signature.js, different per seed."""
+    random = Random(seed)
+    strokes = []
+    for start in (40, 160, 280):
+        numbers = [start, 100]
+        for _ in range(30):
+            numbers.extend((random.randint(1, 3), random.randint(-3, 3)))
+        strokes.append(','.join(map(str, numbers)))
+    return 'strokes:v1:400,200:' + ';'.join(strokes)
+
+class VirtualUser:
+    def __init__(self, base_url: str, paths: Dict[str, str], timeout: float, record):
+        self.base_url = base_url.rstrip('/')
+        self.paths = paths
+        self.timeout = timeout
+        self.record = record
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.csrf_token = None
+
+    def _request(self, step: str, path: str, data: Dict = None):
+        url = path if path.startswith('http') else self.base_url + path
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(url, data=body)
+        if self.csrf_token:
+            request.add_header('X-CSRFToken', self.csrf_token)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                payload = response.read()
+                final_url = response.geturl()
+            self.record(step, time.perf_counter() - started, None)
+            return final_url, payload
+        except (urllib.error.URLError, OSError) as e:
+            self.record(step, time.perf_counter() - started, str(e))
+            return None, None
+
+    def run_once(self, iteration: int) -> None:
+        if self.csrf_token is None:
+            _, page = self._request('csrf', self.paths['create'])
+            match = CSRF_RE.search((page or b'').decode(errors='replace'))
+            if not match:
+                self.record('create', 0.0, 'no CSRF token on the create page')
+                return
+            self.csrf_token = match.group(1) or match.group(2)
+
+        template = AGREEMENT_TEMPLATES[list(AGREEMENT_TEMPLATES)[iteration % len(AGREEMENT_TEMPLATES)]]
+        view_url, _ = self._request('create', self.paths['create'],
+                                    {'content': template['content'], 'csrf_token': self.csrf_token})
+        ids = re.findall(r'\d+', urllib.parse.urlparse(view_url or '').path)
+        if not ids:
+            return
+        agreement_id = ids[-1]
+
+        self._request('view', self.paths['view'].format(id=agreement_id))
+        self._request('sign', self.paths['sign'].format(id=agreement_id), {
+            'signature1': signature_strokes(iteration + 1),
+            'signature2': signature_strokes(iteration + 2),
+            'csrf_token': self.csrf_token
+        })
+        self._request('download', self.paths['download'].format(id=agreement_id))
+
+        _, page = self._request('view', self.paths['view'].format(id=agreement_id))
+        match = CODE_RE.search((page or b'').decode(errors='replace'))
+        if match:
+            self._request('verify', self.paths['verify'].format(code=match.group(1)))
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def __call__(self, step: str, seconds: float, error) -> None:
+        with self._lock:
+            if error is None:
+                self.latencies[step].append(seconds)
+            else:
+                self.errors[step] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        results = {}
+        for step in STEPS:
+            samples = sorted(self.latencies.get(step, []))
+            if not samples and not self.errors.get(step):
+                continue
+            def pct(p):
+                return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 1) if samples else 0.0
+            results[step] = {
+                'requests': len(samples),
+                'errors': self.errors.get(step, 0),
+                'rps': round(len(samples) / elapsed, 2),
+                'mean_ms': round(statistics.mean(samples) * 1000, 1) if samples else 0.0,
+                'p50_ms': pct(0.50),
+                'p95_ms': pct(0.95),
+                'p99_ms': pct(0.99)
+            }
+        return results
+
+def spawn_app(port: int, stub_port: int, latency_ms: float) -> subprocess.Popen:
+    """Start the OpenAI stub in-process and the app in a subprocess pointed at it."""
+    openai_stub.serve(port=stub_port, latency_ms=latency_ms)
+    database = os.path.join(tempfile.mkdtemp(prefix='loadtest-'), 'loadtest.db')
+    env = dict(os.environ,
+               OPENAI_BASE_URL=f'http://127.0.0.1:{stub_port}/v1',
+               OPENAI_API_KEY='stub',
+               DATABASE_URL=f'sqlite:///{database}',
+               VERIFY_RATE_LIMIT='1000000')
+    process = subprocess.Popen([sys.executable, '-m', 'flask', '--app', 'wsgi:app', 'run',
+                                '--port', str(port), '--with-threads'], env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1).read()
+            return process
+        except (urllib.error.URLError, OSError):
+            if process.poll() is not None:
+                raise SystemExit("App exited during startup")
+            time.sleep(0.5)
+    process.terminate()
+    raise SystemExit("App did not start within 30s")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=10, help='Lifecycles per user.')
+    parser.add_argument('--duration', type=float, help='Run for this many seconds instead of --iterations.')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--spawn', action='store_true', help='Start the OpenAI stub and the app locally.')
+    parser.add_argument('--port', type=int, default=5055, help='App port with --spawn.')
+    parser.add_argument('--stub-port', type=int, default=8099)
+    parser.add_argument('--llm-latency-ms', type=float, default=500, help='Stub latency with --spawn.')
+    parser.add_argument('--create-path', default='/create')
+    parser.add_argument('--view-path', default='/agreement/{id}')
+    parser.add_argument('--sign-path', default='/sign/{id}')
+    parser.add_argument('--download-path', default='/download/{id}')
+    parser.add_argument('--verify-path', default='/verify/{code}')
+    add_baseline_arguments(parser, BASELINE_PATH)
+    args = parser.parse_args()
+
+    paths = {'create': args.create_path, 'view': args.view_path, 'sign': args.sign_path,
+             'download': args.download_path, 'verify': args.verify_path}
+    process = None
+    if args.spawn:
+        process = spawn_app(args.port, args.stub_port, args.llm_latency_ms)
+        args.base_url = f'http://127.0.0.1:{args.port}'
+
+    recorder = Recorder()
+    deadline = time.time() + args.duration if args.duration else None
+
+    def run_user(user_index: int) -> None:
+        user = VirtualUser(args.base_url, paths, args.timeout, recorder)
+        iteration = 0
+        while (deadline and time.time() < deadline) or (not deadline and iteration < args.iterations):
+            user.run_once(user_index * 1000 + iteration)
+            iteration += 1
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.users) as executor:
+            list(executor.map(run_user, range(args.users)))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    elapsed = time.perf_counter() - started
+
+    results = recorder.summary(elapsed)
+    print(f"{args.users} users, {elapsed:.1f}s")
+    print(f"{'step':<10}{'reqs':>7}{'errors':>8}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for step, row in results.items():
+        print(f"{step:<10}{row['requests']:>7}{row['errors']:>8}{row['rps']:>8}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+    if any(row['errors'] for row in results.values()):
+        print("WARNING: some requests failed; check the --*-path options and server logs")
+
+    finish(results, args, COMPARED_METRICS)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Local stand-in for the OpenAI chat completions API used by the load tests.
+
+Replays canned JSON answers for the app's prompts after a configurable
+latency, so load tests exercise the full request path without network calls
+or cost. Point the app at it through the client's standard environment
+variables:
+
+    python -m benchmarks.openai_stub --port 8099 --latency-ms 800 --jitter-ms 200
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=stub python main.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TEXT_ANALYSIS = {
+    'formatted_text': 'This agreement is made between the parties named below.',
+    'key_terms': [{'term': 'Indemnification', 'definition': 'One party covers the other\'s losses.',
+                   'risk_level': 'medium', 'context': 'Section 7'}],
+    'missing_details': [{'field': 'jurisdiction', 'importance': 'required',
+                         'context': 'Governing law is not stated.', 'suggestions': ['State of New York']}],
+    'improvements': [{'type': 'clarity', 'suggestion': 'Define "Services" explicitly.', 'priority': 'medium'}],
+    'compliance_analysis': {'jurisdiction': 'US', 'requirements': [], 'gaps': [], 'recommendations': []},
+    'risk_highlights': [{'text': 'unlimited liability', 'risk_type': 'financial', 'severity': 'high',
+                         'mitigation': 'Cap liability at fees paid.'}]
+}
+
+TEMPLATE_SUGGESTIONS = {
+    'template_matches': [
+        {'template_name': 'Service Agreement', 'confidence_score': 0.82,
+         'matching_factors': ['services', 'payment'], 'customization_needed': ['rate'], 'template_id': 'service'},
+        {'template_name': 'Non-Disclosure Agreement', 'confidence_score': 0.35,
+         'matching_factors': ['confidential'], 'customization_needed': [], 'template_id': 'nda'}
+    ],
+    'industry_context': {},
+    'key_elements': ['services', 'payment schedule'],
+    'semantic_analysis': {'key_concepts': ['services'], 'relationship_type': 'vendor',
+                          'obligation_analysis': {}},
+    'compliance_suggestions': [],
+    'risk_assessment': {'risk_level': 'low', 'risk_factors': [], 'mitigation_suggestions': []}
+}
+
+INDUSTRY_CONTEXT = {
+    'industry': 'Professional services',
+    'terminology': [],
+    'compliance_requirements': [],
+    'jurisdiction_hints': [],
+    'risk_factors': []
+}
+
+def canned_answer(prompt: str) -> dict:
+    """Pick the canned answer matching the prompt builder that produced ``prompt``."""
+    if 'template_matches' in prompt:
+        return TEMPLATE_SUGGESTIONS
+    if 'industry-specific context' in prompt:
+        return INDUSTRY_CONTEXT
+    return TEXT_ANALYSIS
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.5
+    jitter = 0.0
+    requests_served = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send(404, {'error': {'message': f'Unknown path {self.path}'}})
+            return
+
+        prompt = ' '.join(message.get('content', '') for message in body.get('messages', []))
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        content = json.dumps(canned_answer(prompt))
+        with StubHandler.lock:
+            StubHandler.requests_served += 1
+        self._send(200, {
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'gpt-4'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            # Roughly four characters per token, like the real tokenizer on English
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(content) // 4,
+                      'total_tokens': (len(prompt) + len(content)) // 4}
+        })
+
+    def _send(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(host: str = '127.0.0.1', port: int = 8099, latency_ms: float = 500, jitter_ms: float = 0):
+    """Start the stub in a background thread and return the server."""
+    StubHandler.latency = latency_ms / 1000
+    StubHandler.jitter = jitter_ms / 1000
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name='openai-stub').start()
+    return server
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency-ms', type=float, default=500)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency_ms, args.jitter_ms)
+    print(f"OpenAI stub listening on http://{args.host}:{args.port}/v1 "
+          f"(latency {args.latency_ms:g}±{args.jitter_ms:g} ms)")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"{StubHandler.requests_served} completions served")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
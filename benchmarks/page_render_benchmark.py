@@ -0,0 +1,89 @@
+"""Requests per second for the index and create pages, with and without the fragment cache.
+
+Pages are requested in-process through Flask's test client, cycling through
+every configured language, first with the fragment cache disabled (the
+previous behaviour) and then enabled. A conditional re-request of the index
+page measures the ETag/304 path. Uses a throwaway SQLite database unless
+DATABASE_URL is set. Run from the repository root:
+
+    python -m benchmarks.page_render_benchmark --update-baseline
+    python -m benchmarks.page_render_benchmark --requests 2000
+"""
+import argparse
+import os
+import time
+from typing import Dict, List
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from flask import url_for
+
+from benchmarks.baseline import add_baseline_arguments, finish
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines', 'page_render.json')
+COMPARED_METRICS = ['ms_per_request']
+PAGES = ['index', 'create_agreement']
+
+def run(clients: List, path: str, requests: int, headers: List[Dict] = None) -> Dict[str, float]:
+    """Round-robin ``requests`` GETs over the clients; ``headers`` pairs with ``clients``."""
+    not_modified = 0
+    started = time.perf_counter()
+    for i in range(requests):
+        index = i % len(clients)
+        response = clients[index].get(path, headers=headers[index] if headers else None)
+        if response.status_code not in (200, 304):
+            raise SystemExit(f"GET {path} returned {response.status_code}")
+        not_modified += response.status_code == 304
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': requests,
+        'not_modified': not_modified,
+        'rps': round(requests / elapsed, 1),
+        'ms_per_request': round(elapsed / requests * 1000, 3)
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000, help='Requests per page and mode.')
+    add_baseline_arguments(parser, BASELINE_PATH)
+    args = parser.parse_args()
+
+    from app import create_app, db, fragment_cache
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    with app.test_request_context():
+        paths = {page: url_for(page) for page in PAGES}
+        language_paths = [url_for('set_language', lang_code=code) for code in app.config['LANGUAGES']]
+
+    # One client (and session) per language
+    clients = []
+    for language_path in language_paths:
+        client = app.test_client()
+        client.get(language_path)
+        clients.append(client)
+
+    results = {}
+    for mode, enabled in (('uncached', False), ('cached', True)):
+        fragment_cache.enabled = enabled
+        fragment_cache.clear()
+        for page, path in paths.items():
+            run(clients, path, len(clients))
+            results[f'{page}_{mode}'] = run(clients, path, args.requests)
+
+    etags = [{'If-None-Match': client.get(paths['index']).headers.get('ETag', '')} for client in clients]
+    results['index_revalidated'] = run(clients, paths['index'], args.requests, etags)
+
+    print(f"{len(clients)} languages, {args.requests} requests per case")
+    print(f"{'case':<28}{'rps':>10}{'ms/req':>10}{'304s':>8}")
+    for name, row in results.items():
+        print(f"{name:<28}{row['rps']:>10}{row['ms_per_request']:>10}{row['not_modified']:>8}")
+    for page in PAGES:
+        before, after = results[f'{page}_uncached'], results[f'{page}_cached']
+        print(f"{page}: {after['rps'] / before['rps']:.2f}x requests per second with the fragment cache")
+    print(f"fragment cache: {fragment_cache.stats()}")
+
+    finish(results, args, COMPARED_METRICS)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Throughput benchmark: full-frame pyzbar decode vs the downsampling QR decode pipeline.
+
+Builds phone-camera-sized JPEG frames with a verification QR code placed
+near the centre, then decodes them with the previous approach (PIL open +
+pyzbar on the full colour frame), with ``decode_qr_bytes`` in-process, and
+through ``QRDecodePool``. Run from the repository root:
+
+    python -m benchmarks.qr_decode_benchmark --frames 24 --workers 4
+"""
+import argparse
+import os
+import random
+import time
+from io import BytesIO
+from typing import List
+
+from services.qr_service import QRCodeService, QRDecodePool, decode_qr_bytes
+
+FRAME_SIZE = (4032, 3024)
+
+def build_frames(count: int, seed: int = 7) -> List[bytes]:
+    from PIL import Image, ImageFilter
+
+    rng = random.Random(seed)
+    noise = Image.effect_noise((FRAME_SIZE[0] // 4, FRAME_SIZE[1] // 4), 40).resize(FRAME_SIZE)
+    frames = []
+    for _ in range(count):
+        code = os.urandom(6).hex()
+        qr = Image.open(BytesIO(QRCodeService._render(code, 'png'))).convert('RGB')
+        side = rng.randint(600, 1000)
+        qr = qr.resize((side, side))
+        frame = Image.merge('RGB', (noise, noise, noise)).filter(ImageFilter.GaussianBlur(1))
+        x = FRAME_SIZE[0] // 2 - side // 2 + rng.randint(-300, 300)
+        y = FRAME_SIZE[1] // 2 - side // 2 + rng.randint(-200, 200)
+        frame.paste(qr, (x, y))
+        buffered = BytesIO()
+        frame.save(buffered, format='JPEG', quality=90)
+        frames.append(buffered.getvalue())
+    return frames
+
+def legacy_decode(image_bytes: bytes):
+    """The previous scan_qr_code body: decode the full frame as uploaded."""
+    from PIL import Image
+    from pyzbar.pyzbar import decode
+
+    decoded_objects = decode(Image.open(BytesIO(image_bytes)))
+    return decoded_objects[0].data.decode() if decoded_objects else None
+
+def run(label: str, decode_all, frames: List[bytes], baseline: float = None) -> float:
+    started = time.perf_counter()
+    results = decode_all(frames)
+    elapsed = time.perf_counter() - started
+    found = sum(1 for result in results if result)
+    speedup = f"  ({baseline / elapsed:.2f}x)" if baseline else ""
+    print(f"{label:<22} {elapsed * 1000 / len(frames):8.1f} ms/frame  "
+          f"{len(frames) / elapsed:6.1f} frames/s  decoded {found}/{len(frames)}{speedup}")
+    return elapsed
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=24)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    frames = build_frames(args.frames)
+    print(f"{len(frames)} frames of {FRAME_SIZE[0]}x{FRAME_SIZE[1]}, "
+          f"avg {sum(map(len, frames)) / len(frames) / 1024:.0f} KB JPEG")
+
+    legacy = run('full frame (legacy)', lambda fs: [legacy_decode(f) for f in fs], frames)
+    run('pipeline, in-process', lambda fs: [decode_qr_bytes(f) for f in fs], frames, legacy)
+
+    pool = QRDecodePool(workers=args.workers, max_queue=len(frames), timeout=30)
+    pool.decode(frames[0])  # start the worker processes outside the timing
+    run(f'pipeline, {args.workers} processes', pool.decode_many, frames, legacy)
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,11 @@
-from app import app
+from app import create_app, recover_interrupted_work
 
+# The app is built only when run as a script: the QR decode and bulk
+# verification pools spawn processes that re-import this module as
+# __mp_main__, and they must not build their own app. WSGI servers use wsgi:app.
 if __name__ == "__main__":
+    app = create_app()
+    # This single process runs every background job, so anything still
+    # queued or running in the database was cut off by the last restart
+    recover_interrupted_work()
     app.run(host="0.0.0.0", port=5000)
@@ -1,50 +1,138 @@
 import os
-from openai import OpenAI
+import threading
+import time
+import logging
 from templates import AGREEMENT_TEMPLATES
+from services.cache_service import create_response_cache
+from services.template_matcher import template_matcher
+from services.highlighter import find_highlight_spans, group_highlight_spans
+from services.clause_chunker import split_clauses, merge_analyses
+from services import metrics
+from services.model_router import model_router
+from services.prompt_budget import trim_to_budget, compact_context
+from concurrent.futures import ThreadPoolExecutor
 import json
-import re
+
+logger = logging.getLogger(__name__)
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+_openai_client = None
+_openai_client_lock = threading.Lock()
+response_cache = create_response_cache()
 
-def analyze_industry_context(text: str) -> dict:
-    """Analyze the industry context and specific terminology."""
-    prompt = f"""Analyze the following text and identify industry-specific context. Return a JSON object with:
+# Local template matches at or above this confidence skip the LLM entirely.
+LOCAL_MATCH_THRESHOLD = float(os.environ.get("AI_LOCAL_MATCH_THRESHOLD", "0.7"))
+
+# Texts longer than this are analyzed clause by clause and merged.
+CHUNK_THRESHOLD = int(os.environ.get("AI_CHUNK_THRESHOLD", "6000"))
+CHUNK_MAX_CHARS = int(os.environ.get("AI_CHUNK_MAX_CHARS", "4000"))
+MAX_CONCURRENCY = int(os.environ.get("AI_MAX_CONCURRENCY", "4"))
+
+def get_openai_client():
+    """The shared OpenAI client, created on first use so importing this module stays cheap."""
+    global _openai_client
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                from openai import OpenAI
+                _openai_client = OpenAI(api_key=OPENAI_API_KEY)
+    return _openai_client
+
+def chat_json_steps(kind: str, prompt: str, model: str = None):
+    """Cache lookup, model routing and fallback for one prompt, without the API call.
+
+    Without an explicit ``model`` the router picks the tier, and a fast-tier
+    answer that fails schema validation is retried on the strong tier. The
+    accepted answer is cached under the first model tried, so a prompt that
+    needed the fallback does not pay for the fast call again.
+
+    A generator shared by the sync and async clients: it yields each model
+    to call, is sent back ``(response, seconds)``, and returns the content.
+    """
+    models = [model] if model else model_router.models_for(kind, prompt)
+    started = time.perf_counter()
+    cached = response_cache.get(models[0], kind, prompt)
+    if cached is not None:
+        metrics.record_llm_call(kind, models[0], time.perf_counter() - started, cached=True)
+        return cached
+
+    for index, candidate in enumerate(models):
+        response, seconds = yield candidate
+        metrics.record_llm_call(kind, candidate, seconds, cached=False, usage=getattr(response, 'usage', None))
+        content = response.choices[0].message.content
+        problem = model_router.validate(kind, content)
+        if problem is None:
+            response_cache.set(models[0], kind, prompt, content)
+            return content
+        if index + 1 < len(models):
+            logger.warning(f"Rejected {candidate} answer for {kind} ({problem}); retrying on {models[index + 1]}")
+            metrics.LLM_FALLBACKS.inc(kind=kind, model=candidate)
+    return content
+
+def chat_request(model: str, prompt: str) -> dict:
+    """Arguments for one JSON-mode chat completion."""
+    return {
+        'model': model,
+        'messages': [{"role": "user", "content": prompt}],
+        'response_format': {"type": "json_object"}
+    }
+
+def _chat_json(kind: str, prompt: str, model: str = None) -> str:
+    """Return the JSON completion for a prompt, served from the response cache when possible."""
+    steps = chat_json_steps(kind, prompt, model)
+    try:
+        candidate = next(steps)
+        while True:
+            started = time.perf_counter()
+            with metrics.span(f"llm.{kind}"):
+                response = get_openai_client().chat.completions.create(**chat_request(candidate, prompt))
+            candidate = steps.send((response, time.perf_counter() - started))
+    except StopIteration as done:
+        return done.value
+
+def build_industry_context_prompt(text: str) -> str:
+    """Build the prompt for the industry context analysis."""
+    return f"""Analyze the following text and identify industry-specific context. Return a JSON object with:
     1. industry: The primary industry this agreement relates to
     2. terminology: List of industry-specific terms with explanations
     3. compliance_requirements: List of relevant compliance considerations
     4. jurisdiction_hints: Any mentioned or implied jurisdictions
     5. risk_factors: List of potential legal or business risks
     
-    Text to analyze: {text}
+    Text to analyze: {trim_to_budget(text)}
     """
+
+def analyze_industry_context(text: str) -> dict:
+    """Analyze the industry context and specific terminology."""
+    prompt = build_industry_context_prompt(text)
     
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
-        )
-        content = response.choices[0].message.content
+        content = _chat_json("industry_context", prompt)
         result = json.loads(content) if content else {}
         return result
     except Exception as e:
-        print(f"Error analyzing industry context: {str(e)}")
+        logger.error(f"Error analyzing industry context: {str(e)}")
         return {}
 
-def get_template_suggestions(user_input: str) -> dict:
-    """Get enhanced template suggestions with semantic analysis."""
-    # First, get industry context
-    context = analyze_industry_context(user_input)
-    
-    prompt = f"""Analyze the following user input and provide detailed suggestions. Return a JSON object with:
+def build_template_suggestions_prompt(user_input: str, context: dict = None) -> str:
+    """Build the template matching prompt.
+
+    When ``context`` is None the industry context is left out so the prompt
+    can run alongside ``analyze_industry_context`` instead of after it.
+    """
+    if context is None:
+        context_item = "2. industry_context: An empty object; it is supplied separately"
+    else:
+        context_item = f"2. industry_context: {compact_context(context)}"
+
+    return f"""Analyze the following user input and provide detailed suggestions. Return a JSON object with:
     1. template_matches: Array of objects containing:
         - template_name: Name of the template
         - confidence_score: Number between 0-1
         - matching_factors: List of reasons why this template matches
         - customization_needed: List of suggested customizations
         - template_id: Template identifier
-    2. industry_context: {json.dumps(context)}
+    {context_item}
     3. key_elements: List of important elements detected in the input
     4. semantic_analysis: {{
         "key_concepts": List of main legal concepts,
@@ -59,41 +147,51 @@ def get_template_suggestions(user_input: str) -> dict:
     }}
     
     Available templates: {[template['name'] for template in AGREEMENT_TEMPLATES.values()]}
-    User input: {user_input}
+    User input: {trim_to_budget(user_input)}
     """
-    
-    try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
-        )
-        content = response.choices[0].message.content
-        if not content:
-            raise ValueError("OpenAI returned an empty response.")
-            
-        result = json.loads(content)
-        
-        # Find best matching template and add template_id
-        if result.get('template_matches'):
-            best_match = max(result['template_matches'], 
-                           key=lambda x: x['confidence_score'])
-            result['best_match'] = best_match['template_name']
-            result['confidence'] = best_match['confidence_score']
-            
-            for template_id, template_data in AGREEMENT_TEMPLATES.items():
-                if template_data['name'] == best_match['template_name']:
-                    best_match['template_id'] = template_id
-                    break
+
+def select_best_match(result: dict) -> dict:
+    """Find best matching template and add template_id."""
+    if result.get('template_matches'):
+        best_match = max(result['template_matches'], 
+                       key=lambda x: x['confidence_score'])
+        result['best_match'] = best_match['template_name']
+        result['confidence'] = best_match['confidence_score']
         
-        return result
-    except Exception as e:
-        print(f"Error getting template suggestions: {str(e)}")
-        return {}
+        for template_id, template_data in AGREEMENT_TEMPLATES.items():
+            if template_data['name'] == best_match['template_name']:
+                best_match['template_id'] = template_id
+                break
+    
+    return result
 
-def analyze_and_format_text(text: str) -> dict:
-    """Enhanced analysis and formatting of agreement text."""
-    prompt = f"""Analyze and improve the following legal agreement text. Return a JSON object with:
+def get_template_suggestions(user_input: str) -> dict:
+    """Get enhanced template suggestions with semantic analysis."""
+    local_result = template_matcher.match(user_input)
+    if local_result['confidence'] >= LOCAL_MATCH_THRESHOLD:
+        return local_result
+
+    with metrics.collect_llm_usage() as calls:
+        # First, get industry context
+        context = analyze_industry_context(user_input)
+
+        prompt = build_template_suggestions_prompt(user_input, context)
+
+        try:
+            content = _chat_json("template_suggestions", prompt)
+            if not content:
+                raise ValueError("OpenAI returned an empty response.")
+
+            result = json.loads(content)
+            result['usage'] = metrics.usage_summary(calls)
+            return select_best_match(result)
+        except Exception as e:
+            logger.error(f"Error getting template suggestions: {str(e)}")
+            return {}
+
+def build_text_analysis_prompt(text: str) -> str:
+    """Build the prompt for the agreement text analysis."""
+    return f"""Analyze and improve the following legal agreement text. Return a JSON object with:
     1. formatted_text: The text formatted in clear, simple language
     2. key_terms: Array of objects containing:
         - term: The legal term
@@ -121,39 +219,77 @@ def analyze_and_format_text(text: str) -> dict:
         - severity: "high", "medium", or "low"
         - mitigation: Suggested mitigation
     
-    Text to analyze: {text}
+    Text to analyze: {trim_to_budget(text)}
     """
-    
+
+def build_clause_analysis_prompt(clause: str) -> str:
+    """Build the analysis prompt for one section of a longer agreement."""
+    return build_text_analysis_prompt(clause) + """
+    The text above is one section of a longer agreement. Only report on this
+    section and leave arrays empty when nothing applies to it.
+    """
+
+def chunk_text(text: str) -> list:
+    """Clauses analyzed separately; short texts are analyzed in one call."""
+    return split_clauses(text, CHUNK_MAX_CHARS) if len(text) > CHUNK_THRESHOLD else [text]
+
+def merge_clause_analyses(analyses: list) -> dict:
+    """Merge per-clause results, listing the indexes of sections that failed."""
+    failed = [index for index, analysis in enumerate(analyses) if analysis is None]
+    if len(failed) == len(analyses):
+        raise ValueError("Analysis failed for every section.")
+
+    result = merge_analyses([analysis for analysis in analyses if analysis is not None])
+    if failed:
+        result['failed_sections'] = failed
+    return result
+
+def highlight_fields(text: str) -> dict:
+    """Grouped highlights and the raw spans, as added to every text analysis."""
+    spans = find_highlight_spans(text)
+    return {'highlights': group_highlight_spans(spans), 'highlight_spans': spans}
+
+def analyze_clause(clause: str) -> dict:
+    """Analyze a single clause; unchanged clauses are served from the response cache."""
+    content = _chat_json("clause_analysis", build_clause_analysis_prompt(clause))
+    if not content:
+        raise ValueError("OpenAI returned an empty response.")
+    return json.loads(content)
+
+def _analyze_in_chunks(clauses: list) -> dict:
+    """Analyze clauses in parallel with bounded concurrency and merge the results."""
+    usage_calls = metrics.current_llm_usage()
+
+    def analyze(clause):
+        try:
+            with metrics.collect_llm_usage(usage_calls):
+                return analyze_clause(clause)
+        except Exception as e:
+            logger.error(f"Error analyzing clause: {str(e)}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as executor:
+        return merge_clause_analyses(list(executor.map(analyze, clauses)))
+
+def analyze_and_format_text(text: str) -> dict:
+    """Enhanced analysis and formatting of agreement text."""
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
-        )
-        content = response.choices[0].message.content
-        if not content:
-            raise ValueError("OpenAI returned an empty response.")
-            
-        result = json.loads(content)
-        result['highlights'] = highlight_key_elements(text)
+        clauses = chunk_text(text)
+        with metrics.collect_llm_usage() as calls:
+            if len(clauses) > 1:
+                result = _analyze_in_chunks(clauses)
+            else:
+                content = _chat_json("text_analysis", build_text_analysis_prompt(text))
+                if not content:
+                    raise ValueError("OpenAI returned an empty response.")
+                result = json.loads(content)
+        result['usage'] = metrics.usage_summary(calls)
+        result.update(highlight_fields(text))
         return result
     except Exception as e:
-        print(f"Error analyzing text: {str(e)}")
+        logger.error(f"Error analyzing text: {str(e)}")
         return {}
 
 def highlight_key_elements(text: str) -> dict:
     """Identify and highlight key elements with enhanced patterns."""
-    patterns = {
-        'amounts': r'\$\s*[\d,]+(?:\.\d{2})?|\d+(?:\.\d{2})?\s*dollars',
-        'dates': r'\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\s+\d{1,2},\s+\d{4}\b',
-        'names': r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b(?:\s+(?:LLC|Inc\.|Corporation|Corp\.|Ltd\.|Limited|Company|Co\.|LP|LLP|PC|DBA|S\.A\.|N\.A\.|AG|SE|GmbH|Pty\.|PLC))?\b',
-        'legal_terms': r'\b(?:hereby|whereas|shall|pursuant to|notwithstanding|herein|thereof|thereto|hereunder)\b',
-        'obligations': r'\b(?:must|shall|will|agrees to|is required to|undertakes to)\b',
-        'conditions': r'\b(?:provided that|subject to|contingent upon|in the event that|if and only if)\b'
-    }
-    
-    highlights = {}
-    for key, pattern in patterns.items():
-        highlights[key] = [match.group() for match in re.finditer(pattern, text)]
-    
-    return highlights
+    return group_highlight_spans(find_highlight_spans(text))
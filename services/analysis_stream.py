@@ -0,0 +1,186 @@
+import json
+import logging
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+from services.ai_service import (
+    CHUNK_THRESHOLD,
+    LOCAL_MATCH_THRESHOLD,
+    response_cache,
+    get_openai_client,
+    build_text_analysis_prompt,
+    build_template_suggestions_prompt,
+    select_best_match,
+    analyze_and_format_text,
+    highlight_fields,
+)
+from services.model_router import model_router
+from services.template_matcher import template_matcher
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+class JSONSectionParser:
+    """Incremental parser for a streamed JSON object.
+
+    ``feed`` takes raw text deltas and returns the top-level members whose
+    values have been fully received, so each section of a model answer can
+    be used before the rest of the object arrives.
+    """
+
+    def __init__(self):
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member: List[str] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        sections = []
+        for char in chunk:
+            if not self._started:
+                if char == '{':
+                    self._started = True
+                    self._depth = 1
+                continue
+            if self._depth == 0:
+                continue
+
+            if self._in_string:
+                self._member.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    sections.extend(self._flush())
+                    continue
+            elif char == ',' and self._depth == 1:
+                sections.extend(self._flush())
+                continue
+            self._member.append(char)
+        return sections
+
+    def _flush(self) -> List[Tuple[str, Any]]:
+        member = ''.join(self._member).strip()
+        self._member = []
+        if not member:
+            return []
+        try:
+            return list(json.loads('{' + member + '}').items())
+        except ValueError:
+            logger.error(f"Could not parse streamed JSON member: {member[:80]}")
+            return []
+
+def stream_sections(kind: str, prompt: str, model: str = None) -> Iterator[Tuple[str, Any]]:
+    """Yield (name, value) for each top-level member of the JSON answer as it completes.
+
+    Shares the response cache with ``ai_service._chat_json``; a cached answer
+    is replayed immediately and a streamed one is cached once complete. The
+    model is the router's first choice; sections already sent cannot be taken
+    back, so there is no fallback tier and an answer failing validation is
+    just left out of the cache.
+    """
+    model = model or model_router.models_for(kind, prompt)[0]
+    started = time.perf_counter()
+    cached = response_cache.get(model, kind, prompt)
+    if cached is not None:
+        metrics.record_llm_call(kind, model, time.perf_counter() - started, cached=True)
+        yield from json.loads(cached).items()
+        return
+
+    stream = get_openai_client().chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        response_format={"type": "json_object"},
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    parser = JSONSectionParser()
+    parts = []
+    usage = None
+    for chunk in stream:
+        if getattr(chunk, 'usage', None):
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            parts.append(delta)
+            yield from parser.feed(delta)
+
+    metrics.record_llm_call(kind, model, time.perf_counter() - started, cached=False, usage=usage)
+    content = ''.join(parts)
+    problem = model_router.validate(kind, content)
+    if problem is not None:
+        logger.error(f"Streamed {kind} response from {model} rejected: {problem}")
+        return
+    response_cache.set(model, kind, prompt, content)
+
+def stream_text_analysis(text: str) -> Iterator[Tuple[str, Dict]]:
+    """Events for the streaming counterpart of ``analyze_and_format_text``.
+
+    The local highlight pass is sent first, then one ``section`` event per
+    analysis member and a final ``done`` (or ``error``) event. Texts long
+    enough to be analyzed clause by clause are merged before sending, since
+    no section is final until every clause has been analyzed.
+    """
+    yield 'highlights', highlight_fields(text)
+
+    names = []
+    try:
+        if len(text) > CHUNK_THRESHOLD:
+            result = analyze_and_format_text(text)
+            if not result:
+                raise ValueError("Analysis failed.")
+            sections = ((name, value) for name, value in result.items()
+                        if name not in ('highlights', 'highlight_spans', 'usage'))
+        else:
+            sections = stream_sections("text_analysis", build_text_analysis_prompt(text))
+        for name, value in sections:
+            names.append(name)
+            yield 'section', {'name': name, 'value': value}
+    except Exception as e:
+        logger.error(f"Error streaming text analysis: {str(e)}")
+        yield 'error', {'error': str(e), 'sections': names}
+        return
+    yield 'done', {'sections': names}
+
+def stream_template_suggestions(user_input: str) -> Iterator[Tuple[str, Dict]]:
+    """Events for streamed template suggestions; the local matcher's answer comes first."""
+    local_result = template_matcher.match(user_input)
+    yield 'local_match', local_result
+    if local_result['confidence'] >= LOCAL_MATCH_THRESHOLD:
+        yield 'done', {'source': 'local'}
+        return
+
+    names = []
+    try:
+        for name, value in stream_sections("template_suggestions_parallel",
+                                           build_template_suggestions_prompt(user_input)):
+            names.append(name)
+            yield 'section', {'name': name, 'value': value}
+            if name == 'template_matches' and value:
+                best = select_best_match({'template_matches': value})
+                template_id = next((match.get('template_id') for match in value
+                                    if match.get('template_name') == best['best_match']), None)
+                yield 'best_match', {'best_match': best['best_match'], 'confidence': best['confidence'],
+                                     'template_id': template_id}
+    except Exception as e:
+        logger.error(f"Error streaming template suggestions: {str(e)}")
+        yield 'error', {'error': str(e), 'sections': names}
+        return
+    yield 'done', {'source': 'llm', 'sections': names}
+
+def format_sse(event: str, data: Dict) -> str:
+    """One Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional
+from services.ai_service import (
+    OPENAI_API_KEY,
+    LOCAL_MATCH_THRESHOLD,
+    MAX_CONCURRENCY,
+    chat_json_steps,
+    chat_request,
+    build_industry_context_prompt,
+    build_template_suggestions_prompt,
+    build_text_analysis_prompt,
+    build_clause_analysis_prompt,
+    chunk_text,
+    merge_clause_analyses,
+    select_best_match,
+    highlight_key_elements,
+    highlight_fields,
+)
+from services.template_matcher import template_matcher
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+AI_CALL_TIMEOUT = float(os.environ.get("AI_CALL_TIMEOUT", "30"))
+
+def _async_client():
+    # The async client's connection pool is bound to the running event loop,
+    # and the sync wrappers start a fresh loop per call, so clients are
+    # created per fan-out rather than shared at module level.
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+async def _chat_json(client, kind: str, prompt: str, model: str = None) -> str:
+    """Async counterpart of ``ai_service._chat_json`` sharing its cache, routing and fallback."""
+    steps = chat_json_steps(kind, prompt, model)
+    try:
+        candidate = next(steps)
+        while True:
+            started = time.perf_counter()
+            # Concurrent calls overlap, so they are not recorded as trace spans
+            response = await client.chat.completions.create(**chat_request(candidate, prompt))
+            candidate = steps.send((response, time.perf_counter() - started))
+    except StopIteration as done:
+        return done.value
+
+async def _chat_json_object(client, kind: str, prompt: str) -> dict:
+    content = await _chat_json(client, kind, prompt)
+    if not content:
+        raise ValueError("OpenAI returned an empty response.")
+    return json.loads(content)
+
+async def _run_step(name: str, awaitable, timeout: Optional[float], errors: dict):
+    """Await one fan-out step, recording a failure or timeout instead of raising."""
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        errors[name] = f"timed out after {timeout:g}s"
+    except Exception as e:
+        logger.error(f"Error in {name}: {str(e)}")
+        errors[name] = str(e)
+    return None
+
+async def get_template_suggestions_async(user_input: str, timeout: float = AI_CALL_TIMEOUT) -> dict:
+    """Get template suggestions with the independent prompts running concurrently.
+
+    Industry context, template matching and the local highlight pass are
+    started together and merged once all of them have finished or timed out.
+    Failed steps are listed under ``errors`` and the rest of the result is
+    still returned.
+    """
+    local_result = template_matcher.match(user_input)
+    if local_result['confidence'] >= LOCAL_MATCH_THRESHOLD:
+        local_result['highlights'] = highlight_key_elements(user_input)
+        return local_result
+
+    errors = {}
+    # Tasks copy the context, so they all append to this one list
+    with metrics.collect_llm_usage() as calls:
+        async with _async_client() as client:
+            context, matches, highlights = await asyncio.gather(
+                _run_step("industry_context",
+                          _chat_json_object(client, "industry_context",
+                                            build_industry_context_prompt(user_input)),
+                          timeout, errors),
+                _run_step("template_suggestions",
+                          _chat_json_object(client, "template_suggestions_parallel",
+                                            build_template_suggestions_prompt(user_input)),
+                          timeout, errors),
+                _run_step("highlights",
+                          asyncio.to_thread(highlight_key_elements, user_input),
+                          timeout, errors),
+            )
+
+    result = select_best_match(matches or {})
+    result['industry_context'] = context or {}
+    result['highlights'] = highlights or {}
+    result['usage'] = metrics.usage_summary(calls)
+    if errors:
+        result['errors'] = errors
+    return result
+
+async def _analyze_in_chunks(client, clauses: list, timeout: float, errors: dict) -> dict:
+    """Analyze clauses concurrently, at most MAX_CONCURRENCY at a time, and merge those that succeed.
+
+    Each clause call has its own timeout, started once it holds a slot, so
+    one slow clause only loses that clause.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    async def analyze(index, clause):
+        async with semaphore:
+            return await _run_step(f"clause_{index}",
+                                   _chat_json_object(client, "clause_analysis", build_clause_analysis_prompt(clause)),
+                                   timeout, errors)
+
+    return merge_clause_analyses(await asyncio.gather(*(analyze(i, clause) for i, clause in enumerate(clauses))))
+
+async def _analyze(client, text: str, timeout: float, errors: dict) -> dict:
+    clauses = chunk_text(text)
+    if len(clauses) > 1:
+        return await _analyze_in_chunks(client, clauses, timeout, errors)
+    return await _run_step("text_analysis",
+                           _chat_json_object(client, "text_analysis", build_text_analysis_prompt(text)),
+                           timeout, errors)
+
+async def analyze_and_format_text_async(text: str, timeout: float = AI_CALL_TIMEOUT) -> dict:
+    """Analyze agreement text with the local highlight pass running alongside the model calls.
+
+    Long texts are split into clauses exactly as ``analyze_and_format_text``
+    does, and the result has the same ``highlights`` and ``highlight_spans``.
+    ``timeout`` applies to each model call. Failed or timed-out calls are
+    listed under ``errors``; the highlights are returned even when every
+    call failed.
+    """
+    errors = {}
+    with metrics.collect_llm_usage() as calls:
+        async with _async_client() as client:
+            analysis, highlights = await asyncio.gather(
+                # No overall timeout: each call inside has its own
+                _run_step("text_analysis", _analyze(client, text, timeout, errors), None, errors),
+                _run_step("highlights", asyncio.to_thread(highlight_fields, text), timeout, errors),
+            )
+
+    result = analysis or {}
+    result.update(highlights or {'highlights': {}, 'highlight_spans': []})
+    result['usage'] = metrics.usage_summary(calls)
+    if errors:
+        result['errors'] = errors
+    return result
+
+def get_template_suggestions_parallel(user_input: str, timeout: float = AI_CALL_TIMEOUT) -> dict:
+    """Sync wrapper for routes that cannot await."""
+    return asyncio.run(get_template_suggestions_async(user_input, timeout))
+
+def analyze_and_format_text_parallel(text: str, timeout: float = AI_CALL_TIMEOUT) -> dict:
+    """Sync wrapper for routes that cannot await."""
+    return asyncio.run(analyze_and_format_text_async(text, timeout))
@@ -0,0 +1,199 @@
+import csv
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from itertools import islice
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, TextIO
+from sqlalchemy import insert, update
+from services.pdf_service import PDFService
+from services.template_engine import get_compiled_template, TemplateRenderError
+from services.verification_service import DocumentVerificationService
+
+logger = logging.getLogger(__name__)
+
+class BulkAgreementError(Exception):
+    """Custom exception for bulk agreement generation errors."""
+    pass
+
+class InvalidRow(dict):
+    """Stands in for a source line that is not a JSON object, so it is recorded as a failed row."""
+
+    def __init__(self, error: str):
+        super().__init__()
+        self.error = error
+
+def iter_rows(source: TextIO, source_format: str) -> Iterator[Dict]:
+    """Stream field dicts from a CSV (header row) or JSON Lines source.
+
+    Malformed JSON lines and lines that are not objects are yielded as
+    ``InvalidRow`` so one bad line fails its row instead of the import.
+    """
+    if source_format == 'csv':
+        yield from csv.DictReader(source)
+    elif source_format == 'jsonl':
+        for line in source:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield InvalidRow(f"Invalid JSON: {str(e)}")
+                continue
+            yield row if isinstance(row, dict) else InvalidRow("Row is not a JSON object")
+    else:
+        raise BulkAgreementError(f"Unsupported source format: {source_format}")
+
+class BulkAgreementService:
+    """Creates many agreements from a row source in resumable batches.
+
+    Each batch is rendered from its template, inserted with one executemany
+    INSERT, given verification codes with one bulk UPDATE and one record
+    INSERT, and committed together with the import's checkpoint
+    (``rows_done``). Manifest lines for a batch are written before its
+    commit, so after a crash ``resume_manifest`` only has to drop the lines
+    past the checkpoint and the import continues from the next source row.
+    """
+
+    def __init__(self, session, agreement_model, record_model, batch_size: int = 500, search_index=None,
+                 on_code: Optional[Callable[[str], None]] = None):
+        self.session = session
+        self.agreement_model = agreement_model
+        self.record_model = record_model
+        self.batch_size = batch_size
+        # Core inserts bypass the ORM flush hooks, so new rows are indexed here
+        # and their verification codes are reported once the batch commits
+        self.search_index = search_index
+        self.on_code = on_code
+
+    @staticmethod
+    def resume_manifest(manifest_path: str, rows_done: int) -> None:
+        """Drop manifest lines of batches that were never committed."""
+        if not os.path.exists(manifest_path):
+            return
+        tmp_path = f"{manifest_path}.tmp"
+        with open(manifest_path) as src, open(tmp_path, 'w') as dst:
+            for line in src:
+                try:
+                    if json.loads(line)['row'] <= rows_done:
+                        dst.write(line)
+                except (ValueError, KeyError):
+                    # A torn final line from an interrupted write
+                    break
+        os.replace(tmp_path, manifest_path)
+
+    def _render_batch(self, rows: List[Dict], first_row: int, template_id: str):
+        rendered, failures = [], []
+        for number, row in enumerate(rows, start=first_row):
+            if isinstance(row, InvalidRow):
+                failures.append({'row': number, 'error': row.error})
+                continue
+            try:
+                template = get_compiled_template(row.get('template') or template_id)
+                rendered.append((number, template.render(row)))
+            except TemplateRenderError as e:
+                failures.append({'row': number, 'error': str(e)})
+        return rendered, failures
+
+    def _insert_batch(self, rendered: List) -> List[Dict]:
+        if not rendered:
+            return []
+        now = datetime.utcnow()
+        ids = self.session.scalars(
+            insert(self.agreement_model).returning(self.agreement_model.id, sort_by_parameter_order=True),
+            [{'content': content, 'created_at': now} for _number, content in rendered]
+        ).all()
+
+        updates, records, entries = [], [], []
+        for agreement_id, (number, content) in zip(ids, rendered):
+            record = DocumentVerificationService.create_verification_record(agreement_id, content)
+            code = DocumentVerificationService.generate_verification_code(agreement_id, record['content_hash'])
+            updates.append({'id': agreement_id, 'verification_code': code, 'verification_data': record})
+            records.append({
+                'agreement_id': agreement_id,
+                'verification_code': code,
+                'content_hash': record['content_hash'],
+                'timestamp': record['timestamp'],
+                'status': record['status'],
+                'blockchain_data': record['blockchain_data'],
+                'merkle_tree': record['merkle_tree'],
+                'timestamp_token': record['timestamp_token'],
+                'created_at': now
+            })
+            entries.append({'row': number, 'agreement_id': agreement_id, 'verification_code': code})
+
+        self.session.execute(update(self.agreement_model), updates)
+        self.session.execute(insert(self.record_model), records)
+        if self.search_index is not None:
+            self.search_index.index_many(
+                self.session.connection(),
+                ((agreement_id, content, None) for agreement_id, (_number, content) in zip(ids, rendered))
+            )
+        return entries
+
+    def run(self, bulk_import, rows: Iterable[Dict], manifest: TextIO,
+            progress: Optional[Callable[[object], None]] = None) -> Dict:
+        """Create agreements for the rows after ``bulk_import.rows_done`` and append them to the manifest.
+
+        ``bulk_import`` needs ``template_id``, ``rows_done``, ``created_count``
+        and ``failed_count`` attributes; it is updated and committed per batch.
+        """
+        started = time.perf_counter()
+        remaining = islice(rows, bulk_import.rows_done, None)
+        while True:
+            batch = list(islice(remaining, self.batch_size))
+            if not batch:
+                break
+            first_row = bulk_import.rows_done + 1
+            rendered, failures = self._render_batch(batch, first_row, bulk_import.template_id)
+            try:
+                entries = self._insert_batch(rendered)
+                lines = sorted(entries + failures, key=lambda entry: entry['row'])
+                manifest.write(''.join(json.dumps(line) + '\n' for line in lines))
+                manifest.flush()
+                os.fsync(manifest.fileno())
+
+                bulk_import.rows_done += len(batch)
+                bulk_import.created_count += len(entries)
+                bulk_import.failed_count += len(failures)
+                bulk_import.updated_at = datetime.utcnow()
+                self.session.commit()
+            except Exception:
+                self.session.rollback()
+                raise
+            if self.on_code is not None:
+                for entry in entries:
+                    self.on_code(entry['verification_code'])
+            if progress is not None:
+                progress(bulk_import)
+
+        elapsed = time.perf_counter() - started
+        return {
+            'rows': bulk_import.rows_done,
+            'created': bulk_import.created_count,
+            'failed': bulk_import.failed_count,
+            'seconds': round(elapsed, 3)
+        }
+
+    def write_zip(self, manifest_path: str, fileobj: BinaryIO, chunk_size: int = 500) -> int:
+        """Render the manifest's agreements into a ZIP archive, streaming ids in chunks."""
+        def load(ids):
+            return self.session.query(self.agreement_model).filter(
+                self.agreement_model.id.in_(ids)
+            ).order_by(self.agreement_model.id).all()
+
+        def agreements():
+            ids = []
+            with open(manifest_path) as manifest:
+                for line in manifest:
+                    entry = json.loads(line)
+                    if 'agreement_id' in entry:
+                        ids.append(entry['agreement_id'])
+                    if len(ids) >= chunk_size:
+                        yield from load(ids)
+                        ids = []
+            if ids:
+                yield from load(ids)
+
+        return PDFService.render_agreements_zip(agreements(), fileobj)
@@ -0,0 +1,144 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
+from sqlalchemy import select
+from services.verification_service import DocumentVerificationService
+
+logger = logging.getLogger(__name__)
+
+REPORT_FIELDS = ['agreement_id', 'is_valid', 'content_integrity', 'signatures', 'timestamp', 'message']
+MAX_WORKERS = int(os.environ.get("BULK_VERIFY_MAX_WORKERS", str(os.cpu_count() or 1)))
+MAX_BATCH_SIZE = 5000
+
+def validate_options(batch_size=None, workers=None) -> Tuple[int, int]:
+    """Parse and bound the batch size and worker count; raises ValueError with a message."""
+    batch_size = 1000 if batch_size is None else batch_size
+    workers = MAX_WORKERS if workers is None else workers
+    try:
+        batch_size, workers = int(batch_size), int(workers)
+    except (TypeError, ValueError):
+        raise ValueError("batch_size and workers must be integers")
+    if not 1 <= batch_size <= MAX_BATCH_SIZE:
+        raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+    if not 0 <= workers <= MAX_WORKERS:
+        raise ValueError(f"workers must be between 0 and {MAX_WORKERS}")
+    return batch_size, workers
+
+def hash_contents(contents: List[str]) -> List[Optional[str]]:
+    """SHA-256 of each document; runs in worker processes, so it must stay top-level."""
+    return [hashlib.sha256(content.encode()).hexdigest() if content else None for content in contents]
+
+class _ReportWriter:
+    def __init__(self, output: TextIO, report_format: str):
+        self.output = output
+        self.report_format = report_format
+        if report_format == 'csv':
+            self._csv = csv.DictWriter(output, fieldnames=REPORT_FIELDS)
+            self._csv.writeheader()
+
+    def write(self, row: Dict) -> None:
+        if self.report_format == 'csv':
+            self._csv.writerow(row)
+        else:
+            self.output.write(json.dumps(row) + '\n')
+
+class BulkVerificationService:
+    """Re-verifies many agreements in one pass.
+
+    Rows are streamed from the database in ``batch_size`` partitions (a
+    server-side cursor on PostgreSQL), each batch is hashed in a process
+    pool, and one compact report line is written per agreement.
+    """
+
+    @staticmethod
+    def _check_row(row, computed_hash: Optional[str]) -> Dict:
+        stored = row.verification_data or {}
+        if isinstance(stored, str):
+            stored = json.loads(stored)
+        status = {'content_integrity': 'fail', 'signatures': 'skipped', 'timestamp': 'fail'}
+
+        if not stored:
+            message = "Verification record not found"
+        else:
+            if computed_hash and computed_hash == stored.get('content_hash'):
+                status['content_integrity'] = 'ok'
+            time_valid, _ = DocumentVerificationService.verify_timestamp(
+                stored.get('timestamp'), stored.get('timestamp_token'), stored.get('content_hash'), row.id
+            )
+            status['timestamp'] = 'ok' if time_valid else 'fail'
+            if row.signed_at:
+                try:
+                    sig_valid, _ = DocumentVerificationService.verify_signatures(row.signature1, row.signature2)
+                except Exception:
+                    sig_valid = False
+                status['signatures'] = 'ok' if sig_valid else 'fail'
+            message = None
+
+        is_valid = all(value in ('ok', 'skipped') for value in status.values())
+        if message is None:
+            message = "Document verification successful" if is_valid else "Document verification failed"
+        return {'agreement_id': row.id, 'is_valid': is_valid, **status, 'message': message}
+
+    @staticmethod
+    def _hash_batch(executor, contents: List[str], workers: int) -> List[Optional[str]]:
+        if executor is None:
+            return hash_contents(contents)
+        chunk_size = max(1, len(contents) // workers)
+        chunks = [contents[i:i + chunk_size] for i in range(0, len(contents), chunk_size)]
+        return [digest for digests in executor.map(hash_contents, chunks) for digest in digests]
+
+    @staticmethod
+    def verify_rows(batches: Iterable[List], output: TextIO, report_format: str = 'jsonl',
+                    workers: int = 0) -> Dict:
+        """Verify pre-fetched row batches and write the report; returns a summary."""
+        writer = _ReportWriter(output, report_format)
+        summary = {'total': 0, 'valid': 0, 'invalid': 0}
+        started = time.perf_counter()
+
+        # Spawned, not forked: this runs on a job thread of a multithreaded web process
+        executor = (ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+                    if workers > 0 else None)
+        try:
+            for batch in batches:
+                digests = BulkVerificationService._hash_batch(
+                    executor, [row.content for row in batch], workers
+                )
+                for row, digest in zip(batch, digests):
+                    result = BulkVerificationService._check_row(row, digest)
+                    writer.write(result)
+                    summary['total'] += 1
+                    summary['valid' if result['is_valid'] else 'invalid'] += 1
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        elapsed = time.perf_counter() - started
+        summary['seconds'] = round(elapsed, 3)
+        summary['agreements_per_second'] = round(summary['total'] / elapsed, 1) if elapsed else 0.0
+        return summary
+
+    @staticmethod
+    def verify_all(session, agreement_model, output: TextIO, report_format: str = 'jsonl',
+                   batch_size: int = 1000, workers: int = 0) -> Dict:
+        """Stream every agreement from the database and verify it."""
+        statement = select(
+            agreement_model.id,
+            agreement_model.content,
+            agreement_model.verification_data,
+            agreement_model.signed_at,
+            agreement_model.signature1,
+            agreement_model.signature2,
+        ).order_by(agreement_model.id).execution_options(yield_per=batch_size)
+
+        result = session.execute(statement)
+        summary = BulkVerificationService.verify_rows(
+            result.partitions(), output, report_format, workers
+        )
+        logger.info(f"Bulk verification finished: {summary}")
+        return summary
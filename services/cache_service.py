@@ -0,0 +1,256 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """Interface for response cache storage backends."""
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU cache with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """SQLite-backed cache shared by every worker on the host."""
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS ai_response_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_ai_response_cache_accessed_at "
+                "ON ai_response_cache (accessed_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, expires_at FROM ai_response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at < now:
+            conn.execute("DELETE FROM ai_response_cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE ai_response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO ai_response_cache (key, value, expires_at, accessed_at) "
+            "VALUES (?, ?, ?, ?)",
+            (key, value, now + ttl, now)
+        )
+        conn.execute("DELETE FROM ai_response_cache WHERE expires_at < ?", (now,))
+        conn.execute(
+            """DELETE FROM ai_response_cache WHERE key IN (
+                SELECT key FROM ai_response_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.max_entries,)
+        )
+
+    def delete(self, key: str) -> None:
+        self._connect().execute("DELETE FROM ai_response_cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM ai_response_cache")
+
+
+class ResponseCache:
+    """Content-addressed cache for model responses with hit/miss counters."""
+
+    def __init__(self, backend: CacheBackend, ttl: int = 86400):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize input so trivially different submissions share a key."""
+        text = unicodedata.normalize('NFC', text or '')
+        return ' '.join(text.split())
+
+    @staticmethod
+    def make_key(model: str, kind: str, text: str) -> str:
+        """Build the cache key from the model, the prompt kind and the input hash."""
+        digest = hashlib.sha256(ResponseCache.normalize(text).encode()).hexdigest()
+        return f"{model}:{kind}:{digest}"
+
+    def get(self, model: str, kind: str, text: str) -> Optional[str]:
+        key = self.make_key(model, kind, text)
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Error reading response cache: {str(e)}")
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, model: str, kind: str, text: str, value: str) -> None:
+        try:
+            self.backend.set(self.make_key(model, kind, text), value, self.ttl)
+        except Exception as e:
+            logger.error(f"Error writing response cache: {str(e)}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+class FragmentCache:
+    """Rendered page fragments keyed by name, locale and data version.
+
+    Fragments are rendered at most once per key per worker; changing the
+    data a fragment shows means passing a new ``version``, so stale entries
+    are never served and simply age out of the LRU.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: int = 86400, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(name: str, locale: str, version: str) -> str:
+        return f"fragment:{name}:{locale}:{version}"
+
+    def get_or_render(self, name: str, locale: str, version: str, render: Callable[[], str]) -> str:
+        if not self.enabled:
+            return render()
+        key = self.make_key(name, locale, version)
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is None:
+            value = render()
+            self.backend.set(key, value, self.ttl)
+        return value
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+def create_response_cache() -> ResponseCache:
+    """Build the response cache configured through the environment."""
+    backend_name = os.environ.get("AI_CACHE_BACKEND", "memory")
+    max_entries = int(os.environ.get("AI_CACHE_MAX_ENTRIES", "1024"))
+    ttl = int(os.environ.get("AI_CACHE_TTL", "86400"))
+
+    if backend_name == "sqlite":
+        path = os.environ.get("AI_CACHE_PATH", "ai_cache.sqlite3")
+        backend = SQLiteCacheBackend(path, max_entries=max_entries)
+    else:
+        backend = MemoryCacheBackend(max_entries=max_entries)
+    return ResponseCache(backend, ttl=ttl)
+
+
+
+def create_fragment_cache() -> FragmentCache:
+    """Build the page fragment cache configured through the environment."""
+    return FragmentCache(
+        MemoryCacheBackend(max_entries=int(os.environ.get("FRAGMENT_CACHE_MAX_ENTRIES", "512"))),
+        ttl=int(os.environ.get("FRAGMENT_CACHE_TTL", "86400")),
+        enabled=os.environ.get("FRAGMENT_CACHE_ENABLED", "1") == "1"
+    )
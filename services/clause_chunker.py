@@ -0,0 +1,90 @@
+import re
+from typing import Dict, List
+
+# Numbered clause headings as used by the agreement templates, e.g.
+# "1. Definition of Confidential Information".
+CLAUSE_HEADING_RE = re.compile(r'^[ \t]*\d+\.[ \t]+\S', re.MULTILINE)
+
+# Fields whose array entries are merged across chunks, with the key used to
+# recognise the same entry reported by more than one chunk.
+MERGE_KEYS = {
+    'key_terms': 'term',
+    'missing_details': 'field',
+    'improvements': 'suggestion',
+    'risk_highlights': 'text',
+}
+
+COMPLIANCE_LIST_FIELDS = ['requirements', 'gaps', 'recommendations']
+
+def split_clauses(text: str, max_chars: int = 4000) -> List[str]:
+    """Split agreement text into its preamble and numbered clauses.
+
+    Concatenating the returned pieces gives back the original text. Clauses
+    longer than ``max_chars`` are split further on blank lines so a single
+    oversized section cannot exceed the prompt budget on its own.
+    """
+    starts = [match.start() for match in CLAUSE_HEADING_RE.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    bounds = starts[1:] + [len(text)]
+
+    clauses = []
+    for start, end in zip(starts, bounds):
+        clause = text[start:end]
+        if len(clause) <= max_chars:
+            clauses.append(clause)
+            continue
+
+        piece = ''
+        for paragraph in re.split(r'(?<=\n\n)', clause):
+            if piece and len(piece) + len(paragraph) > max_chars:
+                clauses.append(piece)
+                piece = ''
+            piece += paragraph
+        if piece:
+            clauses.append(piece)
+    return [clause for clause in clauses if clause]
+
+def _entry_key(entry, key_field: str = None) -> str:
+    if isinstance(entry, dict) and key_field:
+        entry = entry.get(key_field, '')
+    return ' '.join(str(entry).lower().split())
+
+def _merge_unique(target: List, items: List, key_field: str, seen: set) -> None:
+    for item in items or []:
+        key = _entry_key(item, key_field)
+        if key and key not in seen:
+            seen.add(key)
+            target.append(item)
+
+def merge_analyses(analyses: List[Dict]) -> Dict:
+    """Combine per-chunk analysis results into a single result, in document order."""
+    merged = {
+        'formatted_text': '\n\n'.join(
+            analysis.get('formatted_text', '').strip() for analysis in analyses
+            if analysis.get('formatted_text')
+        ),
+        'compliance_analysis': {'jurisdiction': None}
+    }
+
+    for field, key_field in MERGE_KEYS.items():
+        merged[field] = []
+        seen = set()
+        for analysis in analyses:
+            _merge_unique(merged[field], analysis.get(field), key_field, seen)
+
+    compliance = merged['compliance_analysis']
+    for list_field in COMPLIANCE_LIST_FIELDS:
+        compliance[list_field] = []
+        seen = set()
+        for analysis in analyses:
+            _merge_unique(compliance[list_field],
+                          (analysis.get('compliance_analysis') or {}).get(list_field),
+                          None, seen)
+    for analysis in analyses:
+        jurisdiction = (analysis.get('compliance_analysis') or {}).get('jurisdiction')
+        if jurisdiction:
+            compliance['jurisdiction'] = jurisdiction
+            break
+
+    return merged
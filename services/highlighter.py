@@ -0,0 +1,99 @@
+import re
+from typing import Dict, Iterator, List, TextIO
+
+# Fixed legal-term lists. A term may belong to several categories ("shall" is
+# both a legal term and an obligation), so categories are attached to the
+# matched term rather than to a regex group.
+KEYWORD_CATEGORIES = {
+    'legal_terms': ['hereby', 'whereas', 'shall', 'pursuant to', 'notwithstanding', 'herein',
+                    'thereof', 'thereto', 'hereunder'],
+    'obligations': ['must', 'shall', 'will', 'agrees to', 'is required to', 'undertakes to'],
+    'conditions': ['provided that', 'subject to', 'contingent upon', 'in the event that',
+                   'if and only if'],
+}
+
+AMOUNT_PATTERN = r'\$\s*[\d,]+(?:\.\d{2})?|\d+(?:\.\d{2})?\s*dollars'
+DATE_PATTERN = r'\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\s+\d{1,2},\s+\d{4}\b'
+NAME_PATTERN = r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b(?:\s+(?:LLC|Inc\.|Corporation|Corp\.|Ltd\.|Limited|Company|Co\.|LP|LLP|PC|DBA|S\.A\.|N\.A\.|AG|SE|GmbH|Pty\.|PLC))?\b'
+
+HIGHLIGHT_TYPES = ['amounts', 'dates', 'names', 'legal_terms', 'obligations', 'conditions']
+
+_TERM_CATEGORIES: Dict[str, List[str]] = {}
+for _category, _terms in KEYWORD_CATEGORIES.items():
+    for _term in _terms:
+        _TERM_CATEGORIES.setdefault(_term, []).append(_category)
+
+_TERM_PATTERN = r'\b(?:' + '|'.join(
+    re.escape(term) for term in sorted(_TERM_CATEGORIES, key=len, reverse=True)
+) + r')\b'
+
+# One alternation scanned once over the text. Amounts, dates and keywords are
+# tried before the broad names pattern so a capitalised month is reported as
+# part of its date rather than as a name.
+HIGHLIGHT_RE = re.compile(
+    f'(?P<amounts>{AMOUNT_PATTERN})'
+    f'|(?P<dates>{DATE_PATTERN})'
+    f'|(?P<terms>{_TERM_PATTERN})'
+    f'|(?P<names>{NAME_PATTERN})'
+)
+
+# Matches ending this close to the end of a streamed buffer are held back
+# until more text arrives, since they might continue into the next chunk.
+STREAM_OVERLAP = 1024
+
+def _spans_from_match(match: re.Match, offset: int = 0) -> List[Dict]:
+    kind = match.lastgroup
+    value = match.group()
+    start = match.start() + offset
+    end = match.end() + offset
+    categories = _TERM_CATEGORIES[value] if kind == 'terms' else [kind]
+    return [{'type': category, 'text': value, 'start': start, 'end': end} for category in categories]
+
+def find_highlight_spans(text: str) -> List[Dict]:
+    """Scan the text once and return every highlight with its character offsets."""
+    spans = []
+    for match in HIGHLIGHT_RE.finditer(text):
+        spans.extend(_spans_from_match(match))
+    return spans
+
+def group_highlight_spans(spans: List[Dict]) -> Dict[str, List[str]]:
+    """Group spans into the per-type string lists returned by ``highlight_key_elements``."""
+    highlights = {key: [] for key in HIGHLIGHT_TYPES}
+    for span in spans:
+        highlights[span['type']].append(span['text'])
+    return highlights
+
+def iter_highlight_spans(stream: TextIO, chunk_size: int = 65536) -> Iterator[Dict]:
+    """Yield highlight spans from a text stream without loading it into memory.
+
+    Offsets are relative to the start of the stream. A match is only emitted
+    once at least ``STREAM_OVERLAP`` characters follow it, so matches that
+    straddle a chunk boundary are found whole on the next scan.
+    """
+    buffer = ''
+    buffer_offset = 0
+    # One character of already-scanned text is kept in front of the buffer so
+    # word boundaries at the cut point are evaluated correctly.
+    scan_from = 0
+
+    while True:
+        chunk = stream.read(chunk_size)
+        final = not chunk
+        buffer += chunk
+
+        safe_end = len(buffer) if final else len(buffer) - STREAM_OVERLAP
+        cut = max(scan_from, safe_end)
+        for match in HIGHLIGHT_RE.finditer(buffer, scan_from):
+            if not final and match.end() >= safe_end:
+                cut = min(match.start(), cut)
+                break
+            yield from _spans_from_match(match, buffer_offset)
+
+        if final:
+            return
+
+        if cut > scan_from:
+            keep_from = cut - 1
+            buffer = buffer[keep_from:]
+            buffer_offset += keep_from
+            scan_from = 1
@@ -0,0 +1,132 @@
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class JobError(Exception):
+    """Custom exception for background job errors."""
+    pass
+
+class JobService:
+    """Runs slow tasks off the request thread and records their state in the database.
+
+    This is the local worker mode: a bounded thread pool inside each web
+    process, with job rows in the application's SQLAlchemy database as the
+    source of truth, so no broker such as Redis is needed on a single box.
+    """
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_FINISHED = 'finished'
+    STATUS_FAILED = 'failed'
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or int(os.environ.get("JOB_WORKERS", "4"))
+        self.handlers: Dict[str, Callable[[dict], dict]] = {}
+        # Kinds that may be submitted through the generic HTTP endpoint
+        self.public_kinds = set()
+        self.app = None
+        self.db = None
+        self.model = None
+        self._executor = None
+
+    def init_app(self, app, db, model) -> None:
+        self.app = app
+        self.db = db
+        self.model = model
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+
+    def task(self, kind: str, public: bool = False):
+        """Register a handler taking the job payload and returning a JSON-serializable result.
+
+        Only ``public`` kinds can be submitted with ``submit(..., public=True)``,
+        which is what the generic HTTP endpoint uses; the rest are started
+        by their own routes, which validate the payload first.
+        """
+        def decorator(func):
+            self.handlers[kind] = func
+            if public:
+                self.public_kinds.add(kind)
+            return func
+        return decorator
+
+    def submit(self, kind: str, payload: dict, public: bool = False) -> str:
+        """Create a job row and hand it to the worker pool; returns the job id."""
+        if kind not in self.handlers or (public and kind not in self.public_kinds):
+            raise JobError(f"Unknown job kind: {kind}")
+
+        job = self.model(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            status=self.STATUS_QUEUED,
+            payload=json.dumps(payload),
+            created_at=datetime.utcnow()
+        )
+        self.db.session.add(job)
+        self.db.session.commit()
+        self._executor.submit(self._run, job.id)
+        return job.id
+
+    def _run(self, job_id: str) -> None:
+        with self.app.app_context():
+            job = self.db.session.get(self.model, job_id)
+            if job is None:
+                return
+            job.status = self.STATUS_RUNNING
+            job.started_at = datetime.utcnow()
+            self.db.session.commit()
+
+            try:
+                result = self.handlers[job.kind](json.loads(job.payload or '{}'))
+                job.result = json.dumps(result)
+                job.status = self.STATUS_FINISHED
+            except Exception as e:
+                logger.error(f"Error running {job.kind} job {job_id}: {str(e)}")
+                # The handler may have left the session mid-transaction
+                self.db.session.rollback()
+                job.error = str(e)
+                job.status = self.STATUS_FAILED
+            finally:
+                job.finished_at = datetime.utcnow()
+                self.db.session.commit()
+
+    def recover_interrupted(self) -> int:
+        """Fail jobs left queued or running by a previous process; returns how many.
+
+        Jobs only run in the thread pool of the process that submitted them,
+        so after a restart nothing would ever finish them and clients would
+        poll forever. Call once at startup, from the process that runs jobs,
+        before anything is submitted.
+        """
+        with self.app.app_context():
+            count = self.db.session.query(self.model).filter(
+                self.model.status.in_([self.STATUS_QUEUED, self.STATUS_RUNNING])
+            ).update({
+                'status': self.STATUS_FAILED,
+                'error': 'Interrupted by a restart',
+                'finished_at': datetime.utcnow()
+            }, synchronize_session=False)
+            self.db.session.commit()
+        if count:
+            logger.warning(f"Marked {count} interrupted jobs as failed")
+        return count
+
+    def get(self, job_id: str):
+        return self.db.session.get(self.model, job_id)
+
+    @staticmethod
+    def to_dict(job) -> dict:
+        return {
+            'job_id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'error': job.error,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        }
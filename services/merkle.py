@@ -0,0 +1,91 @@
+import hashlib
+import re
+from typing import Dict, List
+
+# Domain-separation prefixes keep a leaf hash from ever colliding with an
+# internal node hash (RFC 6962 style).
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+# Version of the section splitter used for new clause trees. A stored tree
+# can only be checked with the splitter that built it, so a released
+# splitter is never changed; a different split is added as a new version.
+SPLITTER_VERSION = 1
+
+_HEADING_RE_V1 = re.compile(r'^[ \t]*\d+\.[ \t]+\S', re.MULTILINE)
+_MAX_SECTION_CHARS_V1 = 4000
+
+def _split_sections_v1(text: str) -> List[str]:
+    """Preamble and numbered clauses, with clauses over 4000 characters split on blank lines."""
+    starts = [match.start() for match in _HEADING_RE_V1.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    bounds = starts[1:] + [len(text)]
+
+    sections = []
+    for start, end in zip(starts, bounds):
+        section = text[start:end]
+        if len(section) <= _MAX_SECTION_CHARS_V1:
+            sections.append(section)
+            continue
+
+        piece = ''
+        for paragraph in re.split(r'(?<=\n\n)', section):
+            if piece and len(piece) + len(paragraph) > _MAX_SECTION_CHARS_V1:
+                sections.append(piece)
+                piece = ''
+            piece += paragraph
+        if piece:
+            sections.append(piece)
+    return [section for section in sections if section]
+
+SPLITTERS = {1: _split_sections_v1}
+
+def split_sections(text: str, version: int = SPLITTER_VERSION) -> List[str]:
+    """Split a document into Merkle leaves with the given splitter version."""
+    try:
+        splitter = SPLITTERS[version]
+    except KeyError:
+        raise ValueError(f"Unknown section splitter version: {version}")
+    return splitter(text)
+
+def leaf_hash(data: str) -> str:
+    return hashlib.sha256(LEAF_PREFIX + data.encode()).hexdigest()
+
+def node_hash(left: str, right: str) -> str:
+    return hashlib.sha256(NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+def build_levels(leaves: List[str]) -> List[List[str]]:
+    """All tree levels from the leaves up to the root; an odd last node is carried up unchanged."""
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+def merkle_root(leaves: List[str]) -> str:
+    if not leaves:
+        return hashlib.sha256(b'').hexdigest()
+    return build_levels(leaves)[-1][0]
+
+def merkle_proof(leaves: List[str], index: int) -> List[Dict]:
+    """Sibling hashes needed to recompute the root from the leaf at ``index``."""
+    proof = []
+    for level in build_levels(leaves)[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({'hash': level[sibling], 'side': 'left' if sibling < index else 'right'})
+        index //= 2
+    return proof
+
+def verify_proof(leaf: str, proof: List[Dict], root: str) -> bool:
+    current = leaf
+    for step in proof:
+        if step['side'] == 'left':
+            current = node_hash(step['hash'], current)
+        else:
+            current = node_hash(current, step['hash'])
+    return current == root
@@ -0,0 +1,304 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# With METRICS_ENABLED=0 timers and spans are shared no-ops and decorators
+# return the wrapped function unchanged.
+ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape_label_value(value) -> str:
+    # Prometheus text format escapes backslash, double quote and newline
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labelnames: Sequence[str], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    """Monotonic counter with optional labels, rendered in Prometheus text format."""
+
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if not ENABLED:
+            return
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels, rendered in Prometheus text format."""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        if not ENABLED:
+            return
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Context manager observing the elapsed seconds of its block."""
+        if not ENABLED:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: Histogram, labels: Dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    'http_request_seconds', 'HTTP request latency by endpoint.', ('endpoint', 'method', 'status')))
+STAGE_SECONDS = registry.register(Histogram(
+    'stage_seconds', 'Time spent in each traced stage of the agreement lifecycle.', ('stage',)))
+LLM_CALL_SECONDS = registry.register(Histogram(
+    'llm_call_seconds', 'OpenAI call latency, including response cache hits.', ('kind', 'model', 'cached')))
+LLM_TOKENS = registry.register(Counter(
+    'llm_tokens_total', 'Tokens used by OpenAI calls.', ('kind', 'model', 'type')))
+PDF_RENDER_SECONDS = registry.register(Histogram(
+    'pdf_render_seconds', 'wkhtmltopdf render time per document.', ('outcome',)))
+QR_SECONDS = registry.register(Histogram(
+    'qr_seconds', 'QR code generation and decode time.', ('operation',)))
+DB_QUERY_SECONDS = registry.register(Histogram(
+    'db_query_seconds', 'Database statement execution time.', ('operation',),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)))
+VERIFY_SECONDS = registry.register(Histogram(
+    'verify_seconds', 'Agreement verification time.', ('outcome',)))
+
+LLM_FALLBACKS = registry.register(Counter(
+    'llm_fallbacks_total', 'Fast-tier answers rejected by schema validation and retried.', ('kind', 'model')))
+
+# Spans of the current request: (trace id, [(stage, seconds), ...])
+_trace: contextvars.ContextVar[Optional[Tuple[str, list]]] = contextvars.ContextVar('trace', default=None)
+
+def start_trace(trace_id: Optional[str] = None):
+    """Begin collecting spans for the current request; returns a token for ``end_trace``."""
+    if not ENABLED:
+        return None
+    return _trace.set((trace_id or uuid.uuid4().hex, []))
+
+def end_trace(token) -> Optional[Tuple[str, list]]:
+    """Stop collecting spans and return (trace id, spans) for the finished request."""
+    if token is None:
+        return None
+    trace = _trace.get()
+    _trace.reset(token)
+    return trace
+
+def current_trace_id() -> Optional[str]:
+    trace = _trace.get()
+    return trace[0] if trace else None
+
+@contextmanager
+def _span(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        trace = _trace.get()
+        if trace is not None:
+            trace[1].append((stage, elapsed))
+
+def record_span(stage: str, seconds: float) -> None:
+    """Record an already-measured stage, e.g. from a SQLAlchemy event pair."""
+    if not ENABLED:
+        return
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace[1].append((stage, seconds))
+
+def span(stage: str):
+    """Time a block as a named stage of the current request's trace."""
+    if not ENABLED:
+        return _NULL_TIMER
+    return _span(stage)
+
+def traced(stage: str):
+    """Decorator form of ``span``; a no-op when metrics are disabled."""
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def timed(histogram: Histogram, stage: str, outcome=None, **labels):
+    """Decorator observing a call in ``histogram`` and as a trace span.
+
+    ``outcome`` maps the return value to an ``outcome`` label; calls that
+    raise are labelled ``error``. A no-op when metrics are disabled.
+    """
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            result_label = 'error'
+            try:
+                with _span(stage):
+                    result = func(*args, **kwargs)
+                if outcome is not None:
+                    result_label = outcome(result)
+                return result
+            finally:
+                extra = {'outcome': result_label} if outcome is not None else {}
+                histogram.observe(time.perf_counter() - started, **labels, **extra)
+        return wrapper
+    return decorator
+
+# LLM calls of the current unit of work, see collect_llm_usage
+_llm_usage: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar('llm_usage', default=None)
+
+@contextmanager
+def collect_llm_usage(calls: Optional[list] = None):
+    """Collect a usage entry for every LLM call made inside the block.
+
+    Pass the list from an outer block to keep collecting in worker threads,
+    which do not inherit the caller's context.
+    """
+    calls = [] if calls is None else calls
+    token = _llm_usage.set(calls)
+    try:
+        yield calls
+    finally:
+        _llm_usage.reset(token)
+
+def current_llm_usage() -> Optional[list]:
+    return _llm_usage.get()
+
+def usage_summary(calls: list) -> Dict:
+    return {
+        'prompt_tokens': sum(call['prompt_tokens'] for call in calls),
+        'completion_tokens': sum(call['completion_tokens'] for call in calls),
+        'calls': calls
+    }
+
+def record_llm_call(kind: str, model: str, seconds: float, cached: bool, usage=None) -> None:
+    """Report one LLM call: usage log line and collector entry, latency histogram and token counters."""
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    calls = _llm_usage.get()
+    if calls is not None:
+        calls.append({'kind': kind, 'model': model, 'cached': cached, 'seconds': round(seconds, 3),
+                      'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens})
+    if not cached:
+        logger.info(f"LLM call {kind} on {model}: {prompt_tokens} prompt + {completion_tokens} "
+                    f"completion tokens in {seconds:.2f}s")
+    if not ENABLED:
+        return
+    LLM_CALL_SECONDS.observe(seconds, kind=kind, model=model, cached='true' if cached else 'false')
+    if usage is not None:
+        LLM_TOKENS.inc(prompt_tokens, kind=kind, model=model, type='prompt')
+        LLM_TOKENS.inc(completion_tokens, kind=kind, model=model, type='completion')
+
+def server_timing(spans: list) -> str:
+    """``Server-Timing`` header value summing spans per stage."""
+    totals: Dict[str, float] = {}
+    for stage, seconds in spans:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ', '.join(f"{stage.replace('.', '-')};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+from services.prompt_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Required top-level members and their JSON types for each prompt kind.
+# Answers missing any of them are treated as failed and retried on the
+# stronger tier.
+RESPONSE_SCHEMAS: Dict[str, Dict[str, type]] = {
+    'industry_context': {
+        'industry': str,
+        'terminology': list,
+        'compliance_requirements': list,
+        'risk_factors': list,
+    },
+    'template_suggestions': {
+        'template_matches': list,
+        'key_elements': list,
+        'risk_assessment': dict,
+    },
+    'text_analysis': {
+        'formatted_text': str,
+        'key_terms': list,
+        'missing_details': list,
+        'improvements': list,
+        'compliance_analysis': dict,
+        'risk_highlights': list,
+    },
+}
+RESPONSE_SCHEMAS['template_suggestions_parallel'] = RESPONSE_SCHEMAS['template_suggestions']
+RESPONSE_SCHEMAS['clause_analysis'] = RESPONSE_SCHEMAS['text_analysis']
+
+class ModelRouter:
+    """Chooses the model tier for a prompt and validates the answers.
+
+    Prompts of the kinds in ``fast_kinds`` whose token count is at most
+    ``fast_max_tokens`` go to the fast tier first, with the strong tier as
+    fallback; everything else goes straight to the strong tier.
+    """
+
+    def __init__(self, fast_model: str, strong_model: str, fast_max_tokens: int, fast_kinds: List[str]):
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.fast_max_tokens = fast_max_tokens
+        self.fast_kinds = set(fast_kinds)
+
+    @classmethod
+    def from_env(cls) -> 'ModelRouter':
+        return cls(
+            fast_model=os.environ.get("AI_MODEL_FAST", "gpt-4o-mini"),
+            strong_model=os.environ.get("AI_MODEL_STRONG", "gpt-4"),
+            fast_max_tokens=int(os.environ.get("AI_FAST_MAX_TOKENS", "1500")),
+            fast_kinds=os.environ.get(
+                "AI_FAST_KINDS",
+                "industry_context,template_suggestions,template_suggestions_parallel,clause_analysis"
+            ).split(',')
+        )
+
+    def models_for(self, kind: str, prompt: str) -> List[str]:
+        """Models to try in order for this prompt."""
+        if (self.fast_model and self.fast_model != self.strong_model and kind in self.fast_kinds
+                and count_tokens(prompt) <= self.fast_max_tokens):
+            return [self.fast_model, self.strong_model]
+        return [self.strong_model]
+
+    @staticmethod
+    def validate(kind: str, content: Optional[str]) -> Optional[str]:
+        """Why ``content`` is not an acceptable answer for ``kind``, or None if it is."""
+        if not content:
+            return "empty response"
+        try:
+            result = json.loads(content)
+        except ValueError as e:
+            return f"invalid JSON: {str(e)}"
+        if not isinstance(result, dict):
+            return "response is not a JSON object"
+        for field, expected in RESPONSE_SCHEMAS.get(kind, {}).items():
+            if not isinstance(result.get(field), expected):
+                return f"missing or invalid field: {field}"
+        return None
+
+model_router = ModelRouter.from_env()
@@ -0,0 +1,324 @@
+import hashlib
+import html
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple
+from services.verification_service import DocumentVerificationService
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+class PDFRenderError(Exception):
+    """Custom exception for PDF rendering errors."""
+    pass
+
+class PDFRendererBusy(PDFRenderError):
+    """Raised when the render queue is full."""
+    pass
+
+class PDFRenderLimiter:
+    """Concurrency limiter and queue for wkhtmltopdf renders.
+
+    wkhtmltopdf has no long-running server mode, so every render still starts
+    its own process; nothing is kept warm between renders. What the limiter
+    does is locate the binary once instead of pdfkit running ``which``
+    before every render, and cap concurrency at ``size`` renders with at most
+    ``max_queue`` waiting. Callers past that limit wait up to
+    ``queue_timeout`` seconds and then get ``PDFRendererBusy``, which gives
+    the server backpressure instead of an unbounded process fan-out.
+    """
+
+    def __init__(self, size: int = 2, max_queue: int = 16, queue_timeout: float = 5.0):
+        self.size = size
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(size + max_queue)
+        self._executor = None
+        self._configuration = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._renders = 0
+        self._failures = 0
+        self._total_seconds = 0.0
+        self._last_seconds = 0.0
+
+    def _ensure_started(self) -> None:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # pdfkit is imported on first render, not when the app boots
+                    import pdfkit
+                    self._configuration = pdfkit.configuration(
+                        wkhtmltopdf=os.environ.get("WKHTMLTOPDF_PATH", "")
+                    )
+                    self._executor = ThreadPoolExecutor(max_workers=self.size,
+                                                        thread_name_prefix='pdf-render')
+
+    def start(self) -> None:
+        """Locate wkhtmltopdf and start the workers now rather than on the first render."""
+        self._ensure_started()
+
+    def _render(self, html: str, options: Dict) -> bytes:
+        with self._lock:
+            self._queued -= 1
+            self._in_flight += 1
+        started = time.perf_counter()
+        try:
+            import pdfkit
+            pdf = pdfkit.from_string(html, False, options=options, configuration=self._configuration)
+        except Exception:
+            with self._lock:
+                self._failures += 1
+            metrics.PDF_RENDER_SECONDS.observe(time.perf_counter() - started, outcome='error')
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._in_flight -= 1
+                self._last_seconds = elapsed
+            self._slots.release()
+
+        with self._lock:
+            self._renders += 1
+            self._total_seconds += elapsed
+        metrics.PDF_RENDER_SECONDS.observe(elapsed, outcome='ok')
+        return pdf
+
+    def submit(self, html: str, options: Dict):
+        """Queue a render and return its future, or raise ``PDFRendererBusy``."""
+        self._ensure_started()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PDFRendererBusy("PDF render queue is full")
+        with self._lock:
+            self._queued += 1
+        try:
+            return self._executor.submit(self._render, html, options)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            self._slots.release()
+            raise
+
+    def render(self, html: str, options: Dict) -> bytes:
+        with metrics.span('pdf.render'):
+            return self.submit(html, options).result()
+
+    def render_many(self, documents: Iterable[str], options: Dict) -> List[bytes]:
+        """Render several documents concurrently, returning PDFs in input order."""
+        with metrics.span('pdf.render'):
+            futures = [self.submit(html, options) for html in documents]
+            return [future.result() for future in futures]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'max_concurrent': self.size,
+                'max_queue': self.max_queue,
+                'queue_depth': self._queued,
+                'in_flight': self._in_flight,
+                'renders': self._renders,
+                'failures': self._failures,
+                'avg_render_ms': round(self._total_seconds / self._renders * 1000, 1) if self._renders else 0.0,
+                'last_render_ms': round(self._last_seconds * 1000, 1)
+            }
+
+render_limiter = PDFRenderLimiter(
+    size=int(os.environ.get("PDF_RENDER_CONCURRENCY", os.environ.get("PDF_RENDER_WORKERS", "2"))),
+    max_queue=int(os.environ.get("PDF_RENDER_QUEUE", "16")),
+    queue_timeout=float(os.environ.get("PDF_RENDER_QUEUE_TIMEOUT", "5"))
+)
+
+class PDFService:
+    # wkhtmltopdf options shared by every agreement render
+    PDF_OPTIONS = {
+        'encoding': 'UTF-8',
+        'quiet': '',
+    }
+    # Maps a stored signature value to a self-contained image URL; set by the
+    # app, since resolving references needs the database
+    signature_src: Optional[Callable[[str], Optional[str]]] = None
+
+    @staticmethod
+    def agreement_html(agreement) -> str:
+        """The agreement content, followed by its signatures once it has been signed."""
+        if not agreement.signed_at or PDFService.signature_src is None:
+            return agreement.content
+        images = [PDFService.signature_src(value) for value in (agreement.signature1, agreement.signature2)]
+        cells = ''.join(
+            f'<td style="width:50%"><img src="{html.escape(src, quote=True)}" '
+            f'style="max-width:100%;max-height:120px"></td>'
+            for src in images if src
+        )
+        if not cells:
+            return agreement.content
+        return f'{agreement.content}<table class="signatures" style="width:100%;margin-top:2em"><tr>{cells}</tr></table>'
+
+    @staticmethod
+    def render_agreement(agreement) -> bytes:
+        """Render an agreement, with its signatures, to PDF bytes."""
+        try:
+            return render_limiter.render(PDFService.agreement_html(agreement), PDFService.PDF_OPTIONS)
+        except PDFRendererBusy:
+            raise
+        except Exception as e:
+            logger.error(f"Error rendering agreement PDF: {str(e)}")
+            raise PDFRenderError("Failed to render agreement PDF")
+
+    @staticmethod
+    def render_agreements_zip(agreements: Iterable, fileobj: BinaryIO, batch_size: int = 8,
+                              cache: Optional['PDFCache'] = None, locale: str = 'en') -> int:
+        """Render agreements through the limiter and write them into a ZIP archive.
+
+        Agreements are rendered ``batch_size`` at a time so only one batch of
+        PDFs is held in memory. With a ``cache``, cached PDFs are copied into
+        the archive and only the misses are rendered, then stored. Returns
+        the number of PDFs written.
+        """
+        count = 0
+        with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            batch = []
+            for agreement in agreements:
+                cached = cache.lookup(agreement, locale) if cache is not None else None
+                if cached is not None:
+                    with cached, archive.open(f"agreement_{agreement.id}.pdf", 'w') as entry:
+                        shutil.copyfileobj(cached, entry)
+                    count += 1
+                    continue
+                batch.append(agreement)
+                if len(batch) >= batch_size:
+                    count += PDFService._write_batch(archive, batch, cache, locale)
+                    batch = []
+            if batch:
+                count += PDFService._write_batch(archive, batch, cache, locale)
+        return count
+
+    @staticmethod
+    def _write_batch(archive: zipfile.ZipFile, agreements: List, cache: Optional['PDFCache'] = None,
+                     locale: str = 'en') -> int:
+        try:
+            pdfs = render_limiter.render_many([PDFService.agreement_html(a) for a in agreements],
+                                             PDFService.PDF_OPTIONS)
+        except PDFRendererBusy:
+            raise
+        except Exception as e:
+            logger.error(f"Error rendering agreement PDF batch: {str(e)}")
+            raise PDFRenderError("Failed to render agreement PDF batch")
+        for agreement, pdf in zip(agreements, pdfs):
+            archive.writestr(f"agreement_{agreement.id}.pdf", pdf)
+            if cache is not None:
+                cache.store(cache.key_for(agreement, locale), pdf)
+        if cache is not None:
+            cache.evict()
+        return len(pdfs)
+
+class PDFCache:
+    """Disk cache of rendered agreement PDFs.
+
+    Files are named ``<content hash>-<locale>-<signature state>.pdf`` so a
+    signed agreement, whose content never changes, is rendered once per
+    locale. The file stem doubles as the ETag. Hits refresh the file's mtime
+    and eviction removes the least recently used files once the directory
+    grows past ``max_bytes``.
+
+    Hits are handed out as open file objects rather than paths: eviction may
+    unlink a file at any time, but an already open handle keeps reading the
+    old contents until it is closed.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def signature_state(agreement) -> str:
+        if not agreement.signed_at:
+            return 'unsigned'
+        signatures = f"{agreement.signature1 or ''}|{agreement.signature2 or ''}|{agreement.signed_at.isoformat()}"
+        return hashlib.sha256(signatures.encode()).hexdigest()[:16]
+
+    def key_for(self, agreement, locale: str) -> str:
+        content_hash = DocumentVerificationService.calculate_document_hash(agreement.content)
+        return f"{content_hash}-{locale}-{self.signature_state(agreement)}"
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def lookup(self, agreement, locale: str) -> Optional[BinaryIO]:
+        """Open the cached PDF, refreshing its mtime, or return None on a miss.
+
+        The caller owns the returned file object and must close it.
+        """
+        path = self.path_for(self.key_for(agreement, locale))
+        try:
+            cached = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(cached.fileno())
+        except OSError:
+            pass
+        return cached
+
+    def store(self, key: str, pdf: bytes) -> str:
+        """Write a rendered PDF atomically and return its path; eviction is left to the caller."""
+        path = self.path_for(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp_path, path)
+        return path
+
+    def get_or_render(self, agreement, locale: str) -> Tuple[BinaryIO, str]:
+        """Return the PDF as an open file object and its ETag, rendering it on a miss.
+
+        A fresh render is returned from memory, so evicting it straight after
+        the store cannot affect this caller. The caller must close the file.
+        """
+        key = self.key_for(agreement, locale)
+        cached = self.lookup(agreement, locale)
+        if cached is not None:
+            return cached, key
+
+        pdf = PDFService.render_agreement(agreement)
+        self.store(key, pdf)
+        self.evict()
+        return io.BytesIO(pdf), key
+
+    def invalidate(self, content_hash: str) -> None:
+        """Remove every cached render of the given content."""
+        for name in os.listdir(self.directory):
+            if name.startswith(f"{content_hash}-"):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def evict(self) -> None:
+        """Delete least recently used PDFs until the cache fits in ``max_bytes``."""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.pdf'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,102 @@
+import json
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from services.clause_chunker import split_clauses
+
+# Token budget for user-supplied text embedded in a prompt
+INPUT_TOKEN_BUDGET = int(os.environ.get("AI_INPUT_TOKEN_BUDGET", "3000"))
+# Token budget for the serialized industry context passed to template matching
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("AI_CONTEXT_TOKEN_BUDGET", "400"))
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+OMISSION_MARKER = "\n[... {count} sections omitted ...]\n"
+
+@lru_cache(maxsize=1)
+def _encoding():
+    # tiktoken is optional; without it tokens are estimated from word pieces
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in ``text`` for the GPT-4 family tokenizer (estimated if tiktoken is missing)."""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # BPE keeps short words whole and splits longer ones into ~4-character pieces
+    return sum(math.ceil(len(piece) / 4) if len(piece) > 4 else 1 for piece in _WORD_RE.findall(text))
+
+def _cut(text: str, max_tokens: int, from_end: bool = False) -> str:
+    """Longest prefix (or suffix) of ``text`` within ``max_tokens``, by binary search on length."""
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        piece = text[-mid:] if from_end else text[:mid]
+        if count_tokens(piece) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[-low:] if from_end and low else text[:low]
+
+def trim_to_budget(text: str, max_tokens: int = INPUT_TOKEN_BUDGET) -> str:
+    """Fit ``text`` into ``max_tokens``, dropping whole clauses from the middle first.
+
+    Agreements put the parties up front and signatures, governing law and
+    termination at the end, so the opening and closing clauses are kept and
+    the omission is marked in the text. A single clause that is itself too
+    long is cut to its head and tail.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    clauses = split_clauses(text)
+    costs = [count_tokens(clause) for clause in clauses]
+    marker_cost = count_tokens(OMISSION_MARKER.format(count=len(clauses)))
+    budget = max_tokens - marker_cost
+
+    head, tail = [], []
+    i, j = 0, len(clauses) - 1
+    # Alternate between the start and the end so both sides are represented
+    while i <= j:
+        if costs[i] <= budget:
+            head.append(clauses[i])
+            budget -= costs[i]
+            i += 1
+        else:
+            break
+        if i <= j and costs[j] <= budget:
+            tail.insert(0, clauses[j])
+            budget -= costs[j]
+            j -= 1
+        elif i <= j:
+            break
+
+    if not head and not tail:
+        half = max(1, budget // 2)
+        return _cut(text, half) + OMISSION_MARKER.format(count=1) + _cut(text, half, from_end=True)
+    omitted = j - i + 1
+    marker = OMISSION_MARKER.format(count=omitted) if omitted else ''
+    return ''.join(head) + marker + ''.join(tail)
+
+def compact_context(context: Optional[Dict[str, Any]], max_tokens: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """Compact JSON for the industry context, shortening its lists until it fits ``max_tokens``."""
+    if not context:
+        return "{}"
+    compact = dict(context)
+    serialized = json.dumps(compact, separators=(',', ':'))
+    limit = max((len(value) for value in compact.values() if isinstance(value, list)), default=0)
+    while count_tokens(serialized) > max_tokens and limit > 0:
+        limit -= 1
+        compact = {key: value[:limit] if isinstance(value, list) else value for key, value in context.items()}
+        serialized = json.dumps(compact, separators=(',', ':'))
+    if count_tokens(serialized) > max_tokens:
+        # Only scalar fields left and still too large: keep the industry itself
+        serialized = json.dumps({'industry': context.get('industry')}, separators=(',', ':'))
+    return serialized
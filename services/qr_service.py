@@ -1,60 +1,285 @@
-import qrcode
 from io import BytesIO
 import base64
-from pyzbar.pyzbar import decode
-from PIL import Image
+import os
+import re
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from services import metrics
 import logging
 
 logger = logging.getLogger(__name__)
 
+VERIFICATION_CODE_RE = re.compile(r'^[0-9a-f]{12}$')
+
+# Longest side frames are downsampled to before the first decode attempts
+SCAN_MAX_SIDE = int(os.environ.get("QR_SCAN_MAX_SIDE", "1024"))
+# Share of the width/height kept for the centred region-of-interest attempt
+SCAN_ROI = 0.6
+
+class QRDecodeError(Exception):
+    """Custom exception for QR decoding errors."""
+    pass
+
+class QRDecoderBusy(QRDecodeError):
+    """Raised when the decode queue is full."""
+    pass
+
+def _zbar_decode(image) -> Optional[str]:
+    # pyzbar loads libzbar through ctypes, so it is only imported when scanning
+    from pyzbar.pyzbar import decode, ZBarSymbol
+    decoded_objects = decode(image, symbols=[ZBarSymbol.QRCODE])
+    if decoded_objects:
+        return decoded_objects[0].data.decode()
+    return None
+
+def decode_qr_bytes(image_bytes: bytes, max_side: int = SCAN_MAX_SIDE) -> Optional[str]:
+    """Decode a QR code from an encoded image, cheapest attempt first.
+
+    The frame is grayscaled and downsampled (JPEGs are scaled while decoding
+    via ``draft``), then a centred crop is tried, then the whole downsampled
+    frame, and only then the full-resolution frame. Runs in decode worker
+    processes, so it must stay top-level.
+    """
+    from PIL import Image
+
+    image = Image.open(BytesIO(image_bytes))
+    full_size = image.size
+    image.draft('L', (max_side, max_side))
+    small = image.convert('L')
+    small.thumbnail((max_side, max_side))
+
+    width, height = small.size
+    margin_x, margin_y = int(width * (1 - SCAN_ROI) / 2), int(height * (1 - SCAN_ROI) / 2)
+    for candidate in (small.crop((margin_x, margin_y, width - margin_x, height - margin_y)), small):
+        data = _zbar_decode(candidate)
+        if data:
+            return data
+
+    if max(full_size) > max(small.size):
+        return _zbar_decode(Image.open(BytesIO(image_bytes)).convert('L'))
+    return None
+
+class QRDecodePool:
+    """Bounded process pool for QR decoding.
+
+    Decoding is CPU-bound and holds the GIL, so it runs in separate
+    processes (spawned lazily on first use) to keep request threads free.
+    At most ``workers + max_queue`` frames are in flight; callers past that
+    wait ``queue_timeout`` seconds and then get ``QRDecoderBusy``. A decode
+    that exceeds ``timeout`` is reported as no result; a worker still busy
+    with it cannot be interrupted, so the pool is replaced and its processes
+    terminated, which also frees the slot. With ``workers == 0`` frames are
+    decoded in the calling thread.
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 16, timeout: float = 5.0,
+                 queue_timeout: float = 2.0):
+        self.workers = workers
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max(1, workers) + max_queue)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn rather than fork: the web process is multi-threaded
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                    )
+
+    def submit(self, image_bytes: bytes) -> Tuple[ProcessPoolExecutor, Future]:
+        """Queue one frame; returns the pool it went to along with its future."""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise QRDecoderBusy("QR decode queue is full")
+        try:
+            self._ensure_started()
+            executor = self._executor
+            future = executor.submit(decode_qr_bytes, image_bytes)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot stays taken until the decode really ends, not when the caller gives up
+        future.add_done_callback(lambda _future: self._slots.release())
+        return executor, future
+
+    def _recycle(self, executor: ProcessPoolExecutor) -> None:
+        """Replace a pool whose worker is stuck on a decode that timed out."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        # Terminating the workers fails their futures, which releases their slots
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _result(self, submitted: Tuple[ProcessPoolExecutor, Future]) -> Optional[str]:
+        executor, future = submitted
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            logger.error("QR decode timed out")
+            if not future.cancel():
+                self._recycle(executor)
+            return None
+        except Exception as e:
+            logger.error(f"Error decoding QR frame: {str(e)}")
+            return None
+
+    def decode(self, image_bytes: bytes) -> Optional[str]:
+        if self.workers <= 0:
+            return decode_qr_bytes(image_bytes)
+        return self._result(self.submit(image_bytes))
+
+    def decode_many(self, frames: List[bytes]) -> List[Optional[str]]:
+        """Decode several frames concurrently, returning results in input order."""
+        if self.workers <= 0:
+            return [decode_qr_bytes(frame) for frame in frames]
+        submitted = [self.submit(frame) for frame in frames]
+        return [self._result(item) for item in submitted]
+
+decode_pool = QRDecodePool(
+    workers=int(os.environ.get("QR_DECODE_WORKERS", "2")),
+    max_queue=int(os.environ.get("QR_DECODE_QUEUE", "16")),
+    timeout=float(os.environ.get("QR_DECODE_TIMEOUT", "5"))
+)
+
 class QRCodeService:
+    # Directory for persisted QR images; None keeps them in memory only
+    STORAGE_DIR = os.environ.get("QR_CACHE_DIR")
+    CACHE_SIZE = int(os.environ.get("QR_CACHE_SIZE", "1024"))
+
+    @staticmethod
+    def is_valid_code(verification_code: str) -> bool:
+        return bool(verification_code) and bool(VERIFICATION_CODE_RE.match(verification_code))
+
+    @staticmethod
+    def _build_qr(verification_code: str):
+        # qrcode (and PIL behind it) load on the first render, not at import
+        import qrcode
+
+        # Create QR code instance
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            box_size=10,
+            border=4,
+        )
+
+        # Add verification data
+        verification_url = f"/verify/{verification_code}"
+        qr.add_data(verification_url)
+        qr.make(fit=True)
+        return qr
+
+    @staticmethod
+    def _render(verification_code: str, image_format: str) -> bytes:
+        with metrics.QR_SECONDS.time(operation=f'generate_{image_format}'), metrics.span('qr.generate'):
+            qr = QRCodeService._build_qr(verification_code)
+            buffered = BytesIO()
+            if image_format == 'svg':
+                import qrcode.image.svg
+                qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffered)
+            else:
+                qr.make_image(fill_color="black", back_color="white").save(buffered, format="PNG")
+            return buffered.getvalue()
+
+    @staticmethod
+    def _load_or_render(verification_code: str, image_format: str) -> bytes:
+        """Read the image from persistent storage, rendering and storing it on a miss."""
+        if not QRCodeService.is_valid_code(verification_code):
+            raise ValueError("Invalid verification code")
+
+        storage_dir = QRCodeService.STORAGE_DIR
+        path = os.path.join(storage_dir, f"{verification_code}.{image_format}") if storage_dir else None
+        if path:
+            try:
+                with open(path, 'rb') as f:
+                    return f.read()
+            except FileNotFoundError:
+                pass
+
+        image = QRCodeService._render(verification_code, image_format)
+
+        if path:
+            os.makedirs(storage_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=storage_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(image)
+            os.replace(tmp_path, path)
+        return image
+
+    @staticmethod
+    @lru_cache(maxsize=CACHE_SIZE)
+    def generate_qr_png(verification_code: str) -> bytes:
+        """PNG bytes of the verification QR code, memoized and persisted."""
+        return QRCodeService._load_or_render(verification_code, 'png')
+
+    @staticmethod
+    @lru_cache(maxsize=CACHE_SIZE)
+    def generate_qr_svg(verification_code: str) -> bytes:
+        """SVG bytes of the verification QR code, memoized and persisted."""
+        return QRCodeService._load_or_render(verification_code, 'svg')
+
+    @staticmethod
+    def pregenerate(verification_code: str) -> None:
+        """Render and store both image formats ahead of the first verify page view."""
+        try:
+            QRCodeService.generate_qr_png(verification_code)
+            QRCodeService.generate_qr_svg(verification_code)
+        except Exception as e:
+            logger.error(f"Error pre-generating QR code: {str(e)}")
+
     @staticmethod
     def generate_verification_qr(verification_code: str, agreement_id: int) -> str:
         """Generate a QR code for agreement verification."""
         try:
-            # Create QR code instance
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            
-            # Add verification data
-            verification_url = f"/verify/{verification_code}"
-            qr.add_data(verification_url)
-            qr.make(fit=True)
-
-            # Create an image from the QR Code
-            qr_image = qr.make_image(fill_color="black", back_color="white")
-            
             # Convert to base64 for embedding in HTML
-            buffered = BytesIO()
-            qr_image.save(buffered, format="PNG")
-            qr_base64 = base64.b64encode(buffered.getvalue()).decode()
-            
+            qr_base64 = base64.b64encode(QRCodeService.generate_qr_png(verification_code)).decode()
+
             return f"data:image/png;base64,{qr_base64}"
         except Exception as e:
             logger.error(f"Error generating QR code: {str(e)}")
             return None
 
+    @staticmethod
+    def decode_image_data(image_data: str) -> bytes:
+        """Raw image bytes from a base64 string or ``data:image`` URL."""
+        # Remove data URL prefix if present
+        if image_data.startswith('data:image'):
+            image_data = image_data.split(',')[1]
+        return base64.b64decode(image_data)
+
     @staticmethod
     def scan_qr_code(image_data: str) -> str:
         """Scan QR code from image data."""
         try:
-            # Remove data URL prefix if present
-            if image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
-                
-            # Convert base64 to image
-            image_bytes = base64.b64decode(image_data)
-            image = Image.open(BytesIO(image_bytes))
-            
-            # Decode QR code
-            decoded_objects = decode(image)
-            if decoded_objects:
-                return decoded_objects[0].data.decode()
-            return None
+            with metrics.QR_SECONDS.time(operation='decode'), metrics.span('qr.decode'):
+                return decode_pool.decode(QRCodeService.decode_image_data(image_data))
+        except QRDecoderBusy:
+            # Handled by the app as 503 with Retry-After
+            raise
         except Exception as e:
             logger.error(f"Error scanning QR code: {str(e)}")
             return None
+
+    @staticmethod
+    def scan_qr_codes(frames: List[str]) -> List[Optional[str]]:
+        """Scan several frames (e.g. a burst from the camera) in parallel."""
+        images = []
+        for image_data in frames:
+            try:
+                images.append(QRCodeService.decode_image_data(image_data))
+            except Exception as e:
+                logger.error(f"Error decoding QR frame: {str(e)}")
+                images.append(None)
+        with metrics.QR_SECONDS.time(operation='decode_batch'), metrics.span('qr.decode'):
+            results = decode_pool.decode_many([image for image in images if image is not None])
+        decoded = iter(results)
+        return [next(decoded) if image is not None else None for image in images]
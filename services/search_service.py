@@ -0,0 +1,240 @@
+import base64
+import binascii
+import json
+import logging
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, text
+from services.highlighter import find_highlight_spans
+
+logger = logging.getLogger(__name__)
+
+# Longest content prefix that is indexed; Postgres rejects tsvectors over 1MB
+SEARCH_MAX_CHARS = int(os.environ.get("SEARCH_MAX_CHARS", "200000"))
+# Most distinct entities (names, amounts, dates) indexed per agreement
+SEARCH_MAX_ENTITIES = 500
+ENTITY_TYPES = ('names', 'amounts', 'dates')
+
+PARTIES_RE = re.compile(r'\bbetween\s+(.{2,120}?)\s*(?:\(|,)?\s+and\s+(.{2,120}?)\s*(?:[(,;.]|\n|$)', re.IGNORECASE)
+QUERY_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+class SearchIndexError(Exception):
+    """Custom exception for search index errors."""
+    pass
+
+def extract_parties(content: str) -> str:
+    """Party names from the opening "between X and Y" clause, if there is one."""
+    match = PARTIES_RE.search(content[:5000])
+    return ' '.join(match.groups()) if match else ''
+
+def extract_entities(content: str) -> str:
+    """Distinct names, amounts and dates found by the highlighter, space separated."""
+    seen = {}
+    for span in find_highlight_spans(content):
+        if span['type'] in ENTITY_TYPES and span['text'] not in seen:
+            seen[span['text']] = None
+            if len(seen) >= SEARCH_MAX_ENTITIES:
+                break
+    return ' '.join(seen)
+
+def encode_cursor(rank: float, agreement_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, agreement_id]).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        rank, agreement_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return float(rank), int(agreement_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise SearchIndexError("Invalid cursor")
+
+class SearchIndex:
+    """Full-text index over agreement content, party names and extracted entities.
+
+    The index lives in its own ``agreement_search`` table, one row per
+    agreement: a tsvector column with a GIN index on PostgreSQL and an FTS5
+    virtual table (keyed by rowid) on SQLite. The table is created by
+    ``ensure_schema`` at startup; rows are upserted whenever an agreement is
+    created or signed, so the index never needs a full rebuild.
+    Results are ranked by relevance and paged with a (rank, id) keyset cursor.
+    """
+
+    DIALECTS = ('postgresql', 'sqlite')
+
+    POSTGRES_SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS agreement_search (
+            agreement_id INTEGER PRIMARY KEY REFERENCES agreement (id) ON DELETE CASCADE,
+            parties TEXT NOT NULL DEFAULT '',
+            document TSVECTOR NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_agreement_search_document ON agreement_search USING GIN (document)",
+    ]
+    SQLITE_SCHEMA = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS agreement_search "
+        "USING fts5(parties, entities, content, tokenize='porter unicode61')",
+    ]
+
+    # Parties weigh most, then entities, then the body text
+    POSTGRES_UPSERT = """
+        INSERT INTO agreement_search (agreement_id, parties, document)
+        VALUES (:id, :parties,
+                setweight(to_tsvector('english', :parties), 'A')
+                || setweight(to_tsvector('english', :entities), 'B')
+                || setweight(to_tsvector('english', :content), 'C'))
+        ON CONFLICT (agreement_id) DO UPDATE
+        SET parties = EXCLUDED.parties, document = EXCLUDED.document
+    """
+    SQLITE_DELETE = "DELETE FROM agreement_search WHERE rowid = :id"
+    SQLITE_INSERT = ("INSERT INTO agreement_search (rowid, parties, entities, content) "
+                     "VALUES (:id, :parties, :entities, :content)")
+
+    # Both queries return (agreement_id, rank, parties) with lower rank first,
+    # so one keyset condition works for either dialect
+    POSTGRES_SEARCH = """
+        SELECT agreement_id, rank, parties FROM (
+            SELECT s.agreement_id, -ts_rank(s.document, q) AS rank, s.parties
+            FROM agreement_search s, websearch_to_tsquery('english', :query) q
+            WHERE s.document @@ q
+        ) matches
+        WHERE :first OR rank > :rank OR (rank = :rank AND agreement_id < :after_id)
+        ORDER BY rank, agreement_id DESC
+        LIMIT :limit
+    """
+    SQLITE_SEARCH = """
+        SELECT agreement_id, rank, parties FROM (
+            SELECT rowid AS agreement_id, bm25(agreement_search, 10.0, 5.0, 1.0) AS rank, parties
+            FROM agreement_search
+            WHERE agreement_search MATCH :query
+        )
+        WHERE :first OR rank > :rank OR (rank = :rank AND agreement_id < :after_id)
+        ORDER BY rank, agreement_id DESC
+        LIMIT :limit
+    """
+
+    def __init__(self):
+        self._ready = set()
+
+    @staticmethod
+    def _dialect(connection) -> str:
+        name = connection.dialect.name
+        if name not in SearchIndex.DIALECTS:
+            raise SearchIndexError(f"Full-text search is not supported on {name}")
+        return name
+
+    def ensure_schema(self, engine) -> None:
+        """Create the index table in its own committed transaction.
+
+        Run at startup or from the CLI, never inside a caller's transaction:
+        a rollback there would also undo the DDL while this process went on
+        believing the table exists.
+        """
+        with engine.begin() as connection:
+            dialect = self._dialect(connection)
+            for statement in self.POSTGRES_SCHEMA if dialect == 'postgresql' else self.SQLITE_SCHEMA:
+                connection.execute(text(statement))
+        self._ready.add(str(engine.url))
+
+    def _check_ready(self, connection) -> str:
+        dialect = self._dialect(connection)
+        if str(connection.engine.url) not in self._ready:
+            raise SearchIndexError("Search index schema has not been created")
+        return dialect
+
+    def index_many(self, connection, agreements: Iterable[Tuple[int, str, Optional[str]]]) -> int:
+        """Upsert index rows for (id, content, extra) tuples; ``extra`` is indexed with the entities."""
+        dialect = self._check_ready(connection)
+        rows = []
+        for agreement_id, content, extra in agreements:
+            content = (content or '')[:SEARCH_MAX_CHARS]
+            entities = extract_entities(content)
+            rows.append({
+                'id': agreement_id,
+                'parties': extract_parties(content),
+                'entities': f"{entities} {extra}" if extra else entities,
+                'content': content
+            })
+        if not rows:
+            return 0
+        if dialect == 'postgresql':
+            connection.execute(text(self.POSTGRES_UPSERT), rows)
+        else:
+            # FTS5 tables have no upsert
+            connection.execute(text(self.SQLITE_DELETE), [{'id': row['id']} for row in rows])
+            connection.execute(text(self.SQLITE_INSERT), rows)
+        return len(rows)
+
+    @staticmethod
+    def fts5_query(query: str) -> str:
+        """Quote each term so user input cannot form FTS5 syntax; the last term matches as a prefix."""
+        terms = QUERY_TERM_RE.findall(query)
+        if not terms:
+            return ''
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def search(self, connection, query: str, limit: int = 20,
+               cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """One page of (agreement_id, parties) matches and the cursor for the next page."""
+        dialect = self._check_ready(connection)
+        if dialect == 'sqlite':
+            query = self.fts5_query(query)
+        if not query.strip():
+            return [], None
+        rank, after_id = decode_cursor(cursor) if cursor else (0.0, 0)
+        rows = connection.execute(
+            text(self.POSTGRES_SEARCH if dialect == 'postgresql' else self.SQLITE_SEARCH),
+            {'query': query, 'first': cursor is None, 'rank': rank, 'after_id': after_id, 'limit': limit + 1}
+        ).all()
+        next_cursor = encode_cursor(rows[limit - 1].rank, rows[limit - 1].agreement_id) if len(rows) > limit else None
+        return [{'agreement_id': row.agreement_id, 'parties': row.parties} for row in rows[:limit]], next_cursor
+
+def listing_columns(agreement_model) -> List:
+    """Agreement columns returned by the list and search APIs; content and signatures are never loaded."""
+    return [
+        agreement_model.id,
+        agreement_model.created_at,
+        agreement_model.signed_at,
+        agreement_model.verification_code,
+    ]
+
+def listing_row(row) -> Dict:
+    return {
+        'id': row.id,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'signed_at': row.signed_at.isoformat() if row.signed_at else None,
+        'verification_code': row.verification_code,
+    }
+
+def list_agreements(session, agreement_model, limit: int = 20, after_id: Optional[int] = None,
+                    signed: Optional[bool] = None) -> Tuple[List[Dict], Optional[int]]:
+    """Newest-first page of agreements after ``after_id``, using the primary key as the keyset."""
+    statement = select(*listing_columns(agreement_model)).order_by(agreement_model.id.desc()).limit(limit + 1)
+    if after_id is not None:
+        statement = statement.where(agreement_model.id < after_id)
+    if signed is not None:
+        statement = statement.where(
+            agreement_model.signed_at.isnot(None) if signed else agreement_model.signed_at.is_(None)
+        )
+    rows = session.execute(statement).all()
+    next_after = rows[limit - 1].id if len(rows) > limit else None
+    return [listing_row(row) for row in rows[:limit]], next_after
+
+def search_agreements(session, agreement_model, index: SearchIndex, query: str, limit: int = 20,
+                      cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """Ranked search results with listing columns, in index order."""
+    matches, next_cursor = index.search(session.connection(), query, limit, cursor)
+    if not matches:
+        return [], next_cursor
+    ids = [match['agreement_id'] for match in matches]
+    rows = {row.id: row for row in session.execute(
+        select(*listing_columns(agreement_model)).where(agreement_model.id.in_(ids))
+    )}
+    results = []
+    for match in matches:
+        row = rows.get(match['agreement_id'])
+        if row is not None:
+            results.append({**listing_row(row), 'parties': match['parties']})
+    return results, next_cursor
+
+search_index = SearchIndex()
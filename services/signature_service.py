@@ -0,0 +1,216 @@
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+from functools import lru_cache
+from io import BytesIO
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class SignatureStorageError(Exception):
+    """Custom exception for signature storage errors."""
+    pass
+
+class SignatureStrokes:
+    """A signature captured as pen strokes on a pad of ``width`` x ``height``.
+
+    The wire and storage form is ``strokes:v1:<width>,<height>:<stroke>;<stroke>...``
+    where each stroke is ``x0,y0,dx1,dy1,dx2,dy2,...`` in whole pixels, the
+    first point absolute and the rest relative to the previous point. A
+    typical signature is a few kilobytes, against tens of kilobytes for the
+    base64 PNG of the whole pad.
+    """
+    PREFIX = 'strokes:v1:'
+    MIME_TYPE = 'application/vnd.signature-strokes'
+    MAX_SIDE = 2000
+    MAX_POINTS = 10000
+    # Fewer points, or a smaller extent, is a click rather than a signature
+    MIN_POINTS = 10
+    MIN_EXTENT = 10
+
+    def __init__(self, width: int, height: int, strokes: List[List[Tuple[int, int]]]):
+        self.width = width
+        self.height = height
+        self.strokes = strokes
+
+    @staticmethod
+    def is_strokes(value: Optional[str]) -> bool:
+        return bool(value) and value.startswith(SignatureStrokes.PREFIX)
+
+    @classmethod
+    def decode(cls, value: str) -> 'SignatureStrokes':
+        """Parse the encoded form; raises SignatureStorageError if it is malformed."""
+        if not cls.is_strokes(value):
+            raise SignatureStorageError("Invalid signature format")
+        size, _, body = value[len(cls.PREFIX):].partition(':')
+        try:
+            width, height = (int(n) for n in size.split(','))
+            strokes = []
+            for encoded in filter(None, body.split(';')):
+                numbers = [int(n) for n in encoded.split(',')]
+                if len(numbers) % 2:
+                    raise ValueError("odd number of coordinates")
+                x, y = numbers[0], numbers[1]
+                points = [(x, y)]
+                for i in range(2, len(numbers), 2):
+                    x += numbers[i]
+                    y += numbers[i + 1]
+                    points.append((x, y))
+                strokes.append(points)
+        except ValueError:
+            raise SignatureStorageError("Corrupted signature data")
+        return cls(width, height, strokes)
+
+    def encode(self) -> str:
+        parts = []
+        for points in self.strokes:
+            numbers = [points[0][0], points[0][1]]
+            for (x0, y0), (x1, y1) in zip(points, points[1:]):
+                numbers.extend((x1 - x0, y1 - y0))
+            parts.append(','.join(map(str, numbers)))
+        return f"{self.PREFIX}{self.width},{self.height}:{';'.join(parts)}"
+
+    def validate(self) -> None:
+        """Check the strokes look like a signature; raises SignatureStorageError otherwise."""
+        if not (0 < self.width <= self.MAX_SIDE and 0 < self.height <= self.MAX_SIDE):
+            raise SignatureStorageError("Invalid signature pad size")
+        points = [point for stroke in self.strokes for point in stroke]
+        if len(points) < self.MIN_POINTS:
+            raise SignatureStorageError("Signature is empty")
+        if len(points) > self.MAX_POINTS:
+            raise SignatureStorageError("Signature has too many points")
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        if min(xs) < 0 or min(ys) < 0 or max(xs) > self.width or max(ys) > self.height:
+            raise SignatureStorageError("Signature is outside the pad")
+        if max(max(xs) - min(xs), max(ys) - min(ys)) < self.MIN_EXTENT:
+            raise SignatureStorageError("Signature is empty")
+
+    def to_svg(self, width: int, height: int, line_width: float = 2.0) -> bytes:
+        """SVG of the strokes scaled into ``width`` x ``height``."""
+        paths = []
+        for points in self.strokes:
+            path = 'M' + ' L'.join(f"{x} {y}" for x, y in points)
+            if len(points) == 1:
+                path += ' l0 0'
+            paths.append(f'<path d="{path}"/>')
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'viewBox="0 0 {self.width} {self.height}" preserveAspectRatio="xMidYMid meet">'
+            f'<g fill="none" stroke="#000" stroke-width="{line_width:g}" stroke-linecap="round" '
+            f'stroke-linejoin="round">{"".join(paths)}</g></svg>'
+        ).encode()
+
+    def to_png(self, width: int, height: int, line_width: float = 2.0) -> bytes:
+        """Grayscale-with-alpha PNG of the strokes scaled into ``width`` x ``height``."""
+        from PIL import Image, ImageDraw
+        scale = min(width / self.width, height / self.height)
+        offset_x = (width - self.width * scale) / 2
+        offset_y = (height - self.height * scale) / 2
+        stroke = max(1, round(line_width * scale))
+        image = Image.new('LA', (width, height), (0, 0))
+        draw = ImageDraw.Draw(image)
+        for points in self.strokes:
+            scaled = [(offset_x + x * scale, offset_y + y * scale) for x, y in points]
+            if len(scaled) > 1:
+                draw.line(scaled, fill=(0, 255), width=stroke, joint='curve')
+            # Round caps, as on the pad
+            radius = stroke / 2
+            for x, y in (scaled[0], scaled[-1]):
+                draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=(0, 255))
+        buffered = BytesIO()
+        image.save(buffered, format='PNG', optimize=True)
+        return buffered.getvalue()
+
+@lru_cache(maxsize=int(os.environ.get("SIGNATURE_RENDER_CACHE_SIZE", "256")))
+def render_strokes(encoded: str, image_format: str, width: int = 0, height: int = 0) -> bytes:
+    """Rasterize (``png``) or convert (``svg``) encoded strokes, at the pad size by default.
+
+    Cached per encoded value and size, so a signature shown on every view
+    and verification is only drawn once per process.
+    """
+    strokes = SignatureStrokes.decode(encoded)
+    width = width or strokes.width
+    height = height or strokes.height
+    if image_format == 'svg':
+        return strokes.to_svg(width, height)
+    return strokes.to_png(width, height)
+
+class SignatureStorageService:
+    # Agreement signature columns hold this prefix plus the blob's SHA-256
+    # instead of the full data URL.
+    REF_PREFIX = 'sha256:'
+    REF_RE = re.compile(r'^sha256:[0-9a-f]{64}$')
+    # Only raster formats are accepted (SVG could carry script), and only
+    # base64 characters, so a matching value is safe inside an HTML attribute
+    DATA_URL_RE = re.compile(r'^data:(image/(?:png|jpeg));base64,([A-Za-z0-9+/=]+)$')
+    RASTER_TYPES = ('image/png', 'image/jpeg')
+    MAX_PIXELS = int(os.environ.get("SIGNATURE_MAX_PIXELS", str(2000 * 2000)))
+
+    @staticmethod
+    def is_ref(value: Optional[str]) -> bool:
+        return bool(value) and bool(SignatureStorageService.REF_RE.match(value))
+
+    @staticmethod
+    def ref_digest(value: str) -> str:
+        return value[len(SignatureStorageService.REF_PREFIX):]
+
+    @staticmethod
+    def is_inline(value: Optional[str]) -> bool:
+        """True for a submitted signature that still has to be moved into blob storage."""
+        return isinstance(value, str) and (value.startswith('data:image') or SignatureStrokes.is_strokes(value))
+
+    @staticmethod
+    def decode_data_url(data_url: str) -> Tuple[str, bytes]:
+        """Decode a ``data:image/...;base64`` URL into its MIME type and raw bytes."""
+        match = SignatureStorageService.DATA_URL_RE.match(data_url or '')
+        if not match:
+            raise SignatureStorageError("Invalid signature format")
+        try:
+            return match.group(1), base64.b64decode(match.group(2), validate=True)
+        except (binascii.Error, ValueError):
+            raise SignatureStorageError("Corrupted signature data")
+
+    @staticmethod
+    def to_png(image_bytes: bytes) -> bytes:
+        """Re-encode an uploaded signature as an optimized grayscale PNG.
+
+        Every upload goes through this, so stored blobs are always a PNG the
+        server produced itself, whatever the client sent.
+        """
+        from PIL import Image
+        try:
+            image = Image.open(BytesIO(image_bytes))
+            if image.format not in ('PNG', 'JPEG'):
+                raise SignatureStorageError("Invalid signature format")
+            if image.width * image.height > SignatureStorageService.MAX_PIXELS:
+                raise SignatureStorageError("Signature image is too large")
+            image = image.convert('LA')
+            buffered = BytesIO()
+            image.save(buffered, format='PNG', optimize=True)
+            return buffered.getvalue()
+        except SignatureStorageError:
+            raise
+        except Exception as e:
+            logger.error(f"Error re-encoding signature: {str(e)}")
+            raise SignatureStorageError("Corrupted signature data")
+
+    @staticmethod
+    def store(session, blob_model, data_url: str) -> str:
+        """Decode a signature data URL (or validate strokes) once and store its bytes; returns the reference."""
+        if SignatureStrokes.is_strokes(data_url):
+            strokes = SignatureStrokes.decode(data_url)
+            strokes.validate()
+            mime_type, data = SignatureStrokes.MIME_TYPE, strokes.encode().encode()
+        else:
+            _mime_type, data = SignatureStorageService.decode_data_url(data_url)
+            mime_type, data = 'image/png', SignatureStorageService.to_png(data)
+
+        digest = hashlib.sha256(data).hexdigest()
+        pending = any(isinstance(obj, blob_model) and obj.sha256 == digest for obj in session.new)
+        if not pending and session.get(blob_model, digest) is None:
+            session.add(blob_model(sha256=digest, mime_type=mime_type, data=data, size=len(data)))
+        return SignatureStorageService.REF_PREFIX + digest
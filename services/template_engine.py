@@ -0,0 +1,113 @@
+import csv
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+from templates import AGREEMENT_TEMPLATES
+
+PLACEHOLDER_RE = re.compile(r'\[([A-Z][A-Z0-9 /]*)\]')
+
+class TemplateRenderError(Exception):
+    """Custom exception for template rendering errors."""
+    pass
+
+def field_key(placeholder: str) -> str:
+    """Form/CSV column name for a placeholder, e.g. 'PARTY A NAME' -> 'party_a_name'."""
+    return re.sub(r'[^a-z0-9]+', '_', placeholder.lower()).strip('_')
+
+def _field_type(placeholder: str) -> str:
+    if 'DATE' in placeholder:
+        return 'date'
+    if 'AMOUNT' in placeholder or placeholder == 'RATE':
+        return 'amount'
+    if placeholder.startswith(('DESCRIBE', 'LIST', 'DETAILED')):
+        return 'textarea'
+    return 'text'
+
+class CompiledTemplate:
+    """An agreement template parsed once into literal segments and field slots.
+
+    ``segments`` holds the literal text around the placeholders and
+    ``slots`` the field key filling the gap after each segment but the last,
+    so rendering is one list build and one join.
+    """
+
+    def __init__(self, template_id: str, name: str, content: str):
+        self.id = template_id
+        self.name = name
+        self.segments: List[str] = []
+        self.slots: List[str] = []
+        self.placeholders: Dict[str, str] = {}
+
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(content):
+            self.segments.append(content[position:match.start()])
+            key = field_key(match.group(1))
+            self.slots.append(key)
+            self.placeholders.setdefault(key, match.group(0))
+            position = match.end()
+        self.segments.append(content[position:])
+
+        self.fields = [
+            {
+                'name': key,
+                'label': placeholder[1:-1].title(),
+                'placeholder': placeholder,
+                'type': _field_type(placeholder[1:-1]),
+                # Signature markers stay in the text until the agreement is signed
+                'required': not key.endswith('_signature')
+            }
+            for key, placeholder in self.placeholders.items()
+        ]
+        self.required_fields = [field['name'] for field in self.fields if field['required']]
+
+    def schema(self) -> Dict:
+        return {'id': self.id, 'name': self.name, 'fields': self.fields}
+
+    def validate(self, values: Dict[str, str]) -> Dict[str, str]:
+        """Map of field name to error message for missing required fields."""
+        return {
+            name: f"{self.placeholders[name][1:-1].title()} is required"
+            for name in self.required_fields
+            if not str(values.get(name) or '').strip()
+        }
+
+    def render(self, values: Dict[str, str], strict: bool = True) -> str:
+        """Fill the template; unfilled optional fields keep their placeholder.
+
+        With ``strict`` a missing required field raises TemplateRenderError;
+        otherwise it also keeps its placeholder.
+        """
+        if strict:
+            errors = self.validate(values)
+            if errors:
+                raise TemplateRenderError("; ".join(errors.values()))
+
+        parts = []
+        for segment, slot in zip(self.segments, self.slots):
+            parts.append(segment)
+            value = values.get(slot)
+            parts.append(str(value) if value not in (None, '') else self.placeholders[slot])
+        parts.append(self.segments[-1])
+        return ''.join(parts)
+
+    def render_rows(self, rows: Iterable[Dict[str, str]]) -> Iterator[Tuple[int, Optional[str], Optional[str]]]:
+        """Render many rows, yielding (row number, content, error) without stopping on bad rows."""
+        for number, row in enumerate(rows, start=1):
+            try:
+                yield number, self.render(row), None
+            except TemplateRenderError as e:
+                yield number, None, str(e)
+
+    def render_csv(self, csv_file: TextIO) -> Iterator[Tuple[int, Optional[str], Optional[str]]]:
+        """Render one agreement per CSV row; columns are field names from ``schema()``."""
+        return self.render_rows(csv.DictReader(csv_file))
+
+COMPILED_TEMPLATES = {
+    template_id: CompiledTemplate(template_id, data['name'], data['content'])
+    for template_id, data in AGREEMENT_TEMPLATES.items()
+}
+
+def get_compiled_template(template_id: str) -> CompiledTemplate:
+    template = COMPILED_TEMPLATES.get(template_id)
+    if template is None:
+        raise TemplateRenderError(f"Unknown template: {template_id}")
+    return template
@@ -0,0 +1,127 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List
+from templates import AGREEMENT_TEMPLATES
+
+# Words that identify a template on their own. They form a separate vector
+# that outweighs the template body, so a short request like "an NDA with my
+# contractor" resolves to the NDA rather than to whichever body happens to
+# mention "contractor".
+TEMPLATE_KEYWORDS = {
+    'nda': ['nda', 'non-disclosure', 'nondisclosure', 'confidentiality', 'confidential',
+            'secret', 'secrets', 'proprietary', 'disclose', 'disclosure'],
+    'service': ['service', 'services', 'consultant', 'consulting', 'freelance',
+                'freelancer', 'contracting', 'provider', 'hourly', 'retainer'],
+    'rental': ['rental', 'rent', 'renting', 'lease', 'leasing', 'tenant', 'landlord',
+               'apartment', 'sublet', 'tenancy'],
+    'purchase': ['purchase', 'buy', 'buying', 'sell', 'selling', 'sale', 'buyer',
+                 'seller', 'purchasing', 'goods'],
+}
+
+KEYWORD_SHARE = 0.7
+STRONG_MATCH_SCORE = 0.15
+
+STOP_WORDS = frozenset("""
+a an and are as at be by for from has have i in is it its me my need of on or our
+shall that the their this to we will with you your any all between made such which
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+_PLACEHOLDER_RE = re.compile(r"\[([A-Z][A-Z /]+)\]")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stop words removed."""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+
+class TemplateMatcher:
+    """TF-IDF index over the agreement templates, built once at import.
+
+    Each template has two sparse term-weight vectors: one over its name and
+    body, one over its identifying keywords. A query is scored against both by
+    cosine similarity; the confidence reflects how strongly the best template
+    matched and how clearly it beat the runner-up.
+    """
+
+    def __init__(self, templates: Dict = AGREEMENT_TEMPLATES):
+        self.templates = templates
+        self.fields = {
+            template_id: list(dict.fromkeys(_PLACEHOLDER_RE.findall(data['content'])))
+            for template_id, data in templates.items()
+        }
+
+        body_counts = {}
+        keyword_counts = {}
+        for template_id, data in templates.items():
+            body = _PLACEHOLDER_RE.sub(' ', data['content'])
+            body_counts[template_id] = Counter(tokenize(data['name'] + ' ' + body))
+            keyword_counts[template_id] = Counter(TEMPLATE_KEYWORDS.get(template_id, []))
+
+        doc_count = len(templates)
+        doc_freq = Counter()
+        for template_id in templates:
+            doc_freq.update(set(body_counts[template_id]) | set(keyword_counts[template_id]))
+        self.idf = {term: math.log((1 + doc_count) / (1 + df)) + 1 for term, df in doc_freq.items()}
+
+        self.body_vectors = {tid: self._vectorize(counts) for tid, counts in body_counts.items()}
+        self.keyword_vectors = {tid: self._vectorize(counts) for tid, counts in keyword_counts.items()}
+
+    def _vectorize(self, counts: Counter) -> Dict[str, float]:
+        """Unit-length TF-IDF vector with sublinear term frequency."""
+        vector = {term: (1 + math.log(count)) * self.idf[term] for term, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {term: weight / norm for term, weight in vector.items()} if norm else {}
+
+    def score(self, text: str) -> Dict[str, float]:
+        """Weighted cosine similarity of the query against every template."""
+        query = self._vectorize(Counter(token for token in tokenize(text) if token in self.idf))
+        if not query:
+            return {template_id: 0.0 for template_id in self.templates}
+
+        def cosine(vector):
+            return sum(weight * vector.get(term, 0.0) for term, weight in query.items())
+
+        return {
+            template_id: KEYWORD_SHARE * cosine(self.keyword_vectors[template_id])
+                         + (1 - KEYWORD_SHARE) * cosine(self.body_vectors[template_id])
+            for template_id in self.templates
+        }
+
+    def match(self, text: str) -> dict:
+        """Return local template suggestions in the same shape as the LLM result."""
+        scores = self.score(text)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best_score = ranked[0][1]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+
+        if best_score <= 0:
+            confidence = 0.0
+        else:
+            margin = (best_score - runner_up) / best_score
+            strength = min(1.0, best_score / STRONG_MATCH_SCORE)
+            confidence = round(margin * strength, 3)
+
+        tokens = set(tokenize(text))
+        template_matches = []
+        for template_id, template_score in ranked:
+            if template_score <= 0:
+                continue
+            matched_terms = sorted(tokens & set(TEMPLATE_KEYWORDS.get(template_id, [])))
+            template_matches.append({
+                'template_id': template_id,
+                'template_name': self.templates[template_id]['name'],
+                'confidence_score': confidence if template_id == ranked[0][0]
+                                    else round(confidence * template_score / best_score, 3),
+                'matching_factors': [f"Mentions '{term}'" for term in matched_terms],
+                'customization_needed': [f"Fill in {field.title()}" for field in self.fields[template_id]]
+            })
+
+        result = {'template_matches': template_matches, 'source': 'local'}
+        if template_matches:
+            result['best_match'] = template_matches[0]['template_name']
+            result['confidence'] = template_matches[0]['confidence_score']
+        else:
+            result['confidence'] = 0.0
+        return result
+
+template_matcher = TemplateMatcher()
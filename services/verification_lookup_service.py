@@ -0,0 +1,171 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional
+from services.cache_service import MemoryCacheBackend
+from services.verification_service import DocumentVerificationService
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings; false positives only, never false negatives."""
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str):
+        digest = hashlib.sha256(value.encode()).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:16], 'big') | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, value: str) -> None:
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+class RateLimiter:
+    """Sliding-window request limiter keyed by client address."""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._hits: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+
+    def allow(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_prune > self.window:
+                self._prune(now)
+            hits = self._hits.setdefault(key, deque())
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                return False
+            hits.append(now)
+            return True
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window
+        for key in [key for key, hits in self._hits.items() if not hits or hits[-1] <= cutoff]:
+            del self._hits[key]
+        self._last_prune = now
+
+class VerificationLookupService:
+    """Resolves verification codes with as few database round trips as possible.
+
+    Known codes are kept in a Bloom filter that is topped up incrementally
+    from the verification record table, so most unknown or guessed codes are
+    rejected without a query. Record ids and creation times are assigned
+    before commit, so transactions can become visible out of order; each
+    top-up therefore re-reads an ``overlap`` window before the newest code
+    seen, and the whole filter is rebuilt every ``rebuild_interval`` to pick
+    up anything committed later than that. Codes that pass the filter but are not in the
+    database are remembered in a negative cache; found records are kept in a
+    read-through cache.
+    """
+
+    def __init__(self, load_codes: Callable[[Optional[datetime]], Iterable],
+                 load_record: Callable[[str], Optional[Dict]], refresh_interval: float = 5.0,
+                 cache_ttl: int = 300, negative_ttl: int = 60, overlap: float = None,
+                 rebuild_interval: float = None):
+        # load_codes(since) yields (created_at, verification_code) for records
+        # created at or after ``since``; with since=None it must yield every
+        # known code, including those stored outside the record table
+        self.load_codes = load_codes
+        self.load_record = load_record
+        self.refresh_interval = refresh_interval
+        self.cache_ttl = cache_ttl
+        self.negative_ttl = negative_ttl
+        self.overlap = timedelta(seconds=overlap if overlap is not None else
+                                 float(os.environ.get("VERIFY_REFRESH_OVERLAP", "300")))
+        self.rebuild_interval = (rebuild_interval if rebuild_interval is not None else
+                                 float(os.environ.get("VERIFY_BLOOM_REBUILD_INTERVAL", "3600")))
+        self.capacity = int(os.environ.get("VERIFY_BLOOM_CAPACITY", "1000000"))
+        self.bloom = BloomFilter(capacity=self.capacity)
+        self.records = MemoryCacheBackend(max_entries=10000)
+        self.misses = MemoryCacheBackend(max_entries=100000)
+        self._newest: Optional[datetime] = None
+        self._last_refresh = 0.0
+        self._last_rebuild = 0.0
+        self._loaded = False
+        # Filter being rebuilt, so codes added meanwhile are not lost on the swap
+        self._next_bloom: Optional[BloomFilter] = None
+        self._lock = threading.Lock()
+
+    def add_code(self, verification_code: str) -> None:
+        self.bloom.add(verification_code)
+        next_bloom = self._next_bloom
+        if next_bloom is not None:
+            next_bloom.add(verification_code)
+        self.misses.delete(verification_code)
+
+    def refresh(self, force: bool = False) -> None:
+        """Top up the Bloom filter with recently created codes, or rebuild it when it is due."""
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return
+        with self._lock:
+            if not force and now - self._last_refresh < self.refresh_interval:
+                return
+            rebuild = not self._loaded or now - self._last_rebuild >= self.rebuild_interval
+            try:
+                if rebuild:
+                    self._next_bloom = bloom = BloomFilter(capacity=self.capacity)
+                    since, newest = None, None
+                else:
+                    bloom, newest = self.bloom, self._newest
+                    since = newest - self.overlap if newest is not None else datetime.min
+                for created_at, code in self.load_codes(since):
+                    bloom.add(code)
+                    if created_at is not None and (newest is None or created_at > newest):
+                        newest = created_at
+                if rebuild:
+                    self.bloom = bloom
+                    self._last_rebuild = now
+                self._newest = newest
+                self._last_refresh = now
+                self._loaded = True
+            except Exception as e:
+                logger.error(f"Error refreshing verification code filter: {str(e)}")
+            finally:
+                self._next_bloom = None
+
+    def might_exist(self, verification_code: str) -> bool:
+        """Cheap check that never touches the database for codes known to be unknown."""
+        if not DocumentVerificationService.is_valid_verification_code(verification_code):
+            return False
+        self.refresh()
+        # Until the filter has been loaded once it cannot rule anything out
+        if self._loaded and verification_code not in self.bloom:
+            return False
+        return self.misses.get(verification_code) is None
+
+    def lookup(self, verification_code: str) -> Optional[Dict]:
+        """Return the verification record for a code, or None if it does not exist."""
+        if not self.might_exist(verification_code):
+            return None
+
+        cached = self.records.get(verification_code)
+        if cached is not None:
+            return json.loads(cached)
+
+        record = self.load_record(verification_code)
+        if record is None:
+            self.misses.set(verification_code, '1', self.negative_ttl)
+            return None
+        self.records.set(verification_code, json.dumps(record), self.cache_ttl)
+        return record
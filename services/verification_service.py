@@ -1,10 +1,16 @@
 import hashlib
 import json
+import os
+import re
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 import logging
 import hmac
 import base64
+from difflib import SequenceMatcher
+from services.signature_service import SignatureStorageService, SignatureStrokes, SignatureStorageError
+from services import merkle
+from services import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -12,9 +18,49 @@ class DocumentVerificationError(Exception):
     """Custom exception for document verification errors."""
     pass
 
+class TimestampKeyring:
+    """HMAC keys for timestamp tokens, addressed by key id.
+
+    New tokens are signed with the active key; every key in the ring can
+    still verify, so rotating means adding a new key in front and keeping
+    the old one until its tokens no longer matter.
+    """
+
+    def __init__(self, keys: Dict[str, bytes], active_kid: str):
+        if active_kid not in keys:
+            raise DocumentVerificationError("Active timestamp key is not in the keyring")
+        self.keys = keys
+        self.active_kid = active_kid
+
+    @classmethod
+    def from_env(cls) -> 'TimestampKeyring':
+        """Load ``kid:secret`` pairs from VERIFICATION_SIGNING_KEYS; the first one is active.
+
+        Falls back to a single key derived from FLASK_SECRET_KEY.
+        """
+        keys = {}
+        for entry in os.environ.get("VERIFICATION_SIGNING_KEYS", "").split(','):
+            kid, _, secret = entry.strip().partition(':')
+            if kid and secret:
+                keys[kid] = secret.encode()
+        if not keys:
+            secret = os.environ.get("FLASK_SECRET_KEY", "a-very-secret-key")
+            keys['default'] = hashlib.sha256(f"timestamp-token:{secret}".encode()).digest()
+        return cls(keys, next(iter(keys)))
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
 class DocumentVerificationService:
-    # Time window for timestamp verification (in minutes)
+    # Allowed clock skew for timestamps in the future (in minutes)
     TIMESTAMP_WINDOW = 5
+    # Tells whether a ``sha256:`` signature reference has a stored blob; set
+    # by the app, since that needs the database
+    signature_exists: Optional[Callable[[str], bool]] = None
+    keyring = TimestampKeyring.from_env()
     
     @staticmethod
     def calculate_document_hash(content: str) -> str:
@@ -34,18 +80,25 @@ class DocumentVerificationService:
             if not signature1 or not signature2:
                 return False, "Missing signatures"
                 
-            if not (signature1.startswith('data:image') and signature2.startswith('data:image')):
-                return False, "Invalid signature format"
-                
-            # Verify signature data integrity
-            try:
-                sig1_data = signature1.split(',')[1]
-                sig2_data = signature2.split(',')[1]
-                base64.b64decode(sig1_data)
-                base64.b64decode(sig2_data)
-            except:
-                return False, "Corrupted signature data"
-                
+            for signature in (signature1, signature2):
+                if SignatureStorageService.is_ref(signature):
+                    exists = DocumentVerificationService.signature_exists
+                    if exists is not None and not exists(signature):
+                        return False, "Signature not found"
+                    continue
+                # Stroke signatures are checked on their points, without drawing them
+                if SignatureStrokes.is_strokes(signature):
+                    try:
+                        SignatureStrokes.decode(signature).validate()
+                    except SignatureStorageError as e:
+                        return False, str(e)
+                    continue
+                # Legacy inline image; verify signature data integrity
+                try:
+                    SignatureStorageService.decode_data_url(signature)
+                except SignatureStorageError as e:
+                    return False, str(e)
+
             return True, "Signatures valid"
         except Exception as e:
             logger.error(f"Error verifying signatures: {str(e)}")
@@ -73,23 +126,143 @@ class DocumentVerificationService:
                 'content_hash': content_hash,
                 'timestamp': timestamp.isoformat(),
                 'status': 'created',
-                'blockchain_data': blockchain_data
+                'blockchain_data': blockchain_data,
+                'merkle_tree': DocumentVerificationService.build_merkle_tree(content),
+                'timestamp_token': DocumentVerificationService.issue_timestamp_token(
+                    agreement_id, content_hash, timestamp.isoformat()
+                )
             }
         except Exception as e:
             logger.error(f"Error creating verification record: {str(e)}")
             raise DocumentVerificationError("Failed to create verification record")
     
     @staticmethod
-    def verify_timestamp(timestamp_str: str) -> Tuple[bool, str]:
-        """Verify if the timestamp is within acceptable range."""
+    def build_merkle_tree(content: str, splitter: int = merkle.SPLITTER_VERSION) -> Dict:
+        """Build a Merkle tree over the document's clauses.
+
+        Only the leaf hashes, the root and the splitter version are stored.
+        Leaves come from the versioned splitter in ``merkle``, not the clause
+        chunker used for prompts, so changes to prompt chunking cannot
+        invalidate stored trees.
+        """
+        try:
+            sections = merkle.split_sections(content, splitter)
+        except ValueError as e:
+            raise DocumentVerificationError(str(e))
+        leaves = [merkle.leaf_hash(section) for section in sections]
+        return {'algorithm': 'sha256', 'splitter': splitter, 'leaves': leaves, 'root': merkle.merkle_root(leaves)}
+    
+    @staticmethod
+    def find_changed_sections(stored_tree: Dict, current_content: str) -> List[Dict]:
+        """Sections added, removed or modified since the stored tree was built.
+
+        Leaves are aligned on their hashes first, so inserting or deleting a
+        clause reports that clause only, not every clause after it. Each
+        change carries ``stored_index`` and ``current_index``; the side a
+        section is missing from is None.
+        """
+        stored_leaves = stored_tree.get('leaves', [])
+        # Trees from before splitter versions were recorded used version 1
+        current_leaves = DocumentVerificationService.build_merkle_tree(
+            current_content, stored_tree.get('splitter', 1)
+        )['leaves']
+
+        changes = []
+        matcher = SequenceMatcher(None, stored_leaves, current_leaves, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                continue
+            # A replaced block pairs its sections up as modifications; any
+            # left over on one side were removed or added
+            paired = min(i2 - i1, j2 - j1) if tag == 'replace' else 0
+            changes.extend({'change': 'modified', 'stored_index': i1 + k, 'current_index': j1 + k}
+                           for k in range(paired))
+            changes.extend({'change': 'removed', 'stored_index': i, 'current_index': None}
+                           for i in range(i1 + paired, i2))
+            changes.extend({'change': 'added', 'stored_index': None, 'current_index': j}
+                           for j in range(j1 + paired, j2))
+        return changes
+    
+    @staticmethod
+    def clause_proof(stored_tree: Dict, index: int) -> List[Dict]:
+        """Proof that lets a single clause be checked against the stored root."""
+        leaves = stored_tree.get('leaves', [])
+        if not 0 <= index < len(leaves):
+            raise DocumentVerificationError("Clause index out of range")
+        return merkle.merkle_proof(leaves, index)
+    
+    @staticmethod
+    def verify_clause(clause: str, proof: List[Dict], root: str) -> bool:
+        """Check one clause against a Merkle root without the rest of the document."""
+        return merkle.verify_proof(merkle.leaf_hash(clause), proof, root)
+    
+    @staticmethod
+    def issue_timestamp_token(agreement_id: int, content_hash: str, timestamp: str) -> str:
+        """Sign the record's timestamp together with the agreement id and content hash."""
+        keyring = DocumentVerificationService.keyring
+        claims = json.dumps(
+            {'a': agreement_id, 'h': content_hash, 't': timestamp},
+            separators=(',', ':'), sort_keys=True
+        ).encode()
+        payload = f"{keyring.active_kid}.{_b64encode(claims)}"
+        signature = hmac.new(keyring.keys[keyring.active_kid], payload.encode(), hashlib.sha256).digest()
+        return f"{payload}.{_b64encode(signature)}"
+    
+    @staticmethod
+    def verify_timestamp_token(token: str) -> Tuple[bool, Optional[Dict], str]:
+        """Check a timestamp token's signature offline; returns (valid, claims, message)."""
+        try:
+            kid, claims_b64, signature_b64 = token.split('.')
+        except (AttributeError, ValueError):
+            return False, None, "Malformed timestamp token"
+        
+        key = DocumentVerificationService.keyring.keys.get(kid)
+        if key is None:
+            return False, None, f"Unknown timestamp signing key: {kid}"
+        
+        expected = hmac.new(key, f"{kid}.{claims_b64}".encode(), hashlib.sha256).digest()
+        try:
+            signature = _b64decode(signature_b64)
+            claims = json.loads(_b64decode(claims_b64))
+        except Exception:
+            return False, None, "Malformed timestamp token"
+        if not hmac.compare_digest(expected, signature):
+            return False, None, "Timestamp token signature is invalid"
+        return True, claims, "Timestamp verified"
+    
+    @staticmethod
+    def verify_timestamp_tokens(tokens: List[str]) -> List[Tuple[bool, Optional[Dict], str]]:
+        """Verify many timestamp tokens; no database or clock access is needed."""
+        return [DocumentVerificationService.verify_timestamp_token(token) for token in tokens]
+    
+    @staticmethod
+    def verify_timestamp(timestamp_str: str, token: Optional[str] = None,
+                         content_hash: Optional[str] = None,
+                         agreement_id: Optional[int] = None) -> Tuple[bool, str]:
+        """Verify the record's timestamp.
+        
+        Records with a signed token are checked against the token's claims,
+        including the agreement id, so a token copied from another agreement's
+        record is rejected. Older records without one only need a well-formed timestamp that is
+        not in the future beyond the allowed clock skew.
+        """
+        if token:
+            valid, claims, message = DocumentVerificationService.verify_timestamp_token(token)
+            if not valid:
+                return False, message
+            if (claims.get('t') != timestamp_str
+                    or (content_hash and claims.get('h') != content_hash)
+                    or (agreement_id is not None and claims.get('a') != agreement_id)):
+                return False, "Timestamp token does not match the verification record"
+            return True, message
+        
         try:
             timestamp = datetime.fromisoformat(timestamp_str)
-            now = datetime.utcnow()
-            time_diff = abs((now - timestamp).total_seconds() / 60)
+            skew = (timestamp - datetime.utcnow()).total_seconds() / 60
             
-            if time_diff > DocumentVerificationService.TIMESTAMP_WINDOW:
-                return False, f"Timestamp verification failed: outside {DocumentVerificationService.TIMESTAMP_WINDOW} minute window"
-            return True, "Timestamp verified"
+            if skew > DocumentVerificationService.TIMESTAMP_WINDOW:
+                return False, "Timestamp verification failed: timestamp is in the future"
+            return True, "Timestamp verified (unsigned record)"
         except Exception as e:
             return False, f"Invalid timestamp format: {str(e)}"
     
@@ -123,6 +296,12 @@ class DocumentVerificationService:
             raise DocumentVerificationError("Failed to generate verification code")
     
     @staticmethod
+    def is_valid_verification_code(verification_code: str) -> bool:
+        """Check that a code has the shape produced by generate_verification_code."""
+        return bool(verification_code) and bool(re.fullmatch(r'[0-9a-f]{12}', verification_code))
+    
+    @staticmethod
+    @metrics.timed(metrics.VERIFY_SECONDS, 'verify', outcome=lambda result: 'valid' if result[0] else 'invalid')
     def verify_agreement(agreement, stored_verification: Dict) -> Tuple[bool, Dict]:
         """Verify the entire agreement including content, signatures, and timestamps."""
         verification_results = {
@@ -148,9 +327,22 @@ class DocumentVerificationService:
                 'message': content_msg
             }
             
+            # Report which sections changed when the record carries a clause tree
+            if not content_valid and stored_verification.get('merkle_tree'):
+                try:
+                    changed = DocumentVerificationService.find_changed_sections(
+                        stored_verification['merkle_tree'], agreement.content
+                    )
+                    verification_results['content_integrity']['changed_sections'] = changed
+                except DocumentVerificationError as e:
+                    logger.warning(f"Cannot compare clause tree: {str(e)}")
+            
             # Check timestamp
             time_valid, time_msg = DocumentVerificationService.verify_timestamp(
-                stored_verification.get('timestamp')
+                stored_verification.get('timestamp'),
+                stored_verification.get('timestamp_token'),
+                stored_verification.get('content_hash'),
+                agreement.id
             )
             verification_results['timestamp'] = {
                 'status': time_valid,
@@ -0,0 +1,130 @@
+// Client for the background job endpoints (/jobs/<kind>): submits a job,
+// polls its status with backoff and fetches the result, which is JSON or,
+// for file results such as PDFs, a blob with the server's download name.
+class JobClient {
+    constructor({ maxRetries = 3, retryDelay = 1000 } = {}) {
+        this.maxRetries = maxRetries;
+        this.retryDelay = retryDelay;
+    }
+
+    getCSRFToken() {
+        return document.querySelector('meta[name="csrf-token"]')?.content || '';
+    }
+
+    async request(url, options = {}) {
+        const response = await fetch(url, {
+            ...options,
+            headers: {
+                ...options.headers,
+                'X-Requested-With': 'XMLHttpRequest',
+                'X-CSRFToken': this.getCSRFToken(),
+                'Accept': 'application/json'
+            }
+        });
+        const data = await response.json().catch(() => ({}));
+        if (!response.ok) {
+            throw new Error(data.error || `HTTP error! status: ${response.status}`);
+        }
+        return data;
+    }
+
+    async getWithRetry(url, retries = 0) {
+        // Status polls are idempotent, so transient failures are retried
+        try {
+            return await this.request(url);
+        } catch (error) {
+            if (retries >= this.maxRetries) throw error;
+            await new Promise(resolve => setTimeout(resolve, this.retryDelay * Math.pow(2, retries)));
+            return this.getWithRetry(url, retries + 1);
+        }
+    }
+
+    async run(kind, payload = {}, options = {}) {
+        // Submitted once: a retried POST could start the job twice
+        const job = await this.request(`/jobs/${kind}`, {
+            method: 'POST',
+            body: JSON.stringify(payload),
+            headers: { 'Content-Type': 'application/json' }
+        });
+        return this.poll(job, options);
+    }
+
+    async poll(job, { pollInterval = 1000, maxInterval = 8000, timeout = 120000 } = {}) {
+        const deadline = Date.now() + timeout;
+        let delay = pollInterval;
+
+        while (Date.now() < deadline) {
+            const status = await this.getWithRetry(job.status_url);
+            if (status.status === 'finished') {
+                return this.fetchResult(job.result_url);
+            }
+            if (status.status === 'failed') {
+                throw new Error(status.error || 'Background job failed');
+            }
+
+            await new Promise(resolve => setTimeout(resolve, delay));
+            delay = Math.min(delay * 2, maxInterval);
+        }
+
+        throw new Error('Timed out waiting for background job');
+    }
+
+    async fetchResult(url) {
+        const response = await fetch(url, {
+            headers: { 'X-Requested-With': 'XMLHttpRequest' }
+        });
+        const contentType = response.headers.get('content-type') || '';
+        if (contentType.includes('application/json')) {
+            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.error || `HTTP error! status: ${response.status}`);
+            }
+            return data;
+        }
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        const disposition = response.headers.get('content-disposition') || '';
+        const match = disposition.match(/filename\*?=(?:UTF-8'')?"?([^";]+)"?/i);
+        return {
+            blob: await response.blob(),
+            filename: match ? decodeURIComponent(match[1]) : null
+        };
+    }
+
+    download(blob, filename) {
+        const link = document.createElement('a');
+        link.href = URL.createObjectURL(blob);
+        link.download = filename || 'download';
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
+        setTimeout(() => URL.revokeObjectURL(link.href), 0);
+    }
+}
+
+window.jobClient = new JobClient();
+
+document.addEventListener('DOMContentLoaded', () => {
+    // PDF links render through the agreement_pdf job instead of holding a
+    // request thread; the plain link is the fallback if the job fails
+    document.querySelectorAll('a[data-pdf-job]').forEach(link => {
+        link.addEventListener('click', async (event) => {
+            event.preventDefault();
+            if (link.classList.contains('disabled')) return;
+            link.classList.add('disabled');
+            try {
+                const result = await window.jobClient.run('agreement_pdf', {
+                    agreement_id: Number(link.dataset.pdfJob)
+                });
+                window.jobClient.download(result.blob, result.filename);
+            } catch (error) {
+                console.error('PDF job failed, downloading directly:', error);
+                window.location.href = link.href;
+            } finally {
+                link.classList.remove('disabled');
+            }
+        });
+    });
+});
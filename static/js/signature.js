@@ -1,34 +1,59 @@
+// Signatures are posted as pen strokes rather than a PNG of the pad:
+// "strokes:v1:<width>,<height>:<stroke>;<stroke>..." where each stroke is
+// "x0,y0,dx1,dy1,..." in whole pixels, relative to the previous point.
+// The server validates the points and renders images only when needed.
+function encodeStrokes(width, height, strokes) {
+    const encoded = strokes.map(points => {
+        const numbers = [points[0][0], points[0][1]];
+        for (let i = 1; i < points.length; i++) {
+            numbers.push(points[i][0] - points[i - 1][0], points[i][1] - points[i - 1][1]);
+        }
+        return numbers.join(',');
+    });
+    return `strokes:v1:${width},${height}:${encoded.join(';')}`;
+}
+
+const signatureStrokes = {};
+
 document.addEventListener('DOMContentLoaded', () => {
     const pads = ['signature1Pad', 'signature2Pad'];
-    
+
     pads.forEach(padId => {
         const canvas = document.createElement('canvas');
         canvas.width = 400;
         canvas.height = 200;
         document.getElementById(padId).appendChild(canvas);
-        
+
         const ctx = canvas.getContext('2d');
+        const strokes = signatureStrokes[padId] = [];
         let drawing = false;
-        
+
         canvas.addEventListener('mousedown', startDrawing);
         canvas.addEventListener('mousemove', draw);
         canvas.addEventListener('mouseup', stopDrawing);
         canvas.addEventListener('touchstart', handleTouch);
         canvas.addEventListener('touchmove', handleTouch);
         canvas.addEventListener('touchend', stopDrawing);
-        
+
         function startDrawing(e) {
             drawing = true;
+            strokes.push([]);
             draw(e);
         }
-        
+
         function draw(e) {
             if (!drawing) return;
-            
+
             const rect = canvas.getBoundingClientRect();
-            const x = (e.clientX || e.touches[0].clientX) - rect.left;
-            const y = (e.clientY || e.touches[0].clientY) - rect.top;
-            
+            // Clamp to the pad so every point is inside the declared size
+            const x = Math.min(canvas.width, Math.max(0, Math.round((e.clientX || e.touches[0].clientX) - rect.left)));
+            const y = Math.min(canvas.height, Math.max(0, Math.round((e.clientY || e.touches[0].clientY) - rect.top)));
+
+            const points = strokes[strokes.length - 1];
+            const last = points[points.length - 1];
+            if (last && last[0] === x && last[1] === y) return;
+            points.push([x, y]);
+
             ctx.lineWidth = 2;
             ctx.lineCap = 'round';
             ctx.lineTo(x, y);
@@ -36,13 +61,16 @@ document.addEventListener('DOMContentLoaded', () => {
             ctx.beginPath();
             ctx.moveTo(x, y);
         }
-        
+
         function stopDrawing() {
+            if (!drawing) return;
             drawing = false;
             ctx.beginPath();
-            document.getElementById(padId.replace('Pad', 'Data')).value = canvas.toDataURL();
+            if (!strokes[strokes.length - 1].length) strokes.pop();
+            document.getElementById(padId.replace('Pad', 'Data')).value =
+                strokes.length ? encodeStrokes(canvas.width, canvas.height, strokes) : '';
         }
-        
+
         function handleTouch(e) {
             e.preventDefault();
             const touch = e.type === 'touchstart' ? startDrawing : draw;
@@ -55,5 +83,6 @@ function clearSignature(padId) {
     const canvas = document.querySelector(`#${padId} canvas`);
     const ctx = canvas.getContext('2d');
     ctx.clearRect(0, 0, canvas.width, canvas.height);
+    signatureStrokes[padId].length = 0;
     document.getElementById(padId.replace('Pad', 'Data')).value = '';
 }
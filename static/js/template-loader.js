@@ -2,6 +2,7 @@ class TemplateLoader {
     constructor() {
         this.elements = null;
         this.templates = {};
+        this.schema = null;
         this.maxRetries = 3;
         this.retryDelay = 1000;
         this.initialized = false;
@@ -58,6 +59,10 @@ class TemplateLoader {
         
         // Additional UI elements
         this.elements.loadingSpinner = this.elements.loadTemplateBtn?.querySelector('.spinner-border');
+        this.elements.analyzeBtn = document.getElementById('analyzeContent');
+        this.elements.analysisPanel = document.getElementById('analysisPanel');
+        this.elements.suggestBtn = document.getElementById('suggestTemplates');
+        this.elements.suggestionPanel = document.getElementById('suggestionPanel');
         this.elements.retryButton = document.createElement('button');
         this.elements.retryButton.className = 'btn btn-outline-primary btn-sm mt-2 d-none';
         this.elements.retryButton.innerHTML = '<i class="bi bi-arrow-clockwise"></i> Retry Loading Templates';
@@ -292,7 +297,10 @@ class TemplateLoader {
         } catch (error) {
             console.error(`Fetch attempt ${retries + 1} failed:`, error);
             
-            if (retries < this.maxRetries) {
+            // Only idempotent requests are retried; a repeated POST could
+            // start a second job or create a second agreement
+            const method = (options.method || 'GET').toUpperCase();
+            if (retries < this.maxRetries && (method === 'GET' || method === 'HEAD')) {
                 const delay = this.retryDelay * Math.pow(2, retries);
                 console.log(`Retrying in ${delay}ms...`);
                 await new Promise(resolve => setTimeout(resolve, delay));
@@ -302,7 +310,227 @@ class TemplateLoader {
             throw error;
         }
     }
-    
+
+    async streamEvents(url, payload, onEvent) {
+        // EventSource cannot POST, so the SSE frames are read from a fetch body
+        const response = await fetch(url, {
+            method: 'POST',
+            body: JSON.stringify(payload),
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
+                'X-Requested-With': 'XMLHttpRequest',
+                'X-CSRFToken': this.getCSRFToken()
+            }
+        });
+        if (!response.ok || !response.body) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                const data = [];
+                frame.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+                });
+                if (data.length) onEvent(event, JSON.parse(data.join('\n')));
+            }
+        }
+    }
+
+    async streamAnalysis() {
+        const content = this.elements?.contentArea?.value.trim();
+        const panel = this.elements?.analysisPanel;
+        if (!content || !panel) {
+            this.showFeedback('Enter agreement content to analyze.', 'warning');
+            return;
+        }
+
+        panel.replaceChildren();
+        const status = document.createElement('div');
+        status.className = 'text-muted small mb-2';
+        status.innerHTML = '<span class="spinner-border spinner-border-sm me-2" role="status"></span>Analyzing...';
+        panel.appendChild(status);
+        this.elements.analyzeBtn.disabled = true;
+
+        let sections = 0;
+        try {
+            await this.streamEvents('/analyze/stream', { text: content }, (event, data) => {
+                if (event === 'highlights') {
+                    panel.insertBefore(this.renderSection('highlights', data.highlights), status);
+                } else if (event === 'section') {
+                    sections++;
+                    panel.insertBefore(this.renderSection(data.name, data.value), status);
+                } else if (event === 'error') {
+                    throw new Error(data.error);
+                }
+            });
+            status.remove();
+        } catch (error) {
+            console.error('Streaming analysis failed:', error);
+            if (!sections && await this.analyzeWithJob(content, panel, status)) {
+                return;
+            }
+            status.className = 'alert alert-warning small';
+            status.textContent = `Analysis incomplete: ${error.message}`;
+        } finally {
+            this.elements.analyzeBtn.disabled = false;
+        }
+    }
+
+    async streamSuggestions() {
+        const content = this.elements?.contentArea?.value.trim();
+        const panel = this.elements?.suggestionPanel;
+        if (!content || !panel) {
+            this.showFeedback('Describe the agreement in the content area to get suggestions.', 'warning');
+            return;
+        }
+
+        panel.replaceChildren();
+        const status = document.createElement('div');
+        status.className = 'text-muted small mb-2';
+        status.innerHTML = '<span class="spinner-border spinner-border-sm me-2" role="status"></span>Finding templates...';
+        panel.appendChild(status);
+        // The local match arrives first and is replaced once the model's matches are complete
+        let matches = null;
+        const showMatches = (templateMatches, source) => {
+            const list = this.renderSuggestions(templateMatches, source);
+            if (matches) matches.replaceWith(list);
+            else panel.insertBefore(list, status);
+            matches = list;
+        };
+        this.elements.suggestBtn.disabled = true;
+
+        try {
+            await this.streamEvents('/templates/suggest/stream', { text: content }, (event, data) => {
+                if (event === 'local_match') {
+                    if (data.template_matches?.length) showMatches(data.template_matches, 'local');
+                } else if (event === 'section') {
+                    if (data.name === 'template_matches') {
+                        if (Array.isArray(data.value) && data.value.length) showMatches(data.value, 'llm');
+                    } else {
+                        panel.insertBefore(this.renderSection(data.name, data.value), status);
+                    }
+                } else if (event === 'best_match') {
+                    if (data.template_id) this.highlightSuggestion(matches, data.template_id);
+                } else if (event === 'error') {
+                    throw new Error(data.error);
+                }
+            });
+            status.remove();
+        } catch (error) {
+            console.error('Streaming suggestions failed:', error);
+            status.className = 'alert alert-warning small';
+            status.textContent = `Suggestions incomplete: ${error.message}`;
+        } finally {
+            this.elements.suggestBtn.disabled = false;
+        }
+    }
+
+    renderSuggestions(templateMatches, source) {
+        const list = document.createElement('div');
+        list.className = 'list-group mb-2';
+        list.dataset.source = source;
+        templateMatches.forEach(match => {
+            const templateId = match.template_id || Object.keys(this.templates).find(
+                id => this.templates[id].name === match.template_name
+            );
+            const item = document.createElement('button');
+            item.type = 'button';
+            item.className = 'list-group-item list-group-item-action d-flex justify-content-between align-items-center';
+            item.dataset.templateId = templateId || '';
+            item.disabled = !templateId;
+            const name = document.createElement('span');
+            name.textContent = match.template_name;
+            const score = document.createElement('span');
+            score.className = 'badge bg-secondary';
+            score.textContent = `${Math.round((match.confidence_score || 0) * 100)}%`;
+            item.append(name, score);
+            item.addEventListener('click', () => {
+                this.elements.templateSelect.value = templateId;
+                this.loadSelectedTemplate();
+            });
+            list.appendChild(item);
+        });
+        return list;
+    }
+
+    highlightSuggestion(list, templateId) {
+        list?.querySelectorAll('[data-template-id]').forEach(item => {
+            item.classList.toggle('active', item.dataset.templateId === templateId);
+        });
+    }
+
+    async analyzeWithJob(content, panel, status) {
+        // Fallback when the stream cannot be used (e.g. a buffering proxy):
+        // the same analysis as a background job, rendered when it finishes
+        try {
+            const result = await window.jobClient.run('text_analysis', { text: content });
+            panel.replaceChildren();
+            Object.entries(result)
+                .filter(([name]) => !['highlight_spans', 'usage', 'errors'].includes(name))
+                .forEach(([name, value]) => panel.appendChild(this.renderSection(name, value)));
+            return true;
+        } catch (error) {
+            console.error('Background analysis failed:', error);
+            return false;
+        }
+    }
+
+    renderSection(name, value) {
+        const card = document.createElement('div');
+        card.className = 'card mb-2';
+        const body = document.createElement('div');
+        body.className = 'card-body py-2';
+        const title = document.createElement('h6');
+        title.className = 'card-title';
+        title.textContent = name.replace(/_/g, ' ').replace(/\b\w/g, c => c.toUpperCase());
+        body.append(title, this.renderValue(value));
+        card.appendChild(body);
+        return card;
+    }
+
+    renderValue(value) {
+        if (Array.isArray(value)) {
+            const list = document.createElement('ul');
+            list.className = 'mb-0 small';
+            value.forEach(item => {
+                const entry = document.createElement('li');
+                entry.appendChild(this.renderValue(item));
+                list.appendChild(entry);
+            });
+            return list;
+        }
+        if (value && typeof value === 'object') {
+            const list = document.createElement('dl');
+            list.className = 'mb-0 small';
+            Object.entries(value).forEach(([key, item]) => {
+                if (Array.isArray(item) && !item.length) return;
+                const term = document.createElement('dt');
+                term.textContent = key.replace(/_/g, ' ');
+                const detail = document.createElement('dd');
+                detail.appendChild(this.renderValue(item));
+                list.append(term, detail);
+            });
+            return list;
+        }
+        const text = document.createElement('span');
+        text.textContent = value ?? '';
+        return text;
+    }
+
     getCSRFToken() {
         const token = document.querySelector('meta[name="csrf-token"]')?.content;
         if (!token) {
@@ -336,6 +564,14 @@ class TemplateLoader {
             this.elements.retryButton.addEventListener('click', () => this.retryInitialization());
         }
         
+        // Streaming analysis (optional on pages without the analysis panel)
+        if (this.elements.analyzeBtn && this.elements.analysisPanel) {
+            this.elements.analyzeBtn.addEventListener('click', () => this.streamAnalysis());
+        }
+        if (this.elements.suggestBtn && this.elements.suggestionPanel) {
+            this.elements.suggestBtn.addEventListener('click', () => this.streamSuggestions());
+        }
+        
         console.log('Event listeners initialized');
     }
     
@@ -360,6 +596,7 @@ class TemplateLoader {
             }
             
             this.elements.contentArea.value = data.content;
+            this.schema = await this.loadSchema(selectedTemplate);
             if (this.elements.previewContent) {
                 this.elements.previewContent.innerHTML = this.formatPreviewContent(data.content);
             }
@@ -375,6 +612,21 @@ class TemplateLoader {
         }
     }
     
+    async loadSchema(templateId) {
+        // The schema only drives placeholder warnings, so a failure is not fatal
+        try {
+            return await this.fetchWithRetry(`/templates/${templateId}/schema`);
+        } catch (error) {
+            console.warn('Could not load template schema:', error);
+            return null;
+        }
+    }
+    
+    unfilledRequiredFields(content) {
+        if (!this.schema?.fields) return [];
+        return this.schema.fields.filter(field => field.required && content.includes(field.placeholder));
+    }
+    
     formatPreviewContent(content) {
         if (!content.trim()) {
             return '<p class="text-muted">Start typing to see the preview...</p>';
@@ -395,11 +647,16 @@ class TemplateLoader {
         
         const content = this.elements.contentArea.value.trim();
         const minLength = 10;
-        const isValid = content.length >= minLength;
+        const unfilled = this.unfilledRequiredFields(content);
+        const isValid = content.length >= minLength && unfilled.length === 0;
         
         this.elements.contentArea.classList.toggle('is-valid', isValid);
         this.elements.contentArea.classList.toggle('is-invalid', !isValid);
         
+        if (unfilled.length > 0) {
+            this.showFeedback(`Please fill in: ${unfilled.map(field => field.label).join(', ')}`, 'warning');
+        }
+        
         return isValid;
     }
 }